@@ -120,6 +120,17 @@ if "page" not in st.session_state:
 if "history" not in st.session_state:
     st.session_state.history = []
 
+# Project persistence (SQLite, see rgm_state.py)
+from rgm_state import load_state, save_state, delete_state, flush_state
+from rgm_store import check_project_id
+if "project_id" not in st.session_state:
+    try:
+        st.session_state["project_id"] = check_project_id(st.query_params.get("project", "default"))
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+pid = st.session_state["project_id"]
+
 def go_to(page_name):
     st.session_state.history.append(st.session_state.page)
     st.session_state.page = page_name
@@ -136,6 +147,115 @@ def go_home():
     st.session_state.page = "home"
     st.session_state.history = []
     st.rerun()
+
+# -----------------------------
+#   Dataset stages (copy‑on‑write)
+# -----------------------------
+# D0 → dataframe1 → create_data → transform_data (and final_df) are versions in one
+# registry that share unchanged columns; pages check out cheap views instead of .copy().
+from rgm_data import DatasetRegistry, enable_copy_on_write
+from rgm_memory import MemoryManager, Spilled
+enable_copy_on_write()
+
+def dataset_registry() -> DatasetRegistry:
+    reg = st.session_state.setdefault("dataset_registry", DatasetRegistry())
+    # keep the registry in step with stages reset / replaced directly in session_state
+    changed = False
+    for stage in list(reg.stages()):
+        cur = st.session_state.get(stage)
+        if cur is None or isinstance(cur, Spilled):
+            reg.drop(stage)
+            changed = True
+        elif cur is not reg.get(stage).frame:
+            reg.commit(stage, cur)
+            changed = True
+    if changed:
+        prune_stage_caches()
+    return reg
+
+def prune_stage_caches():
+    """Drop cached indexes, profiles, sketches and correlations of superseded stage versions."""
+    def live(key):
+        return stage_token(key[0]) == key[1]
+    for name in ("index_cache", "profile_cache", "sketch_cache", "corr_cache"):
+        cache = st.session_state.get(name)
+        if cache is not None:
+            cache.retain(live)
+
+def commit_stage(stage: str, df, parent: str = None):
+    """Store *df* as the new version of a dataset stage – no data is copied."""
+    snap = dataset_registry().commit(stage, df, parent)
+    st.session_state[stage] = snap
+    prune_stage_caches()
+    return snap
+
+def checkout_stage(stage: str):
+    """Copy‑on‑write view of a dataset stage (None when the stage is empty)."""
+    reg = dataset_registry()
+    if stage not in reg:
+        if st.session_state.get(stage) is None:
+            return None
+        commit_stage(stage, st.session_state[stage])
+    return reg.checkout(stage)
+
+def stage_token(stage: str):
+    """Identifies the current version of a dataset stage, for cache keys."""
+    v = dataset_registry().get(stage)
+    return v.version if v is not None else id(st.session_state.get(stage))
+
+def dataset_profile(df, stage: str, filters: tuple = (), base=None, dims=None):
+    """
+    Cached column profile of *df*, a filtered view of *stage*: exact
+    (rgm_profile.py), or – when *dims* is given – merged from sketches of
+    *base* grouped by *dims* (rgm_sketch.py).
+    """
+    from rgm_profile import ProfileCache
+    from rgm_sketch import SketchCache
+    token = stage_token(stage)
+    if dims is not None:
+        sketches = st.session_state.setdefault("sketch_cache", SketchCache())
+        return sketches.profile((stage, token), base, dims, filters, df)
+    cache = st.session_state.setdefault("profile_cache", ProfileCache())
+    return cache.get((stage, token, tuple(filters), df.shape), df)
+
+def dataset_correlation(df, stage: str, filters: tuple, cols, method: str, sample=None):
+    """Cached correlation matrix (rgm_corr.py) of *df*, a filtered view of *stage*."""
+    from rgm_corr import CorrelationCache
+    cache = st.session_state.setdefault("corr_cache", CorrelationCache())
+    return cache.get((stage, stage_token(stage), tuple(filters), df.shape), df, cols, method, sample)
+
+def dataset_index(df, stage: str):
+    """Cached value → row‑position index (rgm_index.py) over the rows of *stage*."""
+    from rgm_index import IndexCache
+    cache = st.session_state.setdefault("index_cache", IndexCache())
+    return cache.get((stage, stage_token(stage), len(df)), df)
+
+def entity_pager(key: str, labels, noun: str = "item"):
+    """
+    Search box and page controls for a long list of entities (rgm_pager.py).
+    Returns the current ``Page`` and the position of the one entity whose
+    full detail is drawn (None when nothing matches).
+    """
+    from rgm_pager import PAGE_SIZE, PAGE_SIZES, paginate
+    labels = [str(lab) for lab in labels]
+    c_q, c_n, c_p = st.columns([3, 1, 1])
+    query = c_q.text_input(f"Search {noun}s", key=f"{key}_query")
+    per_page = c_n.selectbox("Per page", PAGE_SIZES, key=f"{key}_per_page",
+                             index=PAGE_SIZES.index(PAGE_SIZE) if PAGE_SIZE in PAGE_SIZES else 0)
+    pages = paginate(labels, query, 1, per_page).pages
+    if st.session_state.get(f"{key}_page", 1) > pages:       # the search shrank the list
+        st.session_state[f"{key}_page"] = pages
+    page = paginate(labels, query, c_p.number_input(f"Page (of {pages})", 1, pages, 1, key=f"{key}_page"),
+                    per_page)
+    if not page.positions:
+        st.info(f"No {noun} matches the search.")
+        return page, None
+    first = (page.page - 1) * per_page + 1
+    st.caption(f"{noun}s {first}–{first + len(page.positions) - 1} of {page.matches}"
+               + (f" (filtered from {len(labels)})" if page.matches < len(labels) else ""))
+    detail = st.selectbox(f"Show details for {noun}", page.positions, key=f"{key}_detail",
+                          format_func=lambda pos: labels[pos])
+    return page, detail
     
 section_names = { 
     "1": "Pre-Process",
@@ -1296,6 +1416,18 @@ def validate_page():
             + "\n".join(f"• `{o}` → `{n}`" for o, n in rename_map.items())
         )
 
+    # 3b) Compact canonical representation (once per dataset) -------------------
+    from rgm_data import compact_dataset
+    df = compact_dataset(df)
+    n_cat = sum(isinstance(t, pd.CategoricalDtype) for t in df.dtypes)
+    st.caption(
+        f"🗜️ Compact dataset: {n_cat} categorical dimensions, "
+        f"{df.memory_usage(deep=True).sum() / 1e6:,.1f} MB in memory."
+    )
+    # register the cleaned frame once – reruns then key every cache on the same D0 version
+    if df is not st.session_state.get("D0"):
+        df = commit_stage("D0", df)
+
     # 4) Frequency check ---------------------------------------------------------
     time_cols = {k: k in df.columns for k in ("Date", "Year", "Week", "Month")}
     if time_cols["Year"] and time_cols["Month"] and not time_cols["Week"] and not time_cols["Date"]:
@@ -1315,7 +1447,8 @@ def validate_page():
     st.dataframe(df.head(5), use_container_width=True)
 
     # 6) Missing‑value panel -----------------------------------------------------
-    miss_counts = df.isna().sum().loc[lambda s: s > 0]
+    prof = dataset_profile(df, "D0", tuple(rename_map.items()))
+    miss_counts = prof.missing.loc[lambda s: s > 0]
     left, right = st.columns([1, 2])
 
     with left:
@@ -1331,10 +1464,10 @@ def validate_page():
         if miss_counts.empty:
             st.write("—")
         else:
-            bad_rows = df[df.isna().any(axis=1)]
-            st.dataframe(bad_rows.head(5), use_container_width=True)
-            if len(bad_rows) > 5:
-                st.write(f"...and **{len(bad_rows) - 5}** more rows.")
+            n_bad = len(prof.missing_row_pos)
+            st.dataframe(prof.missing_rows(df, 5), use_container_width=True)
+            if n_bad > 5:
+                st.write(f"...and **{n_bad - 5}** more rows.")
 
     # 7) Validation checks -------------------------------------------------------
     required     = ["Channel", "Brand", "PPG", "SalesValue", "Volume"]
@@ -1371,34 +1504,61 @@ def validate_page():
     else:
         checks.append({"name": "Price column", "status": "warn",
                        "msg": "Will compute from `SalesValue / Volume`."})
+    # Date parsing
+    if "Date" in df.columns:
+        bad_dates = df.attrs.get("date_parse_failures", 0)
+        checks.append({"name": "Date parsed",
+                       "status": "warn" if bad_dates else "pass",
+                       "msg": f"{bad_dates:,} values are not dates – kept as text." if bad_dates else ""})
     # BasePrice
     bp_ok = "BasePrice" in df.columns
     checks.append({"name": "BasePrice column",
                    "status": "pass" if bp_ok else "warn",
                    "msg": "Already present." if bp_ok else "Will be computed in Base‑Price Estimator."})
 
+    # Data-quality rules (rgm_validate.py) – one streaming pass, cached per D0 version
+    from rgm_validate import validate_frame
+    report_key = (stage_token("D0"), df.shape)
+    cached = st.session_state.get("validation_report")
+    if cached is None or cached[0] != report_key:
+        cached = st.session_state["validation_report"] = (report_key, validate_frame(df))
+    report = cached[1]
+    rule_checks = report.checks()
+
     # Overall validity flag
-    valid = all(c["status"] != "fail" for c in checks)
+    valid = all(c["status"] != "fail" for c in checks + rule_checks)
 
     # 8) Validation report cards ----------------------------------------------
     st.subheader("Validation Report")
     colours = {"pass": "#2E7D32", "warn": "#FFB300", "fail": "#C62828"}
     icons   = {"pass": "✅",       "warn": "⚠️",       "fail": "❌"}
-    cards   = st.columns(len(checks))
-
-    for col_box, chk in zip(cards, checks):
-        with col_box:
-            html = (
-                f"<div style='border-left:5px solid {colours[chk['status']]};"
-                "padding:0.75em 1em; background:#FFF; border-radius:4px;'>"
-                f"<strong>{icons[chk['status']]} {chk['name']}</strong>"
-                + (f"<br><small>{chk['msg']}</small>" if chk['msg'] else "")
-                + "</div>"
-            )
-            st.markdown(html, unsafe_allow_html=True)
 
-    # Overall validity flag
-    valid = all(c["status"] != "fail" for c in checks)
+    def render_cards(items):
+        for col_box, chk in zip(st.columns(len(items)), items):
+            with col_box:
+                html = (
+                    f"<div style='border-left:5px solid {colours[chk['status']]};"
+                    "padding:0.75em 1em; background:#FFF; border-radius:4px;'>"
+                    f"<strong>{icons[chk['status']]} {chk['name']}</strong>"
+                    + (f"<br><small>{chk['msg']}</small>" if chk['msg'] else "")
+                    + "</div>"
+                )
+                st.markdown(html, unsafe_allow_html=True)
+
+    render_cards(checks)
+    if rule_checks:
+        st.markdown("##### Data quality")
+        render_cards(rule_checks)
+        with st.expander("Rule details", expanded=False):
+            st.caption(f"{report.rows:,} rows checked in chunks; time per rule:")
+            st.dataframe(report.timings(), use_container_width=True, hide_index=True)
+            for res in report.results:
+                if res.status == "pass":
+                    continue
+                st.markdown(f"**{res.name}** – {res.msg}")
+                if res.details is not None:
+                    st.dataframe(res.details, use_container_width=True, hide_index=True)
+                st.dataframe(df.iloc[res.rows[:20]], use_container_width=True)
 
     # If everything passed, show a green banner + short guide
     if valid:
@@ -1408,8 +1568,7 @@ def validate_page():
             "Click **Proceed to Feature Overview ➜** to explore and review your data’s feature columns."
         )
 
-    # 9) Persist cleaned DF + rename map ---------------------------------------
-    st.session_state['D0'] = df
+    # 9) Persist rename map (the cleaned DF is committed in 3b) ---------------
     st.session_state['validator_renamed'] = rename_map
 
     # ─ Navigation buttons ──────────────────────────────────
@@ -1455,6 +1614,7 @@ def feature_overview_page():
 
     # ───────── data retrieval ─────
     df = st.session_state.get("D0", None)
+    fo_stage = "D0"
     if df is None or df.empty:
         st.warning("No data found – run **Validate** first.")
         return
@@ -1463,16 +1623,21 @@ def feature_overview_page():
     with st.sidebar:
         st.subheader("Aggregator Filters")
         cat_cols_all = df.select_dtypes(include=["object", "category"]).columns.tolist()
+        fo_filters, fo_base = [], df
 
         if cat_cols_all:
             default_sel = st.session_state.get("fo_saved_aggs", [])
             agg_cols_sel = st.multiselect("Choose columns:", cat_cols_all, default=default_sel)
 
+            index, fo_pos = dataset_index(fo_base, fo_stage), None
             for col in agg_cols_sel:
-                options = ["All"] + sorted(df[col].dropna().unique().tolist())
+                options = ["All"] + index.values(col, fo_pos)
                 sel = st.radio(col, options, horizontal=True, key=f"fo_{col}")
                 if sel != "All":
-                    df = df[df[col] == sel]
+                    fo_filters.append((col, sel))
+                    fo_pos = index.select(fo_filters)
+            if fo_pos is not None:
+                df = index.take(fo_base, fo_pos)
 
             st.session_state["fo_saved_aggs"] = agg_cols_sel
             st.markdown("---")
@@ -1481,20 +1646,33 @@ def feature_overview_page():
         else:
             st.info("No categorical columns to filter.")
 
+        from rgm_sketch import APPROX_ROWS
+        fo_exact = st.checkbox(
+            "Exact statistics", value=len(fo_base) < APPROX_ROWS, key="fo_exact",
+            help="Off: distinct counts, quantiles and top values are merged from "
+                 "sketches built once per dataset version (fast on very large data)."
+        )
+
     if df.empty:
         st.error("All rows filtered out – relax your filters.")
         return
 
+    # every tab reads one cached profile of this (version, filter) slice
+    prof = dataset_profile(df, fo_stage, tuple(fo_filters), fo_base,
+                           None if fo_exact else st.session_state.get("fo_saved_aggs", []))
+    if getattr(prof, "approximate", False):
+        st.caption("≈ Approximate statistics – tick **Exact statistics** in the sidebar for exact numbers.")
+
     # ───────── TABS layout ───────
     tabs = st.tabs(["Overview", "Columns", "Numeric", "Categorical",
                     "Distributions", "Correlation", "Samples"])
 
     # ======= TAB 0: Overview =======
     with tabs[0]:
-        n_rows, n_cols = df.shape
-        mem_mb = df.memory_usage(deep=True).sum() / 1e6
-        missing_cells = df.isna().sum().sum()
-        pct_missing = missing_cells / (n_rows * n_cols) * 100 if n_rows and n_cols else 0
+        n_rows, n_cols = prof.rows, prof.cols
+        mem_mb = prof.memory_bytes / 1e6
+        missing_cells = prof.missing_cells
+        pct_missing = prof.pct_missing
 
         st.metric("Rows", f"{n_rows:,}")
         st.metric("Columns", f"{n_cols}")
@@ -1504,39 +1682,17 @@ def feature_overview_page():
     # ======= TAB 1: Columns ========
     with tabs[1]:
         st.subheader("Column Details")
-        info = []
-        for c in df.columns:
-            info.append({
-                "Column": c,
-                "Type": str(df[c].dtype),
-                "Missing": df[c].isna().sum(),
-                "Unique": df[c].nunique(dropna=True),
-                "Examples": ", ".join(map(str, df[c].dropna().unique()[:3])) or "—"
-            })
-        st.dataframe(pd.DataFrame(info), use_container_width=True)
+        st.dataframe(prof.column_table(), use_container_width=True)
 
     # ======= TAB 2: Numeric =========
     with tabs[2]:
-        numeric_cols = [
-            c for c in df.select_dtypes(include=[np.number]).columns
-            if c not in TIME_KEYS
-        ]
+        numeric_cols = prof.numeric_cols
         if numeric_cols:
             st.subheader("Descriptive Stats")
-            st.dataframe(df[numeric_cols].describe().T, use_container_width=True)
+            st.dataframe(prof.describe, use_container_width=True)
 
             if st.checkbox("Show potential outliers (1.5×IQR)"):
-                out = []
-                for col in numeric_cols:
-                    q1, q3 = df[col].quantile([.25, .75])
-                    iqr = q3 - q1
-                    lb, ub = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-                    out.append({
-                        "Column": col,
-                        "Outliers": ((df[col] < lb) | (df[col] > ub)).sum(),
-                        "Lower": f"{lb:.2f}", "Upper": f"{ub:.2f}"
-                    })
-                st.dataframe(pd.DataFrame(out), use_container_width=True)
+                st.dataframe(prof.outliers, use_container_width=True)
         else:
             st.info("No numeric columns (excluding Year/Month/Week).")
 
@@ -1547,7 +1703,7 @@ def feature_overview_page():
             st.subheader("Frequency Table")
             ccol = st.selectbox("Column", cat_cols)
             topk = st.slider("Top K", 1, 30, 10)
-            freq = df[ccol].value_counts(dropna=False).head(topk)
+            freq = prof.value_counts(ccol).head(topk)
             freq_df = (freq.rename_axis(ccol)
                        .reset_index(name="Count")
                        .assign(Percent=lambda d: d["Count"] / d["Count"].sum() * 100))
@@ -1577,7 +1733,8 @@ def feature_overview_page():
             st.markdown("#### Numeric Histogram")
             ncol = st.selectbox("Numeric column", ["(None)"] + num_cols)
             if ncol != "(None)":
-                fig = px.histogram(df, x=ncol, nbins=30, color_discrete_sequence=["#458EE2"])
+                from rgm_plot import histogram_figure     # bins computed here, only counts are sent
+                fig = histogram_figure(df[ncol], nbins=30, color="#458EE2")
                 if st.checkbox("Log‑scale Y"):
                     fig.update_yaxes(type="log")
                 st.plotly_chart(fig, use_container_width=True)
@@ -1586,7 +1743,7 @@ def feature_overview_page():
             st.markdown("#### Categorical Bar")
             ccol1 = st.selectbox("Categorical column", ["(None)"] + cat_cols)
             if ccol1 != "(None)":
-                cnt = df[ccol1].value_counts(dropna=False).reset_index()
+                cnt = prof.value_counts(ccol1).reset_index()
                 cnt.columns = [ccol1, "Count"]
                 cnt["Percent"] = cnt["Count"] / cnt["Count"].sum() * 100
                 y_axis = "Percent" if st.radio("Y‑axis", ["Count", "Percent"]) == "Percent" else "Count"
@@ -1595,14 +1752,19 @@ def feature_overview_page():
 
     # ======= TAB 5: Correlation =====
     with tabs[5]:
-        num_cols_corr = [
-            c for c in df.select_dtypes(include=[np.number]).columns
-            if c not in TIME_KEYS and df[c].nunique() > 1
-        ]
+        num_cols_corr = prof.varying_numeric()
         if len(num_cols_corr) > 1:
             method = st.selectbox("Method", ["pearson", "spearman", "kendall"])
             thresh = st.slider("Mask |ρ| < ", 0.0, 1.0, 0.0, 0.05)
-            corr = df[num_cols_corr].corr(method=method)
+            # cached per (version, filter, method); masking below never recomputes
+            from rgm_corr import KENDALL_SAMPLE_ROWS
+            sample = None
+            if method == "kendall" and len(df) > KENDALL_SAMPLE_ROWS:
+                exact = st.checkbox("Exact Kendall (slow on large data)", key="fo_kendall_exact")
+                sample = None if exact else KENDALL_SAMPLE_ROWS
+                if sample:
+                    st.caption(f"≈ Kendall estimated on a fixed sample of {sample:,} rows.")
+            corr = dataset_correlation(df, fo_stage, tuple(fo_filters), num_cols_corr, method, sample)
             if thresh > 0:
                 corr = corr.mask(corr.abs() < thresh)
             st.plotly_chart(px.imshow(
@@ -1689,29 +1851,30 @@ def prepare_page():
 def _plot_base(week_df, agg_col, ppg_val):
     """Plot weekly price vs. computed BasePrice and highlight transitions."""
     import plotly.graph_objects as go
+    from rgm_plot import line_trace, marker_trace
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=week_df["WeekYear"],
-        y=week_df["Price"],
+    fig.add_trace(line_trace(
+        week_df["WeekYear"],
+        week_df["Price"],
         mode="lines+markers",
         name="Weekly Price",
         line=dict(color="blue")
     ))
-    fig.add_trace(go.Scatter(
-        x=week_df["WeekYear"],
-        y=week_df["BasePrice"],
+    fig.add_trace(line_trace(
+        week_df["WeekYear"],
+        week_df["BasePrice"],
         mode="lines",
         name="Base Price",
         line=dict(color="red", dash="dash")
     ))
-    for i in week_df.index[week_df["IsTransition"]]:
-        fig.add_trace(go.Scatter(
-            x=[week_df.at[i, "WeekYear"]],
-            y=[week_df.at[i, "BasePrice"]],
-            mode="markers",
-            marker=dict(color="orange", size=10, symbol="diamond"),
-            name="Transition"
-        ))
+    trans = week_df[week_df["IsTransition"]]
+    fig.add_trace(marker_trace(
+        trans["WeekYear"],
+        trans["BasePrice"],
+        mode="markers",
+        marker=dict(color="orange", size=10, symbol="diamond"),
+        name="Transition"
+    ))
     fig.update_layout(
         title=f"Base‑Price calculation   |   {agg_col}: {ppg_val}",
         xaxis_title="Week",
@@ -1738,161 +1901,259 @@ def base_price_page():
     st.markdown("<hr class='accent-hr'>", unsafe_allow_html=True)
 
     # ── 1) load data ────────────────────────────────────────────────────────
-    df = st.session_state.get("D0", None)
+    from rgm_baseprice import (BASEPRICE_WORKERS, DEFAULT_PARAMS, MAX_WORKERS, METHODS, BasePriceCache,
+                               ScanStore, assign_weekly, parameter_sweep, portfolio_base_prices,
+                               series_key, weekly_table)
+    from rgm_plot import sparkline_svg
+    df = checkout_stage("D0")
     if df is None or df.empty:
         st.error("No data – upload & validate first."); return
 
+    missing_cols = "BasePrice" not in df.columns or "Price" not in df.columns
     if "Price" not in df.columns and {"SalesValue", "Volume"} <= set(df.columns):
         df["Price"] = np.where(df["Volume"] != 0, df["SalesValue"] / df["Volume"], np.nan)
     if "BasePrice" not in df.columns:
         df["BasePrice"] = np.nan
+    if missing_cols:
+        df = commit_stage("D0", df)
 
     # ── 2) drill‑down selections ───────────────────────────────────────────
-    channel = st.selectbox("Channel", sorted(df["Channel"].dropna().unique()))
-    sub_ch  = df[df["Channel"] == channel]
-    if sub_ch.empty: st.warning("No rows in that channel."); return
+    index   = dataset_index(df, "D0")
+    channel = st.selectbox("Channel", index.values("Channel"))
+    pos_ch  = index.select([("Channel", channel)])
+    if not len(pos_ch): st.warning("No rows in that channel."); return
 
-    brand   = st.radio("Brand", sorted(sub_ch["Brand"].dropna().unique()), horizontal=True)
-    sub_br  = sub_ch[sub_ch["Brand"] == brand]
+    brand   = st.radio("Brand", index.values("Brand", pos_ch), horizontal=True)
+    path    = [("Channel", channel), ("Brand", brand)]
+    pos_br  = index.select(path)
 
     agg_cols = ["Variant", "PackType", "PackSize"]
     agg_col  = st.selectbox("Aggregator dimension", agg_cols)
-    if agg_col not in sub_br.columns: st.warning(f"`{agg_col}` missing."); return
-    agg_val  = st.radio(agg_col, sorted(sub_br[agg_col].dropna().unique()), horizontal=True)
-    sub_agg  = sub_br[sub_br[agg_col] == agg_val]
-    if sub_agg.empty: st.warning("No rows after aggregator filter."); return
+    if agg_col not in df.columns: st.warning(f"`{agg_col}` missing."); return
+    agg_val  = st.radio(agg_col, index.values(agg_col, pos_br), horizontal=True)
+    path.append((agg_col, agg_val))
+    pos_agg  = index.select(path)
+    if not len(pos_agg): st.warning("No rows after aggregator filter."); return
 
-    ppgs = sorted(sub_agg["PPG"].dropna().unique())
+    ppgs = index.values("PPG", pos_agg)
     if not ppgs: st.warning("No PPG values."); return
 
-    # ── helper validation checks ───────────────────────────────────────────
-    def validate_up(prices, cand, bp, th5, promo):
-        above = (prices >= bp * (1 + th5 / 100)).sum()
-        within = ((prices >= cand * 0.97) & (prices <= cand * 1.03)).sum()
-        return above >= promo // 2 and within >= promo // 2
-
-    def validate_down(prices, cand, promo=12, required=9, tol=0.02):
-        if len(prices) < promo: return False
-        cnt = ((prices >= cand * (1 - tol)) & (prices <= cand * (1 + tol))).sum()
-        return cnt >= required
-
-    # ── 3)  loop over PPGs ─────────────────────────────────────────────────
-    for idx, ppg in enumerate(ppgs):
-        block = sub_agg[sub_agg["PPG"] == ppg]
-        st.markdown(f"### PPG **{ppg}**")
+    with st.sidebar:
+        workers = int(st.number_input(
+            "Base‑price worker processes", 1, MAX_WORKERS, BASEPRICE_WORKERS, 1, key="bp_workers",
+            help="Series are spread over this many processes when there are enough weeks to pay off."
+        ))
+        method = st.radio("Base‑price estimator", list(METHODS), format_func=METHODS.get, key="bp_method",
+                          help="Change points: price regimes from a penalized least‑squares fit (PELT) – "
+                               "one setting for every PPG, robust to noise and promo dips.")
+        if method == "pelt":
+            from rgm_changepoint import DEFAULT_PARAMS as CP_PARAMS
+            cp_params = {
+                "penalty": st.number_input("Change penalty", 0.5, 50.0, CP_PARAMS["penalty"], 0.5, key="bp_cp_pen",
+                                           help="Higher → fewer regimes (cost per change ∝ σ²·log n)."),
+                "min_size": st.number_input("Min regime weeks", 2, 52, CP_PARAMS["min_size"], 1, key="bp_cp_min"),
+                "perc": st.number_input("Regime percentile", 50.0, 100.0, CP_PARAMS["perc"], 5.0, key="bp_cp_perc"),
+                "promo_tol": st.number_input("Promo dip %", 1.0, 30.0, CP_PARAMS["promo_tol"], 0.5, key="bp_cp_promo",
+                                             help="Weeks this far under the local level are ignored by the fit."),
+            }
 
-        # advanced parameters
-        with st.expander("Advanced settings", expanded=False):
-            force  = st.checkbox("Force recalculation", key=f"f{idx}")
-            c1,c2,c3,c4,c5 = st.columns(5)
-            roll  = c1.number_input("Rolling weeks", 4, 52, 12, 1, key=f"r{idx}")
-            up_th = c2.number_input("Up % thr", 1.0, 20.0, 5.0, 0.5, key=f"u{idx}")
-            dn_th = c3.number_input("Down % thr", 1.0, 20.0, 5.0, 0.5, key=f"d{idx}")
-            val_w = c4.number_input("Validate weeks", 2, 18, 12, 1, key=f"v{idx}")
-            perc  = c5.number_input("Percentile", 50.0, 100.0, 75.0, 5.0, key=f"p{idx}")
-
-        # skip heavy calc if already filled
-        if block["BasePrice"].notna().all() and not force:
-            st.info("BasePrice already filled – skipping recalculation.")
-            wk = (block.groupby(["Year","Month","Week"], as_index=False)
+    scope = (channel, brand, agg_col, agg_val)
+    saved_params = st.session_state.setdefault("bp_params", {})   # outlives the PPG's widgets
+    widget = {"roll": "r", "up_th": "u", "dn_th": "d", "val_w": "v", "perc": "p"}
+    defaults = st.session_state.get("bp_defaults", DEFAULT_PARAMS)
+
+    # ── 2b) parameter sweep: score a grid over many series in one run ─────
+    if method == "transition":
+        with st.expander("Parameter sweep (sensitivity)", expanded=False):
+            st.caption("Every combination is run on every weekly series of the chosen scope; pick "
+                       "defaults from transition counts, stability and deviation from the observed price.")
+            g1, g2, g3, g4, g5 = st.columns(5)
+            grid = {
+                "roll":  g1.multiselect("Rolling weeks", [4, 8, 12, 16, 26, 52], [8, 12, 16], key="bp_sw_roll"),
+                "up_th": g2.multiselect("Up % thr", [1.0, 2.5, 5.0, 7.5, 10.0, 15.0], [2.5, 5.0, 7.5], key="bp_sw_up"),
+                "dn_th": g3.multiselect("Down % thr", [1.0, 2.5, 5.0, 7.5, 10.0, 15.0], [2.5, 5.0, 7.5], key="bp_sw_dn"),
+                "val_w": g4.multiselect("Validate weeks", [4, 8, 12, 16, 18], [8, 12], key="bp_sw_val"),
+                "perc":  g5.multiselect("Percentile", [50.0, 60.0, 75.0, 90.0, 100.0], [50.0, 75.0, 90.0],
+                                        key="bp_sw_perc"),
+            }
+            grid = {k: sorted(v) for k, v in grid.items() if v}
+            sweep_scope = st.radio("Series", [f"{brand} / {agg_col}: {agg_val}", f"Whole portfolio by {agg_col}"],
+                                   horizontal=True, key="bp_sw_scope")
+            sweep_key = (stage_token("D0"), scope, sweep_scope, tuple((k, tuple(v)) for k, v in grid.items()))
+            if st.button("Run sweep", key="bp_sw_run"):
+                rows = pos_agg if sweep_scope.startswith(brand) else np.arange(len(df))
+                weeks, _, starts = weekly_table(index.take(df, rows), ("Channel", "Brand", agg_col, "PPG"))
+                bar = st.progress(0.0, text="Sweeping parameters…")
+                result = parameter_sweep(weeks["Price"].to_numpy(dtype="float64", na_value=np.nan), starts, grid,
+                                         workers, lambda f, msg: bar.progress(f, text=f"Sweep: {msg}"))
+                bar.empty()
+                st.session_state["bp_sweep"] = (sweep_key, result)
+            last = st.session_state.get("bp_sweep")
+            if last is not None and last[0] == sweep_key:
+                result = last[1].sort_values(["deviation_pct", "transitions_per_year"]).reset_index(drop=True)
+                st.dataframe(result, use_container_width=True)
+                choice = st.selectbox("Combination", result.index, key="bp_sw_pick",
+                                      format_func=lambda r: ", ".join(f"{k}={result.at[r, k]:g}" for k in DEFAULT_PARAMS))
+                if st.button("Use as defaults for every PPG", key="bp_sw_apply"):
+                    defaults = {k: type(DEFAULT_PARAMS[k])(result.at[choice, k]) for k in DEFAULT_PARAMS}
+                    st.session_state["bp_defaults"] = defaults
+                    # drop per‑PPG overrides so the new defaults show everywhere (Save ALL uses them too)
+                    saved_params.clear()
+                    for key in [k for k in st.session_state
+                                if isinstance(k, str) and k[:1] in "rudvpf" and k[1:].isdigit()]:
+                        del st.session_state[key]
+                    st.success("Defaults updated.")
+
+    # ── 3a) weekly series of the PPGs on the current page ─────────────────
+    # a page of compact rows (sparklines) plus the full detail of one PPG
+    page, detail = entity_pager("bp_ppgs", ppgs, "PPG")
+
+    def ppg_settings(idx):
+        if method == "pelt":
+            return cp_params                 # one setting for the whole portfolio
+        saved = saved_params.get(scope + (ppgs[idx],), defaults)
+        get = st.session_state.get           # live widget values while the PPG is open
+        return {k: get(f"{w}{idx}", saved[k]) for k, w in widget.items()}
+
+    def forced(idx):
+        return st.session_state.get(f"f{idx}", saved_params.get(scope + (ppgs[idx], "force"), False))
+
+    weekly, filled, todo = {}, set(), []
+    for idx in page.positions:
+        block = index.slice(df, path + [("PPG", ppgs[idx])])
+        if block["BasePrice"].notna().all() and not forced(idx):
+            # drawn from the saved values
+            wk = (block.groupby(["Year","Month","Week"], as_index=False, observed=True)
                         .agg(SalesValue=('SalesValue','sum'),
                              Volume=('Volume','sum'),
                              BasePrice=('BasePrice','mean')))
             wk["Price"] = wk["SalesValue"]/wk["Volume"]
             wk["WeekYear"] = wk["Year"].astype(str) + "-W" + wk["Week"].astype(str)
             wk["IsTransition"] = False
-            _plot_base(wk, agg_col, ppg); continue
-
-        # weekly aggregation for calculation
-        wk = (block.groupby(["Year","Month","Week"], as_index=False)
+            weekly[idx] = wk
+            filled.add(idx)
+            continue
+        wk = (block.groupby(["Year","Month","Week"], as_index=False, observed=True)
                     .agg(SalesValue=('SalesValue','sum'), Volume=('Volume','sum')))
         wk["Price"] = wk["SalesValue"]/wk["Volume"]
         wk = wk.sort_values(["Year","Week"]).reset_index(drop=True)
         wk["WeekYear"] = wk["Year"].astype(str) + "-W" + wk["Week"].astype(str)
-        if len(wk) < roll: st.warning("Not enough weeks."); continue
-
-        price = wk["Price"].to_numpy()
-        n = len(price); bp_arr = np.empty(n); trans = []
-        cur_bp = np.percentile(price[:roll], perc); last_t = -roll
-
-        for i in range(n):
-            cur = price[i]; fut = price[i:i+val_w]
-            if len(fut) < val_w: bp_arr[i] = cur_bp; continue
-            up = False
-            if cur >= cur_bp*(1+up_th/100) and i-last_t >= roll and validate_up(fut, cur, cur_bp, up_th, val_w):
-                cur_bp = max(np.percentile(fut, perc), cur); trans.append(i); last_t = i; up = True
-            if not up and cur <= cur_bp*(1-dn_th/100) and i-last_t >= roll and validate_down(fut, cur, val_w):
-                cur_bp = min(np.percentile(fut, perc), cur); trans.append(i); last_t = i
-            bp_arr[i] = cur_bp
-
-        wk["BasePrice"] = bp_arr
-        wk["IsTransition"] = wk.index.isin(trans)
-        _plot_base(wk, agg_col, ppg)
-
-        # per‑PPG save
-        if st.button(f"Save {brand}/{agg_val}/{ppg}", key=f"s{idx}"):
-            for _, row in wk.iterrows():
-                m = ((df["Channel"] == channel) & (df["Brand"] == brand) &
-                     (df[agg_col] == agg_val) & (df["PPG"] == ppg) &
-                     (df["Year"] == row["Year"]) & (df["Month"] == row["Month"]) &
-                     (df["Week"] == row["Week"]))
-                df.loc[m, "BasePrice"] = row["BasePrice"]
-            st.success("BasePrice saved.")
+        weekly[idx] = wk
+        if len(wk) >= ppg_settings(idx)["min_size" if method == "pelt" else "roll"]:
+            todo.append(idx)
+    # memoized by (weekly prices, estimator, parameters): only changed PPGs recompute
+    bp_cache = st.session_state.setdefault("baseprice_cache", BasePriceCache())
+    keys = {i: series_key(weekly[i]["Price"].to_numpy(), ppg_settings(i), method) for i in todo}
+    bar = st.empty()
+    results = dict(zip(todo, bp_cache.many(
+        [weekly[i]["Price"].to_numpy() for i in todo], [ppg_settings(i) for i in todo],
+        workers, lambda f, msg: bar.progress(f, text=f"Base prices: {msg}"), method)))
+    bar.empty()
+    for idx, (bp_arr, trans) in results.items():
+        weekly[idx]["BasePrice"] = bp_arr
+        weekly[idx]["IsTransition"] = weekly[idx].index.isin(trans)
+
+    # ── 3b) compact rows for the page ──────────────────────────────────────
+    for idx in page.positions:
+        wk = weekly[idx]
+        c_name, c_spark, c_state = st.columns([2, 3, 2])
+        c_name.markdown(("▶ " if idx == detail else "") + f"**{ppgs[idx]}**")
+        if idx in filled:
+            c_spark.markdown(sparkline_svg(wk["Price"], wk["BasePrice"]), unsafe_allow_html=True)
+            c_state.caption("saved")
+        elif idx in results:
+            c_spark.markdown(sparkline_svg(wk["Price"], wk["BasePrice"]), unsafe_allow_html=True)
+            c_state.caption(f"{int(wk['IsTransition'].sum())} "
+                            f"{'change points' if method == 'pelt' else 'transitions'} · not saved")
+        else:
+            c_spark.markdown(sparkline_svg(wk["Price"]), unsafe_allow_html=True)
+            c_state.caption("not enough weeks")
+
+    # ── 3c) full detail of the selected PPG ────────────────────────────────
+    if detail is not None:
+        idx, ppg = detail, ppgs[detail]
+        st.markdown(f"### PPG **{ppg}**")
+
+        # advanced parameters
+        with st.expander("Advanced settings", expanded=False):
+            force  = st.checkbox("Force recalculation", forced(idx), key=f"f{idx}")
+            if method == "pelt":
+                st.caption("Change‑point settings apply to every PPG – see the sidebar.")
+            else:
+                cur = ppg_settings(idx)
+                c1,c2,c3,c4,c5 = st.columns(5)
+                roll  = c1.number_input("Rolling weeks", 4, 52, int(cur["roll"]), 1, key=f"r{idx}")
+                up_th = c2.number_input("Up % thr", 1.0, 20.0, float(cur["up_th"]), 0.5, key=f"u{idx}")
+                dn_th = c3.number_input("Down % thr", 1.0, 20.0, float(cur["dn_th"]), 0.5, key=f"d{idx}")
+                val_w = c4.number_input("Validate weeks", 2, 18, int(cur["val_w"]), 1, key=f"v{idx}")
+                perc  = c5.number_input("Percentile", 50.0, 100.0, float(cur["perc"]), 5.0, key=f"p{idx}")
+                saved_params[scope + (ppg,)] = {"roll": roll, "up_th": up_th, "dn_th": dn_th,
+                                                "val_w": val_w, "perc": perc}
+        saved_params[scope + (ppg, "force")] = force
+
+        wk = weekly[idx]
+        if idx in filled:
+            st.info("BasePrice already filled – skipping recalculation.")
+            _plot_base(wk, agg_col, ppg)
+        elif idx not in results:
+            st.warning("Not enough weeks.")
+        else:
+            _plot_base(wk, agg_col, ppg, cache_key=keys[idx], method=method)
+
+            # per‑PPG save
+            if st.button(f"Save {brand}/{agg_val}/{ppg}", key=f"s{idx}"):
+                df = commit_stage("D0", assign_weekly(df, index.select(path + [("PPG", ppg)]), wk))
+                st.success("BasePrice saved.")
 
     # ── 4)  batch “Save ALL” ───────────────────────────────────────────────
+    incremental = method == "transition" and st.checkbox(
+        "Incremental update (only weeks added since the last run)", True, key="bp_incremental",
+        help="Resumes every series from its saved scan state; series whose earlier weeks or "
+             "parameters changed are recomputed in full. Only missing BasePrice values and values "
+             "written by an earlier run are updated – saved ones are kept.")
     if st.button("Save ALL Base Prices"):
-        updated = df.copy()
-        agg_options = ["Variant","PackType","PackSize"]
-
-        for ch in updated["Channel"].dropna().unique():
-            ch_df = updated[updated["Channel"] == ch]
-            for br in ch_df["Brand"].dropna().unique():
-                br_df = ch_df[ch_df["Brand"] == br]
-                for ac in agg_options:
-                    if ac not in br_df.columns: continue
-                    for aval in br_df[ac].dropna().unique():
-                        a_df = br_df[br_df[ac] == aval]
-                        for ppg in a_df["PPG"].dropna().unique():
-                            filt = a_df[a_df["PPG"] == ppg]
-                            if filt.empty: continue
-
-                            wk = (filt.groupby(["Year","Month","Week"], as_index=False)
-                                        .agg(SalesValue=('SalesValue','sum'),
-                                             Volume=('Volume','sum')))
-                            wk["Price"] = wk["SalesValue"] / wk["Volume"]
-                            wk = wk.sort_values(["Year","Week"]).reset_index(drop=True)
-                            if len(wk) < 12: continue
-
-                            pa = wk["Price"].to_numpy()
-                            n = len(pa); bp = np.empty(n)
-                            cur = np.percentile(pa[:12], 75); last = -12
-                            for i in range(n):
-                                cu = pa[i]; fut = pa[i:i+12]; up = False
-                                if cu >= cur*1.05 and i-last >= 12 and validate_up(fut, cu, cur, 5, 12):
-                                    cur = max(np.percentile(fut, 75), cu); last = i; up = True
-                                elif not up and cu <= cur*0.95 and i-last >= 12 and validate_down(fut, cu):
-                                    cur = min(np.percentile(fut, 75), cu); last = i
-                                bp[i] = cur
-                            wk["BasePrice"] = bp
-
-                            for _, row in wk.iterrows():
-                                m = ((updated["Channel"] == ch) & (updated["Brand"] == br) &
-                                     (updated[ac] == aval) & (updated["PPG"] == ppg) &
-                                     (updated["Year"] == row["Year"]) & (updated["Month"] == row["Month"]) &
-                                     (updated["Week"] == row["Week"]))
-                                updated.loc[m & updated["BasePrice"].isna(), "BasePrice"] = row["BasePrice"]
+        # every Channel × Brand × aggregator × PPG series in one grouped pass (rgm_baseprice.py)
+        bar = st.progress(0.0, text="Estimating base prices for the whole portfolio…")
+        updated = df.copy(deep=False)      # copy‑on‑write: only BasePrice materialises
+        if incremental:
+            # per‑series scan state survives sessions in the project's artifact store, one per
+            # dataset lineage – refreshed versions of an upload ("x.csv (v2)") share its source name
+            from rgm_store import ArtifactStore
+            store = ArtifactStore(pid)
+            handles = store.handles()
+            src = st.session_state.get("D0_source")
+            state_name = f"baseprice_scan_state:{handles[src].source if src in handles else src}"
+            cached = st.session_state.get("bp_scan_store")
+            if cached is not None and cached[0] == state_name:
+                scan_store = cached[1]
+            else:
+                scan_store = store.get_object(state_name) if state_name in store else ScanStore()
+            # gaps are filled and values written by an earlier scan refreshed; saved values are kept
+            updated["BasePrice"], _, stats = scan_store.update(
+                updated, params=defaults, progress=lambda f, msg: bar.progress(f, text=msg))
+            store.put_object(state_name, scan_store)
+            st.session_state["bp_scan_store"] = (state_name, scan_store)
+            # drop scan states of datasets no longer in the project (and the old unkeyed one)
+            live = {state_name} | {f"baseprice_scan_state:{h.source}" for h in handles.values()}
+            for name in store.names():
+                if name.startswith("baseprice_scan_state") and name not in live:
+                    store.delete(name)
+            st.caption(f"{stats['extended']:,} series extended, {stats['recomputed']:,} recomputed, "
+                       f"{stats['unchanged']:,} unchanged – {stats['weeks']:,} weeks scanned.")
+        else:
+            updated["BasePrice"] = updated["BasePrice"].fillna(portfolio_base_prices(
+                updated, params=cp_params if method == "pelt" else defaults, workers=workers,
+                progress=lambda f, msg: bar.progress(f, text=msg), method=method))
+        bar.empty()
 
         df = updated
-        st.session_state["D0"] = df
+        commit_stage("D0", df)
         # ── add this line to also persist into dataframe1 ──
-        st.session_state["dataframe1"] = df.copy()
+        commit_stage("dataframe1", df, parent="D0")
         st.success("✅ All missing BasePrices calculated & updated.")
         st.download_button("📥 Download updated CSV",
                            df.to_csv(index=False), "updated_dataset_baseprice.csv")
 
-    # persist current df back
-    st.session_state["D0"] = df
-
     # ── 5) navigation ───────────────────────────────────────────────
     st.markdown("---")
     col_back, col_home = st.columns(2)
@@ -1905,31 +2166,50 @@ def base_price_page():
 
 
 # ───────────────────────── helper plot ─────────────────────────
-def _plot_base(week_df, agg_col, ppg_val):
-    """Plot weekly price vs BasePrice with transition markers."""
+def _plot_base(week_df, agg_col, ppg_val, cache_key=None, method="transition"):
+    """
+    Plot weekly price vs BasePrice with transition markers (change points
+    for ``method="pelt"``).  With a ``cache_key`` (``rgm_baseprice.series_key``)
+    the figure is built once and reused on later reruns.
+    """
     import plotly.graph_objects as go
+    from rgm_baseprice import BasePriceCache
+    from rgm_plot import line_trace, marker_trace
+    figures = st.session_state.setdefault("baseprice_figures", BasePriceCache(size=64))
+    fig_key = None if cache_key is None else (cache_key, agg_col, ppg_val)
+    fig = figures.get(fig_key) if fig_key is not None else None
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+        return
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=week_df["WeekYear"], y=week_df["Price"],
+    # long series are LTTB‑downsampled / WebGL (rgm_plot.py); transitions are never thinned
+    fig.add_trace(line_trace(
+        week_df["WeekYear"], week_df["Price"],
         mode="lines+markers", name="Weekly Price", line=dict(color="blue")
     ))
-    fig.add_trace(go.Scatter(
-        x=week_df["WeekYear"], y=week_df["BasePrice"],
+    fig.add_trace(line_trace(
+        week_df["WeekYear"], week_df["BasePrice"],
         mode="lines", name="Base Price", line=dict(color="red", dash="dash")
     ))
-    for i in week_df.index[week_df["IsTransition"]]:
-        fig.add_trace(go.Scatter(
-            x=[week_df.at[i, "WeekYear"]],
-            y=[week_df.at[i, "BasePrice"]],
-            mode="markers",
-            marker=dict(color="orange", size=10, symbol="diamond"),
-            name="Transition"
-        ))
+    trans = week_df[week_df["IsTransition"]]
+    if method == "pelt":
+        marker, label = dict(color="purple", size=11, symbol="triangle-up"), "Change point"
+    else:
+        marker, label = dict(color="orange", size=10, symbol="diamond"), "Transition"
+    fig.add_trace(marker_trace(
+        trans["WeekYear"],
+        trans["BasePrice"],
+        mode="markers",
+        marker=marker,
+        name=label
+    ))
     fig.update_layout(
         title=f"Base‑Price | {agg_col}: {ppg_val}",
         xaxis_title="Week",
         yaxis_title="Price"
     )
+    if fig_key is not None:
+        figures.put(fig_key, fig)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -1952,8 +2232,7 @@ def promo_depth_page():
     import pandas as pd
     import plotly.express as px
     import plotly.graph_objects as go
-    from sklearn.cluster import KMeans
-    from sklearn.preprocessing import StandardScaler
+    from rgm_cluster import kmeans_1d
 
     # Utility function for elbow detection:
     def find_elbow_k(k_values, inertias):
@@ -1982,10 +2261,10 @@ def promo_depth_page():
     df0 = st.session_state.get("D0",      None)
 
     if df1 is not None and has_required_columns(df1):
-        df = df1.copy()
+        df, depth_stage = checkout_stage("dataframe1"), "dataframe1"
         st.write("Using `dataframe1` for promo_depth (it has BasePrice & Price).")
     elif df0 is not None and has_required_columns(df0):
-        df = df0.copy()
+        df, depth_stage = checkout_stage("D0"), "D0"
         st.write("Using `st.session_state['D0']` for promo_depth.")
     else:
         st.error(
@@ -1998,24 +2277,26 @@ def promo_depth_page():
     # ------------------------------------------------
     # SECTION A: Channel, Brand, Aggregator, PPG, etc.
     # ------------------------------------------------
+    index = dataset_index(df, depth_stage)
     col1, col2 = st.columns([1, 2])
     with col1:
         channel_selected = st.selectbox(
             "Select Channel",
-            sorted(df["Channel"].dropna().unique()),
+            index.values("Channel"),
             key="depth_channel"
         )
-    channel_data = df[df["Channel"] == channel_selected]
+    depth_path = [("Channel", channel_selected)]
 
     with col2:
-        brand_list = sorted(channel_data["Brand"].dropna().unique())
+        brand_list = index.values("Brand", index.select(depth_path))
         brand_selected = st.radio(
             "Select Brand",
             options=brand_list,
             horizontal=True,
             key="depth_brand"
         )
-    brand_data = channel_data[channel_data["Brand"] == brand_selected]
+    depth_path.append(("Brand", brand_selected))
+    brand_pos = index.select(depth_path)
 
     aggregator_options = ["Variant", "PackType", "PackSize"]
     aggregator_col = st.selectbox(
@@ -2023,7 +2304,7 @@ def promo_depth_page():
         aggregator_options,
         key="depth_aggregator"
     )
-    if aggregator_col not in brand_data.columns:
+    if aggregator_col not in df.columns:
         st.warning(f"Column '{aggregator_col}' not found in the data.")
         st.stop()
 
@@ -2034,15 +2315,15 @@ def promo_depth_page():
     else:
         aggregator_selected = st.selectbox(
             "Select Aggregator Value",
-            sorted(brand_data[aggregator_col].dropna().unique()),
+            index.values(aggregator_col, brand_pos),
             key="depth_aggregator_value"
         )
-    aggregator_data = brand_data[brand_data[aggregator_col] == aggregator_selected]
+    depth_path.append((aggregator_col, aggregator_selected))
 
     # PPG selection
-    ppg_choices = sorted(aggregator_data["PPG"].dropna().unique())
+    ppg_choices = index.values("PPG", index.select(depth_path))
     ppg_selected = st.selectbox("Select PPG", ppg_choices, key="depth_ppg")
-    subset = aggregator_data[aggregator_data["PPG"] == ppg_selected]
+    subset = index.slice(df, depth_path + [("PPG", ppg_selected)])
     if subset.empty:
         st.warning("No data found for this combination.")
         st.stop()
@@ -2075,7 +2356,7 @@ def promo_depth_page():
     # -------------------------------------
     # 2) Aggregate WITHOUT recomputing Price
     # -------------------------------------
-    agg_data = subset.groupby(grouping_cols, as_index=False).agg(
+    agg_data = subset.groupby(grouping_cols, as_index=False, observed=True).agg(
         {
             "SalesValue": "sum",
             "Volume": "sum",
@@ -2127,17 +2408,10 @@ def promo_depth_page():
         st.info("No discount found (Price >= BasePrice). Nothing to cluster.")
         st.stop()
 
-    # Prepare data for elbow method
-    X = df_discounts["PromoDepth"].values.reshape(-1, 1)
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-
-    k_candidates = range(1, min(8, len(X_scaled) + 1))
-    inertias = []
-    for k in k_candidates:
-        km_test = KMeans(n_clusters=k, random_state=42)
-        km_test.fit(X_scaled)
-        inertias.append(km_test.inertia_)
+    # Exact 1‑D k‑means (rgm_cluster.py): one pass gives the elbow curve and every k's clusters
+    fit = kmeans_1d(df_discounts["PromoDepth"].to_numpy(dtype="float64"), k_max=7)
+    k_candidates = range(1, fit.k_max + 1)
+    inertias = list(fit.inertias)
 
     rec_k = find_elbow_k(list(k_candidates), inertias)
 
@@ -2158,14 +2432,13 @@ def promo_depth_page():
             step=1
         )
 
-        # Run K-Means
-        km = KMeans(n_clusters=chosen_k, random_state=42)
-        km.fit(X_scaled)
-        df_discounts["ClusterID"] = km.labels_
+        # Clusters for the chosen k (no refit); cannot exceed the number of discounted rows
+        chosen_k = min(int(chosen_k), fit.k_max)
+        df_discounts["ClusterID"] = fit.labels(chosen_k)
 
         # Summaries
         count_label = "NumDays" if agg_freq == "Daily" else "NumWeeks"
-        summary = df_discounts.groupby("ClusterID", as_index=False).agg(
+        summary = df_discounts.groupby("ClusterID", as_index=False, observed=True).agg(
             **{
                 count_label: ("PromoDepth", "count"),
                 "AvgDepth": ("PromoDepth", "mean"),
@@ -2177,9 +2450,7 @@ def promo_depth_page():
         st.dataframe(summary)
 
         # Generate auto-bins from cluster centers
-        centers_scaled = km.cluster_centers_
-        centers_real = scaler.inverse_transform(centers_scaled).flatten()
-        centers_real = np.clip(centers_real, 0, 1)
+        centers_real = np.clip(fit.centers(chosen_k), 0, 1)
 
         # Sort cluster centers and build bin boundaries
         sorted_pairs = sorted(dict(enumerate(centers_real)).items(), key=lambda x: x[1])
@@ -2381,7 +2652,7 @@ def promo_depth_page():
         count_label = "NumWeeks"
         vol_label = "VolPerWeek"
 
-    vol_summary = df_discounts.groupby("PromoBin", as_index=False).agg(
+    vol_summary = df_discounts.groupby("PromoBin", as_index=False, observed=True).agg(
         **{
             count_label: ("PromoBin", "count"),
             "TotalVol": ("Volume", "sum")
@@ -2442,10 +2713,11 @@ def promo_depth_page():
         tickvals = chart_data["Xaxis"].tolist()
         ticktext = chart_data["TimeLabel"].tolist()
 
+    from rgm_plot import line_trace, marker_trace
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=chart_data["Xaxis"],
-        y=chart_data["Price"],
+    fig.add_trace(line_trace(
+        chart_data["Xaxis"],
+        chart_data["Price"],
         mode="lines+markers",
         name="Price",
         line=dict(color="blue"),
@@ -2457,9 +2729,9 @@ def promo_depth_page():
             "<b>Depth:</b> %{customdata[1]:.1%}"
         )
     ))
-    fig.add_trace(go.Scatter(
-        x=chart_data["Xaxis"],
-        y=chart_data["BasePrice"],
+    fig.add_trace(line_trace(
+        chart_data["Xaxis"],
+        chart_data["BasePrice"],
         mode="lines",
         name="BasePrice",
         line=dict(color="red", dash="dot"),
@@ -2482,9 +2754,9 @@ def promo_depth_page():
 
     for bname in chosen_bins:
         sub = disc_plot[disc_plot["PromoBin"] == bname]
-        fig.add_trace(go.Scatter(
-            x=sub["Xaxis"],
-            y=sub["Price"],
+        fig.add_trace(marker_trace(
+            sub["Xaxis"],
+            sub["Price"],
             mode="markers",
             name=bname,
             marker=dict(color=bin_color_map.get(bname, "gray"), size=8),
@@ -2512,113 +2784,92 @@ def promo_depth_page():
 
     if st.button("FINAL SAVE (All Configurations)"):
         final_clusters = st.session_state.get("final_clusters_depth", {})
-        for ch in df["Channel"].dropna().unique():
-            ch_df = df[df["Channel"] == ch]
-            for br in ch_df["Brand"].dropna().unique():
-                br_df = ch_df[ch_df["Brand"] == br]
-                for agg_col2 in aggregator_options:
-                    if agg_col2 not in br_df.columns:
+        for (ch, br), cb_pos in index.groups(["Channel", "Brand"]):
+            for agg_col2 in aggregator_options:
+                if agg_col2 not in df.columns:
+                    continue
+                for (agg_val2, pp), sub_pos in index.groups([agg_col2, "PPG"], within=cb_pos):
+                    key = (ch, br, agg_val2, pp)
+                    if key in final_clusters:
+                        st.info(f"Skipping {key} (already in final clusters).")
                         continue
-                    for agg_val2 in br_df[agg_col2].dropna().unique():
-                        agg_df2 = br_df[br_df[agg_col2] == agg_val2]
-                        for pp in agg_df2["PPG"].dropna().unique():
-                            key = (ch, br, agg_val2, pp)
-                            if key in final_clusters:
-                                st.info(f"Skipping {key} (already in final clusters).")
-                                continue
-                            sub_df = agg_df2[agg_df2["PPG"] == pp]
-                            if sub_df.empty:
-                                continue
+                    sub_df = index.take(df, sub_pos)
 
-                            # Adjust grouping for daily vs. weekly
-                            if agg_freq == "Daily":
-                                if "Day" not in sub_df.columns:
-                                    if "Date" in sub_df.columns:
-                                        sub_df["Day"] = pd.to_datetime(sub_df["Date"], errors="coerce").dt.date
-                                    else:
-                                        st.warning("Daily grouping requires a 'Date' column. Skipping this subset.")
-                                        continue
-                                grouping_cols2 = ["Day"]
+                    # Adjust grouping for daily vs. weekly
+                    if agg_freq == "Daily":
+                        if "Day" not in sub_df.columns:
+                            if "Date" in sub_df.columns:
+                                sub_df["Day"] = pd.to_datetime(sub_df["Date"], errors="coerce").dt.date
                             else:
-                                if "Month" in sub_df.columns:
-                                    grouping_cols2 = ["Year", "Month", "Week"]
-                                else:
-                                    grouping_cols2 = ["Year", "Week"]
-
-                            # Group the same way, but do NOT recompute Price
-                            w_agg = sub_df.groupby(grouping_cols2, as_index=False).agg(
-                                {
-                                    "SalesValue": "sum",
-                                    "Volume": "sum",
-                                    "Price": "mean",
-                                    "BasePrice": "mean"
-                                }
-                            )
-                            w_agg["PromoDepth"] = (w_agg["BasePrice"] - w_agg["Price"]) / w_agg["BasePrice"]
-                            w_agg["PromoDepth"] = w_agg["PromoDepth"].clip(0, 1)
-
-                            disc = w_agg[w_agg["PromoDepth"] > 0].copy()
-                            if disc.empty:
+                                st.warning("Daily grouping requires a 'Date' column. Skipping this subset.")
                                 continue
+                        grouping_cols2 = ["Day"]
+                    else:
+                        if "Month" in sub_df.columns:
+                            grouping_cols2 = ["Year", "Month", "Week"]
+                        else:
+                            grouping_cols2 = ["Year", "Week"]
+
+                    # Group the same way, but do NOT recompute Price
+                    w_agg = sub_df.groupby(grouping_cols2, as_index=False, observed=True).agg(
+                        {
+                            "SalesValue": "sum",
+                            "Volume": "sum",
+                            "Price": "mean",
+                            "BasePrice": "mean"
+                        }
+                    )
+                    w_agg["PromoDepth"] = (w_agg["BasePrice"] - w_agg["Price"]) / w_agg["BasePrice"]
+                    w_agg["PromoDepth"] = w_agg["PromoDepth"].clip(0, 1)
+
+                    disc = w_agg[w_agg["PromoDepth"] > 0].copy()
+                    if disc.empty:
+                        continue
+
+                    fit_c = kmeans_1d(disc["PromoDepth"].to_numpy(dtype="float64"), k_max=7)
+                    cands = range(1, fit_c.k_max + 1)
+                    best_k2 = find_elbow_k(list(cands), list(fit_c.inertias))
+                    disc["ClusterID"] = fit_c.labels(best_k2)
+                    real_centers = np.clip(fit_c.centers(best_k2), 0, 1)
+
+                    sorted_enumer = sorted(dict(enumerate(real_centers)).items(), key=lambda x: x[1])
+                    def midpoint(a, b):
+                        return (a + b) / 2
+                    auto_binlist = []
+                    for i2 in range(len(sorted_enumer)):
+                        cid, cval = sorted_enumer[i2]
+                        left = 0.0 if i2 == 0 else midpoint(sorted_enumer[i2-1][1], cval)
+                        right = 1.0 if i2 == len(sorted_enumer)-1 else midpoint(cval, sorted_enumer[i2+1][1])
+                        auto_binlist.append({
+                            "ClusterID": cid,
+                            "Channel": ch,
+                            "Brand": br,
+                            "PPG": pp,
+                            "Aggregator": agg_val2,
+                            "Min": round(left * 100, 2),
+                            "Max": round(right * 100, 2),
+                            "Centroid": round(cval * 100, 2),
+                            "ClusterName": f"{br}_{agg_val2}_{pp}_Promo{i2+1}"
+                        })
+
+                    def build_final_bins(ch2, br2, agg_vv, pp2, bin_list):
+                        out2 = []
+                        for item in bin_list:
+                            out2.append({
+                                "ClusterID": item["ClusterID"],
+                                "Channel": ch2,
+                                "Brand": br2,
+                                "Aggregator": agg_vv,
+                                "PPG": pp2,
+                                "Min": item["Min"],
+                                "Max": item["Max"],
+                                "Centroid": item["Centroid"],
+                                "ClusterName": item["ClusterName"]
+                            })
+                        return out2
 
-                            X_c = disc["PromoDepth"].values.reshape(-1, 1)
-                            sc_c = StandardScaler()
-                            X_sc = sc_c.fit_transform(X_c)
-
-                            cands = range(1, min(7, len(X_sc)) + 1)
-                            inert_list = []
-                            for ck in cands:
-                                tmp_km = KMeans(n_clusters=ck, random_state=42)
-                                tmp_km.fit(X_sc)
-                                inert_list.append(tmp_km.inertia_)
-                            best_k2 = find_elbow_k(list(cands), inert_list)
-
-                            auto_km = KMeans(n_clusters=best_k2, random_state=42)
-                            auto_km.fit(X_sc)
-                            disc["ClusterID"] = auto_km.labels_
-
-                            sc_centers = auto_km.cluster_centers_
-                            real_centers = sc_c.inverse_transform(sc_centers).flatten()
-                            real_centers = np.clip(real_centers, 0, 1)
-
-                            sorted_enumer = sorted(dict(enumerate(real_centers)).items(), key=lambda x: x[1])
-                            def midpoint(a, b):
-                                return (a + b) / 2
-                            auto_binlist = []
-                            for i2 in range(len(sorted_enumer)):
-                                cid, cval = sorted_enumer[i2]
-                                left = 0.0 if i2 == 0 else midpoint(sorted_enumer[i2-1][1], cval)
-                                right = 1.0 if i2 == len(sorted_enumer)-1 else midpoint(cval, sorted_enumer[i2+1][1])
-                                auto_binlist.append({
-                                    "ClusterID": cid,
-                                    "Channel": ch,
-                                    "Brand": br,
-                                    "PPG": pp,
-                                    "Aggregator": agg_val2,
-                                    "Min": round(left * 100, 2),
-                                    "Max": round(right * 100, 2),
-                                    "Centroid": round(cval * 100, 2),
-                                    "ClusterName": f"{br}_{agg_val2}_{pp}_Promo{i2+1}"
-                                })
-
-                            def build_final_bins(ch2, br2, agg_vv, pp2, bin_list):
-                                out2 = []
-                                for item in bin_list:
-                                    out2.append({
-                                        "ClusterID": item["ClusterID"],
-                                        "Channel": ch2,
-                                        "Brand": br2,
-                                        "Aggregator": agg_vv,
-                                        "PPG": pp2,
-                                        "Min": item["Min"],
-                                        "Max": item["Max"],
-                                        "Centroid": item["Centroid"],
-                                        "ClusterName": item["ClusterName"]
-                                    })
-                                return out2
-
-                            final_bin_defs = build_final_bins(ch, br, agg_val2, pp, auto_binlist)
-                            final_clusters[key] = final_bin_defs
+                    final_bin_defs = build_final_bins(ch, br, agg_val2, pp, auto_binlist)
+                    final_clusters[key] = final_bin_defs
 
         st.session_state["final_clusters_depth"] = final_clusters
         st.success("✅ Final Save done for all unedited combos. Manual combos remain intact.")
@@ -2719,13 +2970,14 @@ def market_construct_page():
         st.warning("No data uploaded yet. Please upload a file in the sidebar.")
         st.stop()
 
-    # 1a) Remove any rows where Brand == "cat1"
-    if "Brand" in df.columns:
-        df = df[df["Brand"] != "cat1"]
+    # 1a) Remove any rows where Brand == "cat1" (all slices below go through the index)
+    index = dataset_index(df, "D0")
+    base_excl = [("Brand", "cat1")] if "Brand" in df.columns else []
+    base_pos = index.select(exclude=base_excl)
 
     # 2) Prepare Options
     def sorted_or_all(col):
-        return ["All"] + sorted(df[col].unique()) if col in df.columns else ["All"]
+        return ["All"] + index.values(col, base_pos) if col in df.columns else ["All"]
 
     market_options   = sorted_or_all("Market")
     channel_options  = sorted_or_all("Channel")
@@ -2794,19 +3046,17 @@ def market_construct_page():
     st.markdown('<hr class="accent-hr">', unsafe_allow_html=True)
 
     # 6) Apply filters
-    cat_df = df.copy()
-    if chosen_market  != "All": cat_df = cat_df[cat_df["Market"]  == chosen_market]
-    if chosen_channel != "All": cat_df = cat_df[cat_df["Channel"] == chosen_channel]
+    cat_filters = [(c, v) for c, v in (("Market", chosen_market), ("Channel", chosen_channel)) if v != "All"]
+    cat_df = index.slice(df, cat_filters, base_excl)
 
-    bs = cat_df.copy()
-    if chosen_brand    != "All": bs = bs[bs["Brand"]    == chosen_brand]
-    if chosen_variant  != "All": bs = bs[bs["Variant"]  == chosen_variant]
-    if chosen_packtype != "All": bs = bs[bs["PackType"] == chosen_packtype]
-    if chosen_ppg      != "All": bs = bs[bs["PPG"]      == chosen_ppg]
+    bs_filters = cat_filters + [(c, v) for c, v in (("Brand", chosen_brand), ("Variant", chosen_variant),
+                                                   ("PackType", chosen_packtype), ("PPG", chosen_ppg))
+                                if v != "All"]
+    bs = index.slice(df, bs_filters, base_excl)
 
     # 7) Time key
     def set_time(df_, freq):
-        df_ = df_.copy()
+        df_ = df_.copy(deep=False)
         df_["Date"] = pd.to_datetime(df_.get("Date",""), errors="coerce")
         df_.dropna(subset=["Date"], inplace=True)
         if freq=="Weekly":  df_["TimeKey"] = df_["Date"].dt.to_period("W").apply(lambda r: r.start_time)
@@ -2823,13 +3073,13 @@ def market_construct_page():
         if c not in brand_df.columns: brand_df[c] = 0
 
     # 8) Aggregators
-    cat_agg = cat_df.groupby("TimeKey", as_index=False).agg(
+    cat_agg = cat_df.groupby("TimeKey", as_index=False, observed=True).agg(
         CatSalesValue=("SalesValue","sum"), CatVolume=("Volume","sum")
     )
 
     def agg_dim(d, dim):
         if d.empty: return d.assign(TimeKey=[], **{"Value":[]})
-        g = d.groupby(["TimeKey",dim], as_index=False).agg(SalesValue=("SalesValue","sum"), Volume=("Volume","sum"))
+        g = d.groupby(["TimeKey",dim], as_index=False, observed=True).agg(SalesValue=("SalesValue","sum"), Volume=("Volume","sum"))
         m = g.merge(cat_agg, on="TimeKey", how="left")
         if chosen_metric=="MS Value":    m["Value"] = m["SalesValue"]/m["CatSalesValue"].replace(0,np.nan)
         elif chosen_metric=="Volume":     m["Value"] = m["Volume"]
@@ -3224,7 +3474,7 @@ def price_ladder_page():
                 elif "Volume" in df_.columns:
                     vol_col = "Volume"
                 if vol_col:
-                    share_df = df_.groupby("Aggregator", as_index=False).agg(TotalVol=(vol_col,"sum"))
+                    share_df = df_.groupby("Aggregator", as_index=False, observed=True).agg(TotalVol=(vol_col,"sum"))
                     tv = share_df["TotalVol"].sum()
                     if tv>0:
                         share_df["Share(%)"] = share_df["TotalVol"]/tv*100
@@ -3243,7 +3493,7 @@ def price_ladder_page():
                     else:
                         return None,None
                 elif "SalesValue" in df_.columns:
-                    share_df = df_.groupby("Aggregator", as_index=False).agg(TotalSales=("SalesValue","sum"))
+                    share_df = df_.groupby("Aggregator", as_index=False, observed=True).agg(TotalSales=("SalesValue","sum"))
                     ts = share_df["TotalSales"].sum()
                     if ts>0:
                         share_df["Share(%)"] = share_df["TotalSales"]/ts*100
@@ -3308,9 +3558,11 @@ def feature_overview_page_2():
     #    - fallback to D0     (raw upload)
     # ──────────────────────────────────────────────
     df = st.session_state.get("dataframe1")
+    fo_stage = "dataframe1"
 
     if df is None or df.empty:
         df = st.session_state.get("D0")
+        fo_stage = "D0"
 
     if (
         df is None
@@ -3343,16 +3595,21 @@ def feature_overview_page_2():
     with st.sidebar:
         st.subheader("Aggregator Filters")
         cat_cols_all = df.select_dtypes(include=["object", "category"]).columns.tolist()
+        fo_filters, fo_base = [], df
 
         if cat_cols_all:
             default_sel = st.session_state.get("fo_saved_aggs", [])
             agg_cols_sel = st.multiselect("Choose columns:", cat_cols_all, default=default_sel)
 
+            index, fo_pos = dataset_index(fo_base, fo_stage), None
             for col in agg_cols_sel:
-                options = ["All"] + sorted(df[col].dropna().unique().tolist())
+                options = ["All"] + index.values(col, fo_pos)
                 sel = st.radio(col, options, horizontal=True, key=f"fo_{col}")
                 if sel != "All":
-                    df = df[df[col] == sel]
+                    fo_filters.append((col, sel))
+                    fo_pos = index.select(fo_filters)
+            if fo_pos is not None:
+                df = index.take(fo_base, fo_pos)
 
             st.session_state["fo_saved_aggs"] = agg_cols_sel
             st.markdown("---")
@@ -3361,10 +3618,23 @@ def feature_overview_page_2():
         else:
             st.info("No categorical columns to filter.")
 
+        from rgm_sketch import APPROX_ROWS
+        fo_exact = st.checkbox(
+            "Exact statistics", value=len(fo_base) < APPROX_ROWS, key="fo_exact",
+            help="Off: distinct counts, quantiles and top values are merged from "
+                 "sketches built once per dataset version (fast on very large data)."
+        )
+
     if df.empty:
         st.error("All rows filtered out – relax your filters.")
         return
 
+    # every tab reads one cached profile of this (version, filter) slice
+    prof = dataset_profile(df, fo_stage, tuple(fo_filters), fo_base,
+                           None if fo_exact else st.session_state.get("fo_saved_aggs", []))
+    if getattr(prof, "approximate", False):
+        st.caption("≈ Approximate statistics – tick **Exact statistics** in the sidebar for exact numbers.")
+
     # ──────────────────────────────────────────────
     # 5. TABS layout
     # ──────────────────────────────────────────────
@@ -3375,10 +3645,10 @@ def feature_overview_page_2():
 
     # ===== TAB 0: Overview =====
     with tabs[0]:
-        n_rows, n_cols = df.shape
-        mem_mb = df.memory_usage(deep=True).sum() / 1e6
-        missing_cells = df.isna().sum().sum()
-        pct_missing = missing_cells / (n_rows * n_cols) * 100 if n_rows and n_cols else 0
+        n_rows, n_cols = prof.rows, prof.cols
+        mem_mb = prof.memory_bytes / 1e6
+        missing_cells = prof.missing_cells
+        pct_missing = prof.pct_missing
 
         st.metric("Rows", f"{n_rows:,}")
         st.metric("Columns", f"{n_cols}")
@@ -3388,39 +3658,17 @@ def feature_overview_page_2():
     # ===== TAB 1: Columns =====
     with tabs[1]:
         st.subheader("Column Details")
-        info = []
-        for c in df.columns:
-            info.append({
-                "Column": c,
-                "Type": str(df[c].dtype),
-                "Missing": df[c].isna().sum(),
-                "Unique": df[c].nunique(dropna=True),
-                "Examples": ", ".join(map(str, df[c].dropna().unique()[:3])) or "—"
-            })
-        st.dataframe(pd.DataFrame(info), use_container_width=True)
+        st.dataframe(prof.column_table(), use_container_width=True)
 
     # ===== TAB 2: Numeric =====
     with tabs[2]:
-        numeric_cols = [
-            c for c in df.select_dtypes(include=[np.number]).columns
-            if c not in TIME_KEYS
-        ]
+        numeric_cols = prof.numeric_cols
         if numeric_cols:
             st.subheader("Descriptive Stats")
-            st.dataframe(df[numeric_cols].describe().T, use_container_width=True)
+            st.dataframe(prof.describe, use_container_width=True)
 
             if st.checkbox("Show potential outliers (1.5×IQR)"):
-                out = []
-                for col in numeric_cols:
-                    q1, q3 = df[col].quantile([.25, .75])
-                    iqr = q3 - q1
-                    lb, ub = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-                    out.append({
-                        "Column": col,
-                        "Outliers": ((df[col] < lb) | (df[col] > ub)).sum(),
-                        "Lower": f"{lb:.2f}", "Upper": f"{ub:.2f}"
-                    })
-                st.dataframe(pd.DataFrame(out), use_container_width=True)
+                st.dataframe(prof.outliers, use_container_width=True)
         else:
             st.info("No numeric columns (excluding Year/Month/Week).")
 
@@ -3431,7 +3679,7 @@ def feature_overview_page_2():
             st.subheader("Frequency Table")
             ccol = st.selectbox("Column", cat_cols)
             topk = st.slider("Top K", 1, 30, 10)
-            freq = df[ccol].value_counts(dropna=False).head(topk)
+            freq = prof.value_counts(ccol).head(topk)
             freq_df = (freq.rename_axis(ccol)
                        .reset_index(name="Count")
                        .assign(Percent=lambda d: d["Count"] / d["Count"].sum() * 100))
@@ -3460,7 +3708,8 @@ def feature_overview_page_2():
             st.markdown("#### Numeric Histogram")
             ncol = st.selectbox("Numeric column", ["(None)"] + num_cols)
             if ncol != "(None)":
-                fig = px.histogram(df, x=ncol, nbins=30, color_discrete_sequence=["#458EE2"])
+                from rgm_plot import histogram_figure     # bins computed here, only counts are sent
+                fig = histogram_figure(df[ncol], nbins=30, color="#458EE2")
                 if st.checkbox("Log‑scale Y"):
                     fig.update_yaxes(type="log")
                 st.plotly_chart(fig, use_container_width=True)
@@ -3469,7 +3718,7 @@ def feature_overview_page_2():
             st.markdown("#### Categorical Bar")
             ccol1 = st.selectbox("Categorical column", ["(None)"] + cat_cols)
             if ccol1 != "(None)":
-                cnt = df[ccol1].value_counts(dropna=False).reset_index()
+                cnt = prof.value_counts(ccol1).reset_index()
                 cnt.columns = [ccol1, "Count"]
                 cnt["Percent"] = cnt["Count"] / cnt["Count"].sum() * 100
                 y_axis = "Percent" if st.radio("Y‑axis", ["Count", "Percent"]) == "Percent" else "Count"
@@ -3478,14 +3727,19 @@ def feature_overview_page_2():
 
     # ===== TAB 5: Correlation =====
     with tabs[5]:
-        num_cols_corr = [
-            c for c in df.select_dtypes(include=[np.number]).columns
-            if c not in TIME_KEYS and df[c].nunique() > 1
-        ]
+        num_cols_corr = prof.varying_numeric()
         if len(num_cols_corr) > 1:
             method = st.selectbox("Method", ["pearson", "spearman", "kendall"])
             thresh = st.slider("Mask |ρ| < ", 0.0, 1.0, 0.0, 0.05)
-            corr = df[num_cols_corr].corr(method=method)
+            # cached per (version, filter, method); masking below never recomputes
+            from rgm_corr import KENDALL_SAMPLE_ROWS
+            sample = None
+            if method == "kendall" and len(df) > KENDALL_SAMPLE_ROWS:
+                exact = st.checkbox("Exact Kendall (slow on large data)", key="fo_kendall_exact")
+                sample = None if exact else KENDALL_SAMPLE_ROWS
+                if sample:
+                    st.caption(f"≈ Kendall estimated on a fixed sample of {sample:,} rows.")
+            corr = dataset_correlation(df, fo_stage, tuple(fo_filters), num_cols_corr, method, sample)
             if thresh > 0:
                 corr = corr.mask(corr.abs() < thresh)
             st.plotly_chart(px.imshow(
@@ -3558,14 +3812,14 @@ def create_page():
 
     # ─── Retrieve dataframe ───
     if "create_data" in st.session_state and not st.session_state["create_data"].empty:
-        df = st.session_state["create_data"].copy()
+        df = checkout_stage("create_data")
     elif "dataframe1" in st.session_state and not st.session_state["dataframe1"].empty:
-        df = st.session_state["dataframe1"].copy()
-        st.session_state["create_data"] = df.copy()
+        df = checkout_stage("dataframe1")
+        commit_stage("create_data", df, parent="dataframe1")
     elif "D0" in st.session_state and st.session_state["D0"] is not None \
             and not st.session_state["D0"].empty:
-        df = st.session_state["D0"].copy()
-        st.session_state["create_data"] = df.copy()
+        df = checkout_stage("D0")
+        commit_stage("create_data", df, parent="D0")
     else:
         error_with_nav("🚫 **No data.** Upload in **Validate** and run Base‑Price first.")
 
@@ -3603,17 +3857,20 @@ def create_page():
         sel_cols = st.multiselect("Filter columns", cat_cols_all,
                                   default=st.session_state.get("create_saved_aggs", []),
                                   key="flt_cols")
-        changed = False
+        index, flt, pos = dataset_index(df, "create_data"), [], None
         for c in sel_cols:
-            opts = ["All"] + sorted(df[c].dropna().unique())
+            opts = ["All"] + index.values(c, pos)
             val = st.radio(c, opts, horizontal=True, key=f"flt_val_{c}")
             if val != "All":
-                df = df[df[c] == val]
-                changed = True
+                flt.append((c, val))
+                pos = index.select(flt)
+        changed = bool(flt)
+        if changed:
+            df = index.take(df, pos)
         st.session_state["create_saved_aggs"] = sel_cols
         st.write(f"Active rows: **{len(df):,}**")
         if changed and st.button("Apply filter", key="flt_apply"):
-            st.session_state["create_data"] = df.copy()
+            commit_stage("create_data", df)
             st.success("Filter applied.")
 
     # refresh column lists after filter
@@ -3663,7 +3920,7 @@ def create_page():
                         df[a] * df[b] if op == "Multiply" else
                         np.where(df[b] != 0, df[a] / df[b], np.nan)
                     )
-                    st.session_state["create_data"] = df.copy()
+                    commit_stage("create_data", df)
                     st.success(f"{new_basic} added.")
             else:
                 c = st.selectbox("Column", ["(None)"] + num_cols, key="num_one_c")
@@ -3674,7 +3931,7 @@ def create_page():
                         np.where(df[c] >= 0, np.sqrt(df[c]), np.nan) if op == "Sqrt" else
                         -df[c]
                     )
-                    st.session_state["create_data"] = df.copy()
+                    commit_stage("create_data", df)
                     st.success(f"{new_basic} added.")
         preview_expander()
 
@@ -3690,7 +3947,7 @@ def create_page():
             if x not in ("(None)", y) and y != "(None)" and \
                st.button("Create", key="int_make_pair"):
                 df[out_col] = df[x] * df[y]
-                st.session_state["create_data"] = df.copy()
+                commit_stage("create_data", df)
                 st.success(f"{out_col} added.")
         elif int_mode == "Cat Cross":
             a = st.selectbox("Cat A", ["(None)"] + cat_cols, key="int_cat_a")
@@ -3698,14 +3955,14 @@ def create_page():
             if a not in ("(None)", b) and b != "(None)" and \
                st.button("Create", key="int_make_cross"):
                 df[out_col] = df[a].astype(str) + "_" + df[b].astype(str)
-                st.session_state["create_data"] = df.copy()
+                commit_stage("create_data", df)
                 st.success(f"{out_col} added.")
         else:
             sel = st.multiselect("Numeric columns", num_cols, key="int_mm_sel")
             mm  = st.selectbox("Compute", ["Min", "Max"], key="int_mm_op")
             if sel and st.button("Create", key="int_make_mm"):
                 df[out_col] = df[sel].min(axis=1) if mm == "Min" else df[sel].max(axis=1)
-                st.session_state["create_data"] = df.copy()
+                commit_stage("create_data", df)
                 st.success(f"{out_col} added.")
         preview_expander()
 
@@ -3719,14 +3976,14 @@ def create_page():
                                key="grp_num") if num_cols else "(None)"
         ready = g_col != "(None)" and (op == "Count" or num_sel != "(None)")
         if ready and st.button("Create group feature", key="grp_make"):
-            grp = df.groupby(g_col)
+            grp = df.groupby(g_col, observed=True)
             if op == "Mean":
                 df[g_feat] = grp[num_sel].transform("mean")
             elif op == "Count":
                 df[g_feat] = grp[g_col].transform("count")
             else:
                 df[g_feat] = df[num_sel] - grp[num_sel].transform("mean")
-            st.session_state["create_data"] = df.copy()
+            commit_stage("create_data", df)
             st.success(f"{g_feat} added.")
         preview_expander()
 
@@ -3749,7 +4006,7 @@ def create_page():
                     df[new_dt] = (today - df[dt_col]).dt.days
                 else:
                     df[new_dt] = df[dt_col].shift(1)
-                st.session_state["create_data"] = df.copy()
+                commit_stage("create_data", df)
                 st.success("Date/time feature(s) added.")
         preview_expander()
 
@@ -3760,10 +4017,10 @@ def create_page():
         grp_cols  = st.multiselect("Group by", cat_cols, key="trend_grp")
         if st.button("Create trend", key="trend_make"):
             if grp_cols:
-                df[trend_col] = df.groupby(grp_cols).cumcount() + 1
+                df[trend_col] = df.groupby(grp_cols, observed=True).cumcount() + 1
             else:
                 df[trend_col] = np.arange(1, len(df) + 1)
-            st.session_state["create_data"] = df.copy()
+            commit_stage("create_data", df)
             st.success(f"{trend_col} created.")
         preview_expander()
 
@@ -3781,7 +4038,7 @@ def create_page():
             else:
                 β, α = np.polyfit(data[x_var], data[y_var], 1)
                 df[resid] = df[y_var] - (α + β * df[x_var])
-                st.session_state["create_data"] = df.copy()
+                commit_stage("create_data", df)
                 st.success("Residuals added.")
         preview_expander()
 
@@ -3797,7 +4054,7 @@ def create_page():
 
     # ─── Floating save ───
     if st.button("💾 Save all changes", key="save_fab_click"):
-        st.session_state["create_data"] = df.copy()
+        commit_stage("create_data", df)
         st.success("Changes saved to session.")
 
 
@@ -3832,19 +4089,21 @@ def transform_page():
 
     # ─── get working DataFrame ───
     if "transform_data" in st.session_state:
-        df = st.session_state["transform_data"].copy()
+        df = checkout_stage("transform_data")
     else:
         if "create_data" not in st.session_state or st.session_state["create_data"].empty:
             error_with_nav("No data found – build something on **Create** first.")
-        df = st.session_state["create_data"].copy()
+        df = checkout_stage("create_data")
 
     # ─── remember baseline for new‑col detection ───
     if "transform_base_cols" not in st.session_state:
         st.session_state["transform_base_cols"] = df.columns.tolist()
     
-    # ─── initialize transformation history ───
-    if "transform_history" not in st.session_state:
-        st.session_state["transform_history"] = []
+    # ─── initialize transformation history (column deltas, see rgm_history.py) ───
+    from rgm_history import TransformHistory
+    history = st.session_state.setdefault("transform_history", TransformHistory())
+    # the action checkpointed on the previous run has been committed by now
+    history.seal(st.session_state.get("transform_data"))
     
     # ─── timeline badge ───
     show_timeline("3")
@@ -3852,24 +4111,41 @@ def transform_page():
     # ─── sidebar filter ───
     with st.sidebar:
         st.subheader("Filter slice")
+        tf_stage = "transform_data" if "transform_data" in st.session_state else "create_data"
+        full_df = df                                     # undo / redo act on the whole frame
+        index, tf_filters, tf_pos = dataset_index(df, tf_stage), [], None
         for c in df.select_dtypes(include=["object","category"]).columns:
-            opts = ["All"] + sorted(df[c].dropna().unique().tolist())
+            opts = ["All"] + index.values(c, tf_pos)
             sel = st.radio(c, opts, horizontal=True, key=f"tf_filt_{c}")
             if sel != "All":
-                df = df[df[c] == sel]
+                tf_filters.append((c, sel))
+                tf_pos = index.select(tf_filters)
+        if tf_pos is not None:
+            df = index.take(df, tf_pos)
         st.write(f"Rows: **{len(df):,}**")
         
         # Add undo in sidebar
         st.markdown("---")
         st.subheader("Actions")
-        if st.button("⬅️ Undo Last Transformation"):
-            if st.session_state["transform_history"]:
-                last_state = st.session_state["transform_history"].pop()
-                if "transform_history_desc" in st.session_state:
-                    st.session_state["transform_history_desc"].pop()
-                st.session_state["transform_data"] = last_state
-                st.success("Last transformation undone!")
-                st.experimental_rerun()
+        undo_col, redo_col = st.columns(2)
+        if undo_col.button("⬅️ Undo Last Transformation"):
+            if history.undo_stack:
+                restored = history.undo(st.session_state.get("transform_data", full_df))
+                if restored is not None:
+                    commit_stage("transform_data", restored)
+                    st.success("Last transformation undone!")
+                    st.rerun()
+        if redo_col.button("➡️ Redo"):
+            if history.redo_stack:
+                restored = history.redo(st.session_state.get("transform_data", full_df))
+                if restored is not None:
+                    commit_stage("transform_data", restored)
+                    st.rerun()
+        history.max_mb = st.number_input("History memory cap (MB)", 16, 8192,
+                                         int(history.max_mb), step=16, key="tf_history_mb")
+        history.trim()
+        st.caption(f"{len(history.undo_stack)} undo / {len(history.redo_stack)} redo steps · "
+                   f"{history.nbytes / 1e6:,.1f} MB")
 
     num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     cat_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
@@ -4005,10 +4281,7 @@ def transform_page():
             # Apply button
             if st.button("Apply scaling", key="tf_apply_scale"):
                 # Save current state to history
-                st.session_state["transform_history"].append(df.copy())
-                if "transform_history_desc" not in st.session_state:
-                    st.session_state["transform_history_desc"] = []
-                st.session_state["transform_history_desc"].append(f"Applied {x_mtd} scaling to {len(x_sel)} columns")
+                history.checkpoint(df, f"Applied {x_mtd} scaling to {len(x_sel)} columns")
                 
                 # Apply transformations
                 for col in x_sel:
@@ -4020,7 +4293,7 @@ def transform_page():
                     df[col + x_suf] = scale_series(df[col], x_mtd)
                 
                 # Save
-                st.session_state["transform_data"] = df.copy()
+                commit_stage("transform_data", df)
                 st.success(f"Scaled {len(x_sel)} columns with {x_mtd} method")
         
         with right_scale:
@@ -4109,10 +4382,7 @@ def transform_page():
                 
                 if st.button("Apply encoding"):
                     # Save current state to history
-                    st.session_state["transform_history"].append(df.copy())
-                    if "transform_history_desc" not in st.session_state:
-                        st.session_state["transform_history_desc"] = []
-                    st.session_state["transform_history_desc"].append(f"Applied {encoding_method} to {len(cat_to_encode)} columns")
+                    history.checkpoint(df, f"Applied {encoding_method} to {len(cat_to_encode)} columns")
                     
                     if encoding_method == "One-Hot Encoding":
                         # Create dummy variables
@@ -4135,7 +4405,7 @@ def transform_page():
                         # Apply target encoding (mean encoding)
                         for col in cat_to_encode:
                             # Group by categorical and calculate mean of target
-                            encoding_map = df.groupby(col)[target_col].mean().to_dict()
+                            encoding_map = df.groupby(col, observed=True)[target_col].mean().to_dict()
                             # Create new column name
                             new_col = f"{prefix}{col}_target_encoded" if prefix else f"{col}_target_encoded"
                             # Apply encoding
@@ -4163,7 +4433,7 @@ def transform_page():
                                 )
                     
                     # Save updated dataframe
-                    st.session_state["transform_data"] = df.copy()
+                    commit_stage("transform_data", df)
                     st.success(f"Applied {encoding_method} to {len(cat_to_encode)} columns")
         
         with right_encode:
@@ -4206,10 +4476,7 @@ def transform_page():
                 
                 if st.button("Apply PCA"):
                     # Save current state to history
-                    st.session_state["transform_history"].append(df.copy())
-                    if "transform_history_desc" not in st.session_state:
-                        st.session_state["transform_history_desc"] = []
-                    st.session_state["transform_history_desc"].append(f"Applied PCA to {len(pca_cols)} columns")
+                    history.checkpoint(df, f"Applied PCA to {len(pca_cols)} columns")
                     
                     try:
                         # Apply PCA
@@ -4259,7 +4526,7 @@ def transform_page():
                         st.plotly_chart(fig, use_container_width=True)
                         
                         # Save
-                        st.session_state["transform_data"] = df.copy()
+                        commit_stage("transform_data", df)
                         st.success(f"Added {n_components} PCA components to the dataset")
                         
                     except Exception as e:
@@ -4328,16 +4595,13 @@ def transform_page():
                     
                     if to_remove and st.button("Remove Selected Features"):
                         # Save current state to history
-                        st.session_state["transform_history"].append(df.copy())
-                        if "transform_history_desc" not in st.session_state:
-                            st.session_state["transform_history_desc"] = []
-                        st.session_state["transform_history_desc"].append(f"Removed {len(to_remove)} correlated features")
+                        history.checkpoint(df, f"Removed {len(to_remove)} correlated features")
                         
                         # Remove selected features
                         df = df.drop(columns=to_remove)
                         
                         # Save
-                        st.session_state["transform_data"] = df.copy()
+                        commit_stage("transform_data", df)
                         st.success(f"Removed {len(to_remove)} correlated features")
                 else:
                     st.info(f"No features with correlation > {corr_thresh} found.")
@@ -4384,16 +4648,13 @@ def transform_page():
                         
                         if features_to_drop and st.button("Remove Low Importance Features"):
                             # Save current state to history
-                            st.session_state["transform_history"].append(df.copy())
-                            if "transform_history_desc" not in st.session_state:
-                                st.session_state["transform_history_desc"] = []
-                            st.session_state["transform_history_desc"].append(f"Removed {len(features_to_drop)} low importance features")
+                            history.checkpoint(df, f"Removed {len(features_to_drop)} low importance features")
                             
                             # Remove selected features
                             df = df.drop(columns=features_to_drop)
                             
                             # Save
-                            st.session_state["transform_data"] = df.copy()
+                            commit_stage("transform_data", df)
                             st.success(f"Removed {len(features_to_drop)} low importance features")
                     
                     except Exception as e:
@@ -5124,6 +5385,10 @@ def build_page():
 
         st.write("Running FULL PIPELINE ...")
 
+        # the pipeline zero‑fills merged frames, which a Categorical cannot hold
+        from rgm_data import expand_categoricals
+        raw_df = expand_categoricals(raw_df)
+
         # ── 1) Identify & convert your date column ─────────────────────────────────
         date_col = next((c for c in raw_df.columns if c.strip().lower() == 'date'), None)
         if not date_col:
@@ -5154,7 +5419,7 @@ def build_page():
         def compute_category_weighted_price(df, d_date, d_channel):
             df = df.copy()
             df[d_date] = pd.to_datetime(df[d_date], errors='coerce')
-            grp = df.groupby([d_channel, d_date])
+            grp = df.groupby([d_channel, d_date], observed=True)
             return (
                 grp.apply(lambda g: (g['PPU']*g['Volume']).sum()/g['Volume'].sum()
                         if g['Volume'].sum() else 0)
@@ -5167,23 +5432,23 @@ def build_page():
             mean_keys = [d_channel] + ([l0] if l0 else []) + ([l2] if l2 else [])
             daily_keys = [d_channel, d_date] + ([l0] if l0 else []) + ([l2] if l2 else [])
             mean_df = (
-                df.groupby(mean_keys)['PPU']
+                df.groupby(mean_keys, observed=True)['PPU']
                 .mean().reset_index()
                 .rename(columns={'PPU':'mean_ppu'})
             )
             daily = (
-                df.groupby(daily_keys)['Volume']
+                df.groupby(daily_keys, observed=True)['Volume']
                 .sum().reset_index()
                 .merge(mean_df, on=mean_keys, how='left')
             )
             total = (
-                daily.groupby([d_channel, d_date])['Volume']
+                daily.groupby([d_channel, d_date], observed=True)['Volume']
                     .sum().reset_index().rename(columns={'Volume':'total_volume'})
             )
             daily = daily.merge(total, on=[d_channel, d_date], how='left')
             daily['weighted_contrib'] = daily['mean_ppu'] * (daily['Volume']/daily['total_volume'])
             return (
-                daily.groupby([d_channel, d_date])['weighted_contrib']
+                daily.groupby([d_channel, d_date], observed=True)['weighted_contrib']
                     .sum().reset_index()
                     .rename(columns={'weighted_contrib':'Cat_Down_Up'})
             )
@@ -5200,21 +5465,21 @@ def build_page():
         # ── 6) Aggregate to PPU ───────────────────────────────────────────────────
         if "Price" in df_proc.columns and "SalesValue" in df_proc.columns:
             agg_df = (
-                df_proc.groupby(group_keys)
+                df_proc.groupby(group_keys, observed=True)
                     .agg({"Volume":"sum","Price":"mean","SalesValue":"sum"})
                     .reset_index()
                     .rename(columns={"Price":"PPU"})
             )
         elif "Price" in df_proc.columns:
             agg_df = (
-                df_proc.groupby(group_keys)
+                df_proc.groupby(group_keys, observed=True)
                     .agg({"Volume":"sum","Price":"mean"})
                     .reset_index()
                     .rename(columns={"Price":"PPU"})
             )
         else:
             agg_df = (
-                df_proc.groupby(group_keys)
+                df_proc.groupby(group_keys, observed=True)
                     .agg({"Volume":"sum","SalesValue":"sum"})
                     .reset_index()
             )
@@ -5236,7 +5501,8 @@ def build_page():
             pivot_df = agg_df.pivot_table(
                 index=[d_date, d_channel],
                 columns=pivot_keys,
-                values='PPU'
+                values='PPU',
+                observed=True
             )
             pivot_df.columns = [
                 "_".join(map(str,col)) + "_PPU" if isinstance(col,tuple)
@@ -5270,7 +5536,7 @@ def build_page():
 
         # ── 8) Category & market‐share metrics ────────────────────────────────────
         catvol = (
-            agg_df.groupby([d_channel, d_date])['Volume']
+            agg_df.groupby([d_channel, d_date], observed=True)['Volume']
                 .sum().reset_index(name='CatVol')
         )
         agg_df = agg_df.merge(catvol, on=[d_channel, d_date], how='left')
@@ -5279,11 +5545,11 @@ def build_page():
         # Prepare brand_totals for later
         keys_for_brand = [d_channel] + (pivot_keys or [])
         brand_totals = (
-            raw_df.groupby(keys_for_brand)['SalesValue']
+            raw_df.groupby(keys_for_brand, observed=True)['SalesValue']
                 .sum().reset_index(name='BrandSales')
         )
         channel_totals = (
-            raw_df.groupby(d_channel)['SalesValue']
+            raw_df.groupby(d_channel, observed=True)['SalesValue']
                 .sum().reset_index(name='ChannelSales')
         )
         brand_totals = brand_totals.merge(channel_totals, on=[d_channel], how='left')
@@ -5293,7 +5559,7 @@ def build_page():
 
         # ── 9) Seasonality & price trend ─────────────────────────────────────────
         season = (
-            agg_df.groupby([d_channel,'Month'])['Volume']
+            agg_df.groupby([d_channel,'Month'], observed=True)['Volume']
                 .mean().reset_index(name='CatSeasonality')
         )
         agg_df = agg_df.merge(season, on=[d_channel,'Month'], how='left')
@@ -5305,7 +5571,7 @@ def build_page():
             pivot_keys[1] if len(pivot_keys or [])>1 else None
         )
         trend = pd.merge(cwp, cdu, on=[d_channel, d_date], how='inner')
-        trend['mean_cat_down_up'] = trend.groupby(d_channel)['Cat_Down_Up'].transform('mean')
+        trend['mean_cat_down_up'] = trend.groupby(d_channel, observed=True)['Cat_Down_Up'].transform('mean')
         trend['Cat_Price_trend_over_time'] = (
             trend['Cat_Weighted_Price'] *
             (trend['mean_cat_down_up']/trend['Cat_Down_Up'])
@@ -5319,7 +5585,7 @@ def build_page():
         final_df = agg_df.copy().set_index(d_date)
         final_df[['residual','z_score_residual','is_outlier']] = np.nan, np.nan, 0
         outlier_keys = [d_channel] + (pivot_keys or [])
-        for name, grp in final_df.groupby(outlier_keys):
+        for name, grp in final_df.groupby(outlier_keys, observed=True):
             if len(grp)<2: continue
             grp0 = grp.reset_index()
             try:
@@ -5348,7 +5614,7 @@ def build_page():
                 return means.flatten()
 
             final_df['FilteredVolume'] = np.nan
-            for _, grp in final_df.groupby([d_channel] + (pivot_keys or [])):
+            for _, grp in final_df.groupby([d_channel] + (pivot_keys or []), observed=True):
                 grp_s = grp.sort_values(d_date).reset_index()
                 filt = apply_kf(grp_s['Volume'].values)
                 final_df.loc[grp_s['index'],'FilteredVolume'] = filt
@@ -5422,7 +5688,7 @@ def build_page():
             for c, b in zip(names, coefs):
                 d[f"Beta_{c}"] = b
 
-        grouped = final_df.groupby(grouping_keys) if grouping_keys else [((None,), final_df)]
+        grouped = final_df.groupby(grouping_keys, observed=True) if grouping_keys else [((None,), final_df)]
 
         for gvals, gdf in grouped:
 
@@ -5687,7 +5953,7 @@ def build_page():
                 use_kalman=use_kalman,
                 use_ratio_flag=use_ratio
             )
-            st.session_state["final_df"] = final_agg_df
+            commit_stage("final_df", final_agg_df)
         else:
             final_agg_df = st.session_state["final_df"]
 
@@ -6745,7 +7011,7 @@ def model_selection_page():
     # aggregate BRAND --------------------------------------------------------
     gb_cols = ["Year","Week","YearWeek"]
     agg_brand = (brand_df
-                .groupby(gb_cols, as_index=False)
+                .groupby(gb_cols, as_index=False, observed=True)
                 .agg({"SalesValue":"sum","Volume":"sum","D1":"mean"}))
     agg_brand = agg_brand[agg_brand["Volume"]>0]
     agg_brand["Price"] = agg_brand["SalesValue"] / agg_brand["Volume"]
@@ -6757,7 +7023,7 @@ def model_selection_page():
     tot_df["YearWeek"] = tot_df["Year"].astype(str)+"-W"+tot_df["Week"].astype(str).str.zfill(2)
 
     agg_tot = (tot_df
-            .groupby(["Year","Week","YearWeek"],as_index=False)
+            .groupby(["Year","Week","YearWeek"],as_index=False, observed=True)
             .agg({"SalesValue":"sum"}).rename(columns={"SalesValue":"TotalSales"}))
 
     # merge & compute market-share ------------------------------------------
@@ -8583,7 +8849,7 @@ def post_modelling_page():
     # Summaries for Type 2 aggregator approach
     df_price = (
         df_filtered
-        .groupby(["Channel","Brand","PPG"], as_index=False)
+        .groupby(["Channel","Brand","PPG"], as_index=False, observed=True)
         .agg({"SalesValue":"sum","Volume":"sum"})
     )
     df_price["Price"] = df_price["SalesValue"] / df_price["Volume"].replace(0, np.inf)
@@ -8592,7 +8858,7 @@ def post_modelling_page():
     df_filtered["YearMonth"] = df_filtered["Date"].dt.to_period("M")
     group_ym = (
         df_filtered
-        .groupby(["Channel","Brand","PPG"])["YearMonth"]
+        .groupby(["Channel","Brand","PPG"], observed=True)["YearMonth"]
         .nunique()
         .reset_index(name="MonthsCount")
     )
@@ -8619,7 +8885,7 @@ def post_modelling_page():
     )
 
     brand_vol= (
-        df_merged.groupby(["Channel","Brand"], as_index=False)["SumVolume"]
+        df_merged.groupby(["Channel","Brand"], as_index=False, observed=True)["SumVolume"]
         .sum()
         .rename(columns={"SumVolume":"brandVol"})
     )
@@ -8627,7 +8893,7 @@ def post_modelling_page():
     df_merged["ppg_share"]= df_merged["SumVolume"]/ df_merged["brandVol"].replace(0, np.inf)
     df_merged["ppg_partial"]= df_merged["ppg_share"]* df_merged["ppg_MCV"]
     brand_index= (
-        df_merged.groupby(["Channel","Brand"], as_index=False)["ppg_partial"]
+        df_merged.groupby(["Channel","Brand"], as_index=False, observed=True)["ppg_partial"]
         .sum()
         .rename(columns={"ppg_partial":"brand_index"})
     )
@@ -8651,33 +8917,56 @@ def post_modelling_page():
 
     st.markdown("<b>Demand Curves (Volume vs. Price) + Elasticity (Type 2)</b>", unsafe_allow_html=True)
 
-    # Demand curves for Type 2
-    for idx, row in df_merged.iterrows():
-        channel_   = row["Channel"]
-        brand_     = row["Brand"]
-        ppg_       = row["PPG"]
-        intercept  = row["c"]
-        slope_     = row["m"]
-        avg_vol    = row["AvgVolume"]
-        avg_price  = row["Price"]
-        elasticity = row["Elasticity"]
+    # Demand curves for Type 2: a page of sparkline rows, full chart for one model
+    from rgm_plot import sparkline_svg
 
+    def demand_curve(row):
+        """(volumes, prices) of the linear demand curve, or a reason to skip it."""
+        avg_vol, intercept, slope_ = row["AvgVolume"], row["c"], row["m"]
         if avg_vol<=0:
-            st.write(f"Skipping {channel_}-{brand_}-{ppg_}, no positive volume.")
-            continue
-
+            return "no positive volume"
         max_domain_vol= 1.5* avg_vol
         if slope_<0:
             zero_cross= -intercept/ slope_
             if 0< zero_cross< max_domain_vol:
                 max_domain_vol= zero_cross
         if max_domain_vol<=0:
-            st.write(f"Skipping {channel_}-{brand_}-{ppg_} (domain negative).")
-            continue
-
+            return "domain negative"
         volumes= np.linspace(0, max_domain_vol, 100)
         prices= intercept+ slope_* volumes
         prices[prices<0]= 0
+        return volumes, prices
+
+    labels = (df_merged["Channel"].astype(str) + " | " + df_merged["Brand"].astype(str)
+              + " | " + df_merged["PPG"].astype(str)).tolist()
+    page, detail = entity_pager("pm_type2", labels, "model")
+    rows = df_merged.reset_index(drop=True)
+    for pos in page.positions:
+        curve = demand_curve(rows.iloc[pos])
+        elas = rows["Elasticity"].iat[pos]
+        c_name, c_spark, c_elas = st.columns([3, 3, 1])
+        c_name.markdown(("▶ " if pos == detail else "") + labels[pos])
+        if isinstance(curve, str):
+            c_spark.caption(f"skipped – {curve}")
+        else:
+            c_spark.markdown(sparkline_svg(curve[1] * curve[0]), unsafe_allow_html=True)   # revenue
+        c_elas.caption(f"ε {elas:.2f}" if not np.isnan(elas) else "ε N/A")
+
+    for idx in ([] if detail is None else [detail]):
+        row = rows.iloc[idx]
+        channel_   = row["Channel"]
+        brand_     = row["Brand"]
+        ppg_       = row["PPG"]
+        avg_vol    = row["AvgVolume"]
+        avg_price  = row["Price"]
+        elasticity = row["Elasticity"]
+
+        curve = demand_curve(row)
+        if isinstance(curve, str):
+            st.write(f"Skipping {channel_}-{brand_}-{ppg_} ({curve}).")
+            continue
+
+        volumes, prices = curve
         revenues= volumes* prices
         idx_max_= np.argmax(revenues)
         vol_max= volumes[idx_max_]
@@ -8744,7 +9033,9 @@ def post_modelling_page():
         )
         st.plotly_chart(fig, use_container_width=True)
         
-        st.session_state.setdefault("view_figs", {}).setdefault(view_key, []).append(fig)
+        # one entry per model, replaced on every rerun
+        view_key = f"post_modelling_type2|{channel_}|{brand_}|{ppg_}"
+        st.session_state.setdefault("view_figs", {})[view_key] = [fig]
 
 
 
@@ -8759,80 +9050,105 @@ def post_modelling_page():
 # ----------------
 page = st.session_state.page
 
-if page == "home":
-    home_page()
-
-elif page.startswith("section") and "_" not in page:
-    section_number = page.replace("section", "")
-    section_page(section_number)
-
-
-elif "_" in page:
-    # Could be subpages like: section1_baseprice, section1_promodepth, ...
-    # or the universal action pages: section2_action1, etc.
-    if page == "preprocess_validate":
-        validate_page()
-    elif page == "preprocess_feature_overview":
-        feature_overview_page()
-    elif page == "preprocess_prepare":
-        prepare_page()
-    elif page == "preprocess_base_price":
-        base_price_page()
+# session memory budget (see rgm_memory.py): large artifacts the current page
+# does not read may have been spilled to disk – fault in the ones it needs
+PAGE_ARTIFACTS = {
+    "transform_section3": ["transform_history"],
+    "Build_1":            ["final_df", "predictions_df", "combined_results"],
+    "model_selection":    ["final_df", "predictions_df", "combined_results"],
+}
+if "memory_manager" not in st.session_state:          # one spill directory per session
+    st.session_state["memory_manager"] = MemoryManager(pid)
+mem = st.session_state["memory_manager"]
+mem.begin_run()
+mem.adopt(st.session_state)
+mem.restore(st.session_state, PAGE_ARTIFACTS.get(page, []))
+
+# st.stop() / st.rerun() end the script early – commit the state writes the
+# page queued before they do
+try:
+    if page == "home":
+        home_page()
+
+    elif page.startswith("section") and "_" not in page:
+        section_number = page.replace("section", "")
+        section_page(section_number)
+
+
+    elif "_" in page:
+        # Could be subpages like: section1_baseprice, section1_promodepth, ...
+        # or the universal action pages: section2_action1, etc.
+        if page == "preprocess_validate":
+            validate_page()
+        elif page == "preprocess_feature_overview":
+            feature_overview_page()
+        elif page == "preprocess_prepare":
+            prepare_page()
+        elif page == "preprocess_base_price":
+            base_price_page()
         
-    elif page == "preprocess_promo_depth":
-        promo_depth_page()
+        elif page == "preprocess_promo_depth":
+            promo_depth_page()
         
-    # --- NEW SUB-PAGES FOR SECTION 2 ---
-    elif page == "market_construct":
-        market_construct_page()
-    elif page == "price_ladder":
-        price_ladder_page()
-
-    elif page == "feature_overview_2":
-        feature_overview_page_2()
-    elif page == "create_section3":
-        create_page()
-    elif page == "transform_section3":
-        transform_page()
-    elif page == "select_section3":
-        select_page()
-
-    elif page == "Build_1":
-        build_page()
-
-    elif page == "model_selection":
-        model_selection_page()
-    elif page == "post_modelling":
-        post_modelling_page()
+        # --- NEW SUB-PAGES FOR SECTION 2 ---
+        elif page == "market_construct":
+            market_construct_page()
+        elif page == "price_ladder":
+            price_ladder_page()
+
+        elif page == "feature_overview_2":
+            feature_overview_page_2()
+        elif page == "create_section3":
+            create_page()
+        elif page == "transform_section3":
+            transform_page()
+        elif page == "select_section3":
+            select_page()
+
+        elif page == "Build_1":
+            build_page()
+
+        elif page == "model_selection":
+            model_selection_page()
+        elif page == "post_modelling":
+            post_modelling_page()
         
-    elif page == "model_review":
-        model_review_page()
+        elif page == "model_review":
+            model_review_page()
         
-    elif page == "report_1":
-        report_page()
+        elif page == "report_1":
+            report_page()
         
         
-    elif page == "type2_combine":
-            type2_combine_page()
+        elif page == "type2_combine":
+                type2_combine_page()
         
-    else:
-        # fallback
-        section_number, action_number = page.replace("section", "").split("_action")
-        action_page(section_number, action_number)
+        else:
+            # fallback
+            section_number, action_number = page.replace("section", "").split("_action")
+            action_page(section_number, action_number)
+finally:
+    flush_state()
 
 
 # ─────────────────────────── Persisted File Uploads ──────────────────────────
+from rgm_store import ArtifactStore
+from rgm_ingest import submit_ingest
+
 st.sidebar.header("📂 File Management")
+store = ArtifactStore(pid)
 
-# 1️⃣ Rehydrate previously uploaded files
+# 1️⃣ Move legacy JSON blobs into the columnar store (checked once per session)
 st.session_state.setdefault("uploaded_files", {})
-file_names = load_state(pid, "uploaded_file_names", [])
-for name in file_names:
-    if name not in st.session_state.uploaded_files:
-        blob = load_state(pid, f"file_{name}", None)
-        if blob is not None:
-            df = pd.read_json(blob, orient="split")
-            st.session_state.uploaded_files[name] = df
+if not st.session_state.get("legacy_uploads_checked"):
+    stored = set(store.names())
+    for name in load_state(pid, "uploaded_file_names", []):
+        if name not in stored:
+            blob = load_state(pid, f"file_{name}", None)
+            if blob is not None:
+                store.put_frame(name, pd.read_json(blob, orient="split"))
+                delete_state(pid, f"file_{name}")
+    st.session_state["legacy_uploads_checked"] = True
 
 # 2️⃣ File uploader
 uploaded = st.sidebar.file_uploader(
@@ -8841,20 +9157,54 @@ uploaded = st.sidebar.file_uploader(
     accept_multiple_files=True,
 )
 
-# 3️⃣ Process & persist new uploads
-if uploaded:
-    file_list = load_state(pid, "uploaded_file_names", [])
-    for file in uploaded:
-        if file.name not in st.session_state.uploaded_files:
-            df = pd.read_csv(file) if file.name.lower().endswith(".csv") else pd.read_excel(file)
-            st.session_state.uploaded_files[file.name] = df
-            save_state(pid, f"file_{file.name}", df.to_json(orient="split"))
-            file_list.append(file.name)
-    save_state(pid, "uploaded_file_names", file_list)
-
-# 4️⃣ Let the user pick & delete
-if st.session_state.uploaded_files:
-    file_list = list(st.session_state.uploaded_files.keys())
+# 3️⃣ Ingest new uploads on a background worker (keyed by content hash, parsed once
+#     across projects) – the analyst keeps working on the loaded file meanwhile
+seen = st.session_state.setdefault("upload_datasets", {})   # uploader file id → dataset name
+jobs = st.session_state.setdefault("ingest_jobs", {})       # uploader file id → IngestJob
+for file in uploaded or []:
+    fid = getattr(file, "file_id", None) or f"{file.name}:{file.size}"
+    # None marks an upload that was cancelled or failed – not retried until re‑uploaded
+    if fid in jobs or (fid in seen and (seen[fid] is None or seen[fid] in store)):
+        continue
+    jobs[fid] = submit_ingest(file, store, file.name)
+
+def _finish_ingest(fid, job):
+    seen[fid] = job.dataset
+    if job.state == "done":
+        if job.status == "duplicate" and job.dataset != job.name:
+            st.sidebar.info(f"`{job.name}` has the same content as `{job.dataset}` – not stored again.")
+        elif job.status != "duplicate" and job.dataset != job.name:
+            st.sidebar.info(f"`{job.name}` changed – stored as new version `{job.dataset}`.")
+    elif job.state == "failed":
+        st.sidebar.error(f"Could not read `{job.name}`: {job.error}")
+
+for fid, job in list(jobs.items()):
+    if job.finished:
+        _finish_ingest(fid, jobs.pop(fid))
+save_state(pid, "uploaded_file_names", list(store.handles()))
+
+@st.fragment(run_every=1.0)
+def ingest_progress():
+    """Live progress for running ingest jobs; a full rerun once one finishes."""
+    running = st.session_state.get("ingest_jobs", {})
+    if not running:
+        return
+    for fid, job in running.items():
+        st.progress(job.progress, text=f"`{job.name}`: {job.message}")
+        if st.button("✖ Cancel", key=f"cancel_ingest_{fid}"):
+            job.cancel()
+    if any(j.finished for j in running.values()):
+        st.rerun()
+
+if jobs:
+    with st.sidebar:
+        ingest_progress()
+
+# 4️⃣ Let the user pick & delete – stored files are metadata‑only handles,
+#     only the selected one is read from disk (and cached in uploaded_files)
+handles = store.handles()
+file_list = list(handles)
+if file_list:
     # use last saved selection, or fallback
     last_sel = load_state(pid, "selected_file", None)
     default_idx = file_list.index(last_sel) if last_sel in file_list else 0
@@ -8862,34 +9212,54 @@ if st.session_state.uploaded_files:
     selected = st.sidebar.selectbox(
         "Choose a file for analysis:",
         options=file_list,
-        index=default_idx
+        index=default_idx,
+        format_func=lambda n: handles[n].label(),
     )
     st.sidebar.success(f"Using file: `{selected}`")
-
-    # stash & persist choice
-    df = st.session_state.uploaded_files[selected]
-    st.session_state["D0"] = df
+    st.sidebar.caption(f"{len(handles[selected].columns)} columns · {handles[selected].rows:,} rows")
+
+    # stash & persist choice – D0 is only replaced when the selection changes,
+    # so the validated (compact) frame and in‑page updates survive reruns
+    if selected not in st.session_state.uploaded_files:
+        st.session_state.uploaded_files[selected] = handles[selected].load()
+    if st.session_state.get("D0_source") != selected or st.session_state.get("D0") is None:
+        commit_stage("D0", st.session_state.uploaded_files[selected])
+        st.session_state["D0_source"] = selected
     save_state(pid, "selected_file", selected)
     save_state(pid, "selected_file_index", file_list.index(selected))
 
     # 🗑 Delete action
     if st.sidebar.button("🗑 Delete file"):
-        # remove from session
+        # remove from session & columnar store
         st.session_state.uploaded_files.pop(selected, None)
+        store.delete(selected)
 
         # update master list
-        new_list = list(st.session_state.uploaded_files.keys())
-        save_state(pid, "uploaded_file_names", new_list)
+        save_state(pid, "uploaded_file_names", list(store.handles()))
 
-        # delete blobs & selection metadata
-        conn = _db()
-        conn.execute("DELETE FROM project_state WHERE project_id=? AND key=?", (pid, f"file_{selected}"))
-        conn.execute("DELETE FROM project_state WHERE project_id=? AND key=?", (pid, "selected_file"))
-        conn.execute("DELETE FROM project_state WHERE project_id=? AND key=?", (pid, "selected_file_index"))
-        conn.commit()
+        # delete selection metadata
+        delete_state(pid, "selected_file", "selected_file_index")
 
         st.sidebar.success(f"Deleted `{selected}`!")
-        st.experimental_rerun()
+        flush_state()
+        st.rerun()
 
 else:
     st.sidebar.warning("Please upload at least one file.")
+
+# 5️⃣ Dataset stages – what each version really costs in memory
+if dataset_registry().stages():
+    with st.sidebar.expander("🧬 Dataset versions"):
+        st.dataframe(dataset_registry().summary(), hide_index=True, use_container_width=True)
+
+# 6️⃣ Session memory – evict least‑recently‑used artifacts over the budget
+mem.enforce(st.session_state)
+with st.sidebar.expander("🧠 Session memory"):
+    st.caption(f"{mem.resident_mb(st.session_state):,.0f} MB in memory · budget {mem.budget_mb:,.0f} MB")
+    mem.budget_mb = st.number_input("Budget (MB)", 64, 65536, int(mem.budget_mb), step=64, key="mem_budget_mb")
+    if mem.evicted:
+        st.caption("Spilled to disk or cleared this run: " + ", ".join(mem.evicted))
+    st.dataframe(mem.breakdown(st.session_state), hide_index=True, use_container_width=True)
+
+# commit everything queued by save_state() during this rerun in one transaction
+flush_state()
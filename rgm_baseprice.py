@@ -0,0 +1,617 @@
+"""
+Base‑price estimation for the Base‑Price page.
+
+``base_price_series`` is the transition algorithm run on one weekly price
+series: the base price starts at a percentile of the first ``roll`` weeks
+and only moves on a validated step up or down, at most once per ``roll``
+weeks.  The checks each week needs (band counts and order statistics of
+the next ``val_w`` prices) are precomputed for all windows at once by
+``window_levels``, so the scan itself is linear (``tests/test_baseprice.py``
+checks it against the original loop).
+
+``portfolio_base_prices`` runs it for every Channel × Brand × aggregator ×
+PPG series at once – one grouped pass builds all weekly prices, each series
+is a contiguous slice of that table, and the weekly base prices are written
+back to the rows through the row → week group ids (no per‑week masks).
+
+``parameter_sweep`` scores a grid of parameter combinations over all those
+series at once (transition counts, stability, deviation from the observed
+price), scanning every series in lock‑step so thousands of combinations
+stay cheap.
+
+``ScanStore`` keeps where each series' scan stopped, so a weekly refresh
+only scans the appended weeks (``extend_series``).
+
+``method="pelt"`` swaps the scan for the change‑point estimator in
+``rgm_changepoint`` wherever a whole portfolio or a batch of series is run.
+"""
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import rgm_changepoint
+
+AGG_DIMS = ("Variant", "PackType", "PackSize")
+TIME_KEYS = ("Year", "Week", "Month")           # sort order of a weekly series
+DEFAULT_PARAMS: Dict[str, float] = {"roll": 12, "up_th": 5.0, "dn_th": 5.0, "val_w": 12, "perc": 75.0}
+METHODS = {"transition": "Threshold & validate", "pelt": "Change points (PELT)"}
+MAX_WORKERS = os.cpu_count() or 1
+BASEPRICE_WORKERS = min(int(os.environ.get("RGM_BASEPRICE_WORKERS", MAX_WORKERS)), MAX_WORKERS)
+PARALLEL_MIN_WEEKS = 50_000     # below this, starting work in other processes costs more than it saves
+BATCHES_PER_WORKER = 4
+CACHE_SIZE = 512                # memoized series (a few KB each)
+
+ProgressFn = Callable[[float, str], None]
+
+
+def _noop(_frac: float, _msg: str) -> None:
+    pass
+
+
+# ────────────────────────────
+# ▼ One series
+# ────────────────────────────
+def window_levels(price: np.ndarray, val_w: int, perc: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The state‑independent half of the original ``validate_up`` /
+    ``validate_down`` checks for every full window ``price[i:i+val_w]``, as
+    two price levels:
+
+    * ``up[i]``   – a step up at week *i* validates iff the base‑price
+      threshold ``bp·(1+up_th)`` is ≤ ``up[i]``: the smaller of ``price[i]``
+      and the window's (val_w//2)‑th largest value, or −inf when fewer than
+      half the window lies within ±3 % of ``price[i]``;
+    * ``down[i]`` – a step down validates iff ``bp·(1−dn_th)`` ≥ ``down[i]``:
+      ``price[i]``, or +inf when fewer than 9 values lie within ±2 %.
+
+    The third array is each window's ``perc`` percentile, the new base price
+    candidate.  One sort of the sliding window view gives all three (order
+    statistics and band counts), O(n·w log w) in NumPy for the whole array.
+    """
+    m = len(price) - val_w + 1
+    if m <= 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    win = np.sort(sliding_window_view(price, val_w), axis=1)    # NaN sorts last
+    cur = price[:m]
+    half = val_w // 2
+
+    def band(tol_lo, tol_hi):
+        lo = (cur * tol_lo)[:, None]
+        hi = (cur * tol_hi)[:, None]
+        return ((win >= lo) & (win <= hi)).sum(axis=1)
+
+    valid = val_w - np.isnan(win).sum(axis=1)
+    if half:
+        kth = np.take_along_axis(win, np.maximum(valid - half, 0)[:, None], axis=1)[:, 0]
+        kth = np.where(valid >= half, kth, -np.inf)
+    else:
+        kth = np.full(m, np.inf)
+    up = np.where(band(0.97, 1.03) >= half, np.minimum(cur, kth), -np.inf)
+    down = np.where(band(1 - 0.02, 1 + 0.02) >= 9, cur, np.inf)
+    return up, down, np.percentile(win, perc, axis=1)
+
+
+def _scan(price: np.ndarray, up_level: np.ndarray, down_level: np.ndarray, window_pct: np.ndarray,
+          roll: int, up_th: float, dn_th: float, val_w: int, perc: float,
+          start_bp: Optional[float] = None, skip: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    bp = np.empty(len(price))
+    cur_bp = np.percentile(price[:roll], perc) if start_bp is None else start_bp
+    up_level, down_level = up_level.tolist(), down_level.tolist()
+    m = len(up_level)
+    trans = []
+    done, i = 0, skip                               # skip = 0: last_t = −roll, week 0 is already eligible
+    while i < m:
+        up_t = cur_bp * (1 + up_th / 100)
+        dn_t = cur_bp * (1 - dn_th / 100)
+        while i < m and not (up_level[i] >= up_t or down_level[i] <= dn_t):
+            i += 1
+        if i == m:
+            break
+        q = window_pct[i]
+        bp[done:i] = cur_bp
+        cur_bp = max(q, price[i]) if up_level[i] >= up_t else min(q, price[i])
+        bp[i] = cur_bp
+        trans.append(i)
+        done, i = i + 1, i + roll
+    bp[done:] = cur_bp
+    return bp, np.asarray(trans, dtype=np.int64)
+
+
+def base_price_series(price: np.ndarray, roll: int = 12, up_th: float = 5.0, dn_th: float = 5.0,
+                      val_w: int = 12, perc: float = 75.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``(base_price, transition_positions)`` of one weekly price series.
+
+    Same result as the original week‑by‑week loop: the window checks are
+    precomputed by ``window_levels``, so the scan is one comparison pair per
+    week.
+    """
+    price = np.asarray(price, dtype="float64")
+    return _scan(price, *window_levels(price, val_w, perc), roll, up_th, dn_th, val_w, perc)
+
+
+# ────────────────────────────
+# ▼ Whole portfolio
+# ────────────────────────────
+def weekly_table(df: pd.DataFrame, series_keys: Sequence[str]):
+    """
+    Weekly SalesValue / Volume / Price of every series in one grouped pass.
+
+    Returns ``(weeks, row_week, starts)``: the weekly table sorted by series
+    then ``TIME_KEYS``, each row's position in it (−1 where a key is
+    missing) and the first week of every series.
+    """
+    time_keys = [c for c in TIME_KEYS if c in df.columns]
+    grouped = df.groupby(list(series_keys) + time_keys, observed=True, sort=True, dropna=True)
+    row_week = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)   # NaN where a key is missing
+    weeks = grouped.agg(SalesValue=("SalesValue", "sum"), Volume=("Volume", "sum")).reset_index()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weeks["Price"] = weeks["SalesValue"] / weeks["Volume"]
+    keys = weeks[list(series_keys)]
+    new_series = np.ones(len(weeks), dtype=bool)
+    new_series[1:] = (keys.iloc[1:].to_numpy() != keys.iloc[:-1].to_numpy()).any(axis=1)
+    return weeks, row_week, np.flatnonzero(new_series)
+
+
+def series_base_prices(price: np.ndarray, starts: np.ndarray, params: Optional[Dict] = None,
+                       workers: int = 1, progress: ProgressFn = _noop) -> np.ndarray:
+    """
+    Base price of every week; each series is ``price[starts[k]:starts[k+1]]``.
+    Short series stay NaN.  With ``workers > 1`` large inputs are split into
+    contiguous batches of whole series and run on the process pool.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if workers > 1 and len(price) >= PARALLEL_MIN_WEEKS and len(starts) > 1:
+        cuts = np.unique(np.searchsorted(starts, np.linspace(0, len(price), workers * BATCHES_PER_WORKER + 1)[1:-1]))
+        edges = np.r_[0, cuts[(cuts > 0) & (cuts < len(starts))], len(starts)]
+        bounds = np.r_[starts, len(price)]
+        jobs = [(price[bounds[a]:bounds[b]], starts[a:b] - bounds[a], params)
+                for a, b in zip(edges[:-1], edges[1:])]
+        return np.concatenate(run_parallel(series_base_prices, jobs, workers, progress, "series batches"))
+    val_w = params["val_w"]
+    out = np.full(len(price), np.nan)
+    up, down, pct = window_levels(price, val_w, params["perc"])   # windows crossing a series boundary are never read
+    bounds = np.r_[starts, len(price)]
+    lo, hi = bounds[:-1], bounds[1:]
+    run = np.flatnonzero(hi - lo >= params["roll"])
+    first = lo[run, None] + np.arange(params["roll"])            # opening weeks of every series, one percentile call
+    start_bp = np.percentile(price[first], params["perc"], axis=1) if len(run) else []
+    for j, (k, b0) in enumerate(zip(run, start_bp)):
+        full = max(hi[k] - val_w + 1, lo[k])
+        out[lo[k]:hi[k]] = _scan(price[lo[k]:hi[k]], up[lo[k]:full], down[lo[k]:full], pct[lo[k]:full],
+                                 **params, start_bp=b0)[0]
+        if j % 256 == 255:
+            progress((j + 1) / len(run), f"{j + 1:,} / {len(run):,} series")
+    progress(1.0, f"{len(run):,} series")
+    return out
+
+
+def portfolio_base_prices(df: pd.DataFrame, dims: Sequence[str] = AGG_DIMS, params: Optional[Dict] = None,
+                          workers: int = 1, progress: ProgressFn = _noop, method: str = "transition") -> pd.Series:
+    """
+    Row‑aligned base price for the whole frame.
+
+    A row belongs to one series per aggregator dimension; as in the original
+    nested loop the first dimension (``Variant`` before ``PackType`` before
+    ``PackSize``) that yields a base price wins.  *params* belong to
+    *method* (``rgm_changepoint.DEFAULT_PARAMS`` for ``"pelt"``).
+    """
+    out = np.full(len(df), np.nan)
+    dims = [d for d in dims if d in df.columns]
+    for d, dim in enumerate(dims):
+        weeks, row_week, starts = weekly_table(df, ("Channel", "Brand", dim, "PPG"))
+        step = lambda f, msg, d=d, dim=dim: progress((d + f) / len(dims), f"{dim}: {msg}")
+        price = weeks["Price"].to_numpy(dtype="float64", na_value=np.nan)
+        if method == "pelt":
+            week_bp = rgm_changepoint.changepoint_base_prices(price, starts, params, step)[0]
+        else:
+            week_bp = series_base_prices(price, starts, params, workers, step)
+        vals = np.where(row_week >= 0, week_bp[np.maximum(row_week, 0)], np.nan)
+        fill = np.isnan(out)
+        out[fill] = vals[fill]
+    return pd.Series(out, index=df.index, name="BasePrice")
+
+
+def base_prices_many(prices: List[np.ndarray], params: List[Dict], workers: int = 1,
+                     progress: ProgressFn = _noop) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """``base_price_series`` of each series with its own parameters, in input order."""
+    if workers > 1 and sum(len(p) for p in prices) >= PARALLEL_MIN_WEEKS:
+        n = max(1, len(prices) // (workers * BATCHES_PER_WORKER))
+        jobs = [(prices[i:i + n], params[i:i + n]) for i in range(0, len(prices), n)]
+        return [r for part in run_parallel(base_prices_many, jobs, workers, progress, "series batches")
+                for r in part]
+    out = []
+    for k, (p, kw) in enumerate(zip(prices, params)):
+        out.append(base_price_series(p, **kw))
+        progress((k + 1) / len(prices), f"{k + 1:,} / {len(prices):,} series")
+    return out
+
+
+# ────────────────────────────
+# ▼ Parameter sweep
+# ────────────────────────────
+def _scan_many(price: np.ndarray, up: np.ndarray, down: np.ndarray, pct: np.ndarray, lo: np.ndarray,
+               hi: np.ndarray, start_bp: np.ndarray, roll: int, up_th: float, dn_th: float,
+               val_w: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``_scan`` of many series in lock‑step – one vector step per week of the
+    longest series instead of one Python step per week of every series.
+    Returns the base price of every week (NaN outside the series) and a
+    transition flag per week; identical to ``_scan`` series by series.
+    """
+    bp = np.full(len(price), np.nan)
+    flag = np.zeros(len(price), dtype=bool)
+    if not len(lo):
+        return bp, flag
+    cur_bp = np.asarray(start_bp, dtype="float64").copy()
+    full = hi - val_w + 1                              # weeks with a complete validation window
+    eligible_from = lo.copy()
+    last = len(up) - 1
+    for t in range(int((hi - lo).max())):
+        i = lo + t
+        live = i < hi
+        if not live.any():
+            break
+        ok = live & (i < full) & (i >= eligible_from)
+        j = np.minimum(i, last)
+        up_hit = ok & (up[j] >= cur_bp * (1 + up_th / 100))
+        dn_hit = ok & ~up_hit & (down[j] <= cur_bp * (1 - dn_th / 100))
+        if up_hit.any():
+            cur_bp[up_hit] = np.maximum(pct[j[up_hit]], price[i[up_hit]])
+        if dn_hit.any():
+            cur_bp[dn_hit] = np.minimum(pct[j[dn_hit]], price[i[dn_hit]])
+        hit = up_hit | dn_hit
+        eligible_from[hit] = i[hit] + roll
+        flag[i[hit]] = True
+        bp[i[live]] = cur_bp[live]
+    return bp, flag
+
+
+def sweep_grid(grid: Optional[Dict[str, Sequence]] = None) -> List[Dict]:
+    """Every combination of *grid* (missing parameters at their defaults), in product order."""
+    grid = {k: tuple(grid[k]) if grid and k in grid else (v,) for k, v in DEFAULT_PARAMS.items()}
+    return [dict(zip(grid, combo)) for combo in itertools.product(*grid.values())]
+
+
+def _sweep_group(price: np.ndarray, starts: np.ndarray, combos: List[Dict]) -> List[Dict]:
+    """Sweep metrics of *combos*, which all share ``val_w`` and ``perc`` (one ``window_levels`` call)."""
+    val_w, perc = combos[0]["val_w"], combos[0]["perc"]
+    up, down, pct = window_levels(price, val_w, perc)
+    bounds = np.r_[starts, len(price)]
+    lo, hi = bounds[:-1], bounds[1:]
+    series_of = np.repeat(np.arange(len(lo)), hi - lo)
+    start_cache: Dict[int, np.ndarray] = {}
+    rows = []
+    for p in combos:
+        roll = p["roll"]
+        run = np.flatnonzero(hi - lo >= roll)
+        if roll not in start_cache:
+            first = lo[run, None] + np.arange(roll)
+            start_cache[roll] = np.percentile(price[first], perc, axis=1) if len(run) else np.empty(0)
+        start_bp = start_cache[roll]
+        bp, flag = _scan_many(price, up, down, pct, lo[run], hi[run], start_bp, roll,
+                              p["up_th"], p["dn_th"], val_w)
+        weeks = int((hi[run] - lo[run]).sum())
+        n_trans = np.bincount(series_of[flag], minlength=len(lo))[run]
+        # base price just before each transition: previous week, or the opening percentile
+        tpos = np.flatnonzero(flag)
+        opening = np.full(len(lo), np.nan)
+        opening[run] = start_bp
+        prev = np.where(tpos == lo[series_of[tpos]], opening[series_of[tpos]], bp[np.maximum(tpos - 1, 0)])
+        ok = np.isfinite(price) & np.isfinite(bp) & (bp > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dev = np.abs(price[ok] - bp[ok]) / bp[ok]
+            step = np.abs(bp[tpos] - prev) / prev
+        rows.append({
+            **p,
+            "series": len(run),
+            "weeks": weeks,
+            "transitions": int(n_trans.sum()),
+            "transitions_per_year": 52 * n_trans.sum() / weeks if weeks else np.nan,
+            "static_share": float((n_trans == 0).mean()) if len(run) else np.nan,
+            "mean_run_weeks": weeks / (len(run) + n_trans.sum()) if len(run) else np.nan,
+            "mean_step_pct": 100 * float(np.nanmean(step)) if len(tpos) else 0.0,
+            "deviation_pct": 100 * float(dev.mean()) if len(dev) else np.nan,
+            "above_band_share": float((price[ok] > bp[ok] * (1 + p["up_th"] / 100)).mean()) if len(dev) else np.nan,
+        })
+    return rows
+
+
+def parameter_sweep(price: np.ndarray, starts: np.ndarray, grid: Optional[Dict[str, Sequence]] = None,
+                    workers: int = 1, progress: ProgressFn = _noop) -> pd.DataFrame:
+    """
+    One row of portfolio metrics per parameter combination of *grid*, over
+    every series ``price[starts[k]:starts[k+1]]`` (``weekly_table`` layout):
+
+    * ``transitions`` / ``transitions_per_year`` – how often the base moves;
+    * ``static_share`` – series whose base never moves;
+    * ``mean_run_weeks`` – average length of a constant base‑price run;
+    * ``mean_step_pct`` – average size of a move;
+    * ``deviation_pct`` – mean |price − base| / base over all weeks;
+    * ``above_band_share`` – weeks priced above the up threshold (base too low).
+
+    Combinations sharing ``val_w`` and ``perc`` reuse one ``window_levels``
+    pass; groups run on the process pool when the work is large enough.
+    """
+    price = np.asarray(price, dtype="float64")
+    combos = sweep_grid(grid)
+    groups: Dict[tuple, List[Dict]] = {}
+    for p in combos:
+        groups.setdefault((p["val_w"], p["perc"]), []).append(p)
+    jobs = [(price, starts, g) for g in groups.values()]
+    if workers > 1 and len(price) * len(combos) >= PARALLEL_MIN_WEEKS * 4 and len(jobs) > 1:
+        parts = run_parallel(_sweep_group, jobs, workers, progress, "parameter groups")
+    else:
+        parts = []
+        for k, job in enumerate(jobs, 1):
+            parts.append(_sweep_group(*job))
+            progress(k / len(jobs), f"{k} / {len(jobs)} parameter groups")
+    return pd.DataFrame([r for part in parts for r in part])
+
+
+# ────────────────────────────
+# ▼ Memoization
+# ────────────────────────────
+def series_key(price: np.ndarray, params: Dict, method: str = "transition") -> tuple:
+    """(content hash of the weekly prices, roll, up_th, dn_th, val_w, perc) – or the *method*'s own parameters."""
+    arr = np.ascontiguousarray(price, dtype="float64")
+    digest = hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+    if method != "transition":
+        return (digest, method) + tuple(sorted({**rgm_changepoint.DEFAULT_PARAMS, **params}.items()))
+    p = {**DEFAULT_PARAMS, **params}
+    return (digest, int(p["roll"]), float(p["up_th"]), float(p["dn_th"]), int(p["val_w"]), float(p["perc"]))
+
+
+class BasePriceCache:
+    """LRU of finished base‑price series (or anything else keyed by ``series_key``)."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Hashable, object]" = OrderedDict()
+
+    def get(self, key: Hashable):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def many(self, prices: List[np.ndarray], params: List[Dict], workers: int = 1,
+             progress: ProgressFn = _noop, method: str = "transition") -> List[Tuple[np.ndarray, np.ndarray]]:
+        """``base_prices_many`` that only computes the series whose prices or parameters changed."""
+        keys = [series_key(p, kw, method) for p, kw in zip(prices, params)]
+        out = [self.get(key) for key in keys]
+        miss = [k for k, res in enumerate(out) if res is None]
+        todo = ([prices[k] for k in miss], [params[k] for k in miss])
+        if not miss:
+            fresh = []
+        elif method == "pelt":
+            fresh = rgm_changepoint.changepoint_many(*todo, progress)
+        else:
+            fresh = base_prices_many(*todo, workers, progress)
+        for k, res in zip(miss, fresh):
+            out[k] = res
+            self.put(keys[k], res)
+        return out
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def values(self) -> list:
+        return list(self._items.values())
+
+
+# ────────────────────────────
+# ▼ Incremental updates
+# ────────────────────────────
+class ScanState(NamedTuple):
+    """Where the scan of one series stopped – enough to resume it when weeks are appended."""
+    params: tuple            # (roll, up_th, dn_th, val_w, perc)
+    digest: str              # hash of the weekly prices scanned so far
+    base: np.ndarray         # base price of those weeks
+    trans: np.ndarray        # transition weeks
+    weeks: Optional[np.ndarray] = None      # ``week_codes`` of those weeks
+    written: Optional[np.ndarray] = None    # weeks whose base price ``ScanStore`` wrote into the data
+
+
+def week_codes(weeks: pd.DataFrame) -> np.ndarray:
+    """One int64 per week of ``weekly_table``, ordered like ``TIME_KEYS`` – identifies a week across refreshes."""
+    code = np.zeros(len(weeks), dtype=np.int64)
+    for c in TIME_KEYS:
+        if c in weeks.columns:
+            code = code * 1_000 + weeks[c].to_numpy(dtype=np.int64)
+    return code
+
+
+def _digest(price: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(price, dtype="float64").tobytes(), digest_size=16).hexdigest()
+
+
+def extend_series(price: np.ndarray, params: Optional[Dict] = None,
+                  state: Optional[ScanState] = None) -> Tuple[np.ndarray, np.ndarray, ScanState, int]:
+    """
+    ``base_price_series`` of *price*, resumed from *state* when *price* only
+    appends weeks to the series *state* was computed on (same parameters,
+    same earlier prices).  Weeks before the first incomplete validation
+    window of the old series are final; the scan restarts there with the old
+    ``cur_bp`` and ``last_t``.  Returns ``(base, trans, new_state, first
+    week recomputed)`` – 0 after a full recompute, ``len(price)`` when
+    nothing changed.
+    """
+    price = np.asarray(price, dtype="float64")
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    key = series_key(price[:0], p)[1:]
+    roll, val_w = int(p["roll"]), int(p["val_w"])
+    n_old = 0 if state is None else len(state.base)
+    if (state is None or state.params != key or n_old < roll or n_old > len(price)
+            or _digest(price[:n_old]) != state.digest):
+        base, trans = base_price_series(price, **p)
+        return base, trans, ScanState(key, _digest(price), base, trans), 0
+    if n_old == len(price):
+        return state.base, state.trans, state, n_old
+    f = max(n_old - val_w + 1, 0)                  # transitions only happen before f
+    tail = price[f:]
+    skip = max(int(state.trans[-1]) + roll - f, 0) if len(state.trans) else 0
+    base_t, trans_t = _scan(tail, *window_levels(tail, val_w, p["perc"]), roll, p["up_th"], p["dn_th"],
+                            val_w, p["perc"], start_bp=state.base[-1], skip=skip)
+    base = np.concatenate([state.base[:f], base_t])
+    trans = np.concatenate([state.trans, trans_t + f]).astype(np.int64)
+    return base, trans, ScanState(key, _digest(price), base, trans), f
+
+
+class ScanStore:
+    """
+    Per‑series ``ScanState`` of one dataset, keyed by ``(dimension, Channel,
+    Brand, value, PPG)`` – after a weekly refresh ``update`` only scans the
+    appended weeks (plus the last ``val_w`` weeks whose look‑ahead changed).
+    Picklable, so it can live in the project's artifact store between
+    sessions; it only ever holds the series of the last frame it updated.
+    """
+
+    def __init__(self):
+        self.states: Dict[tuple, ScanState] = {}
+
+    def update(self, df: pd.DataFrame, dims: Sequence[str] = AGG_DIMS, params: Optional[Dict] = None,
+               progress: ProgressFn = _noop) -> Tuple[pd.Series, pd.Series, Dict[str, int]]:
+        """
+        ``df["BasePrice"]`` completed from the stored states: missing values
+        are filled as ``portfolio_base_prices`` would, and values this store
+        wrote on an earlier run (still unchanged in *df*) are replaced by the
+        current scan; anything else – saved per PPG or supplied with the data
+        – is kept.  Also returns a row mask of the values written and counts
+        of series that were ``unchanged`` / ``extended`` / ``recomputed`` and
+        weeks scanned.  States of series no longer in *df* are dropped.
+        """
+        cur = (df["BasePrice"].to_numpy(dtype="float64", na_value=np.nan) if "BasePrice" in df.columns
+               else np.full(len(df), np.nan))
+        new = np.full(len(df), np.nan)
+        owned = np.zeros(len(df), dtype=bool)          # value still the one this store wrote last time
+        claim = np.full(len(df), -1, dtype=np.int64)   # dimension that supplies each row's base price
+        stats = {"unchanged": 0, "extended": 0, "recomputed": 0, "weeks": 0}
+        states: Dict[tuple, ScanState] = {}
+        tables = []
+        roll = int({**DEFAULT_PARAMS, **(params or {})}["roll"])
+        dims = [d for d in dims if d in df.columns]
+        for d, dim in enumerate(dims):
+            keys = ("Channel", "Brand", dim, "PPG")
+            weeks, row_week, starts = weekly_table(df, keys)
+            price = weeks["Price"].to_numpy(dtype="float64", na_value=np.nan)
+            codes = week_codes(weeks)
+            labels = [(dim,) + lab for lab in weeks[list(keys)].iloc[starts].itertuples(index=False, name=None)]
+            bounds = np.r_[starts, len(price)]
+            week_bp = np.full(len(price), np.nan)
+            week_old = np.full(len(price), np.nan)     # base price this store wrote for the week, if any
+            for k, skey in enumerate(labels):
+                lo, hi = bounds[k], bounds[k + 1]
+                old = self.states.get(skey)
+                if old is not None and old.written is not None and len(old.weeks):
+                    pos = np.minimum(np.searchsorted(old.weeks, codes[lo:hi]), len(old.weeks) - 1)
+                    hit = (old.weeks[pos] == codes[lo:hi]) & old.written[pos]
+                    week_old[lo:hi] = np.where(hit, old.base[pos], np.nan)
+                if hi - lo < roll:
+                    continue
+                base, _, state, first = extend_series(price[lo:hi], params, old)
+                states[skey] = state._replace(weeks=codes[lo:hi])
+                week_bp[lo:hi] = base
+                stats["weeks"] += int(hi - lo - first)
+                stats["unchanged" if first == hi - lo else "recomputed" if first == 0 else "extended"] += 1
+                if k % 256 == 255:
+                    progress((d + (k + 1) / len(starts)) / len(dims), f"{dim}: {k + 1:,} / {len(starts):,} series")
+            ok = row_week >= 0
+            rw = np.maximum(row_week, 0)
+            vals = np.where(ok, week_bp[rw], np.nan)
+            take = np.isnan(new) & ~np.isnan(vals)
+            new[take] = vals[take]
+            claim[take] = d
+            owned[take] = cur[take] == week_old[rw[take]]
+            tables.append((labels, bounds, row_week))
+        write = ~np.isnan(new) & (np.isnan(cur) | owned)
+        # remember which weeks now carry this store's value
+        for d, (labels, bounds, row_week) in enumerate(tables):
+            flag = np.zeros(bounds[-1], dtype=bool)
+            flag[row_week[write & (claim == d)]] = True
+            for k, skey in enumerate(labels):
+                if skey in states:
+                    states[skey] = states[skey]._replace(written=flag[bounds[k]:bounds[k + 1]])
+        self.states = states
+        progress(1.0, f"{stats['extended']:,} extended · {stats['recomputed']:,} recomputed · "
+                      f"{stats['unchanged']:,} unchanged")
+        return (pd.Series(np.where(write, new, cur), index=df.index, name="BasePrice"),
+                pd.Series(write, index=df.index, name="BasePriceUpdated"), stats)
+
+
+def assign_weekly(df: pd.DataFrame, pos: np.ndarray, weeks: pd.DataFrame,
+                  column: str = "BasePrice") -> pd.DataFrame:
+    """Copy of *df* with ``column`` of rows *pos* set from the weekly table *weeks* (joined on the time keys)."""
+    time_keys = [c for c in TIME_KEYS if c in df.columns and c in weeks.columns]
+    vals = (df.iloc[pos][time_keys]
+              .merge(weeks[time_keys + [column]], how="left", on=time_keys)[column]
+              .to_numpy(dtype="float64", na_value=np.nan))
+    out = df.copy(deep=False)
+    col = out[column].to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    col[pos] = vals
+    out[column] = col
+    return out
+
+
+# ────────────────────────────
+# ▼ Process pool
+# ────────────────────────────
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ProcessPoolExecutor:
+    """
+    The process‑wide pool of ``MAX_WORKERS`` spawned processes (no Streamlit
+    threads are forked).  Created once and shared by every session; each
+    call caps its own concurrency, so changing the worker count never tears
+    down a pool other sessions are using.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def run_parallel(fn, jobs: List[tuple], workers: int, progress: ProgressFn = _noop, what: str = "jobs") -> list:
+    """
+    ``[fn(*job) for job in jobs]`` on the process pool with at most *workers*
+    jobs in flight – results in job order, progress as they finish.
+    """
+    pool = _executor()
+    queue = iter(enumerate(jobs))
+    running: Dict = {}
+
+    def submit_next() -> None:
+        nxt = next(queue, None)
+        if nxt is not None:
+            running[pool.submit(fn, *nxt[1])] = nxt[0]
+
+    for _ in range(max(1, min(int(workers), len(jobs)))):
+        submit_next()
+    out = [None] * len(jobs)
+    done = 0
+    while running:
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            out[running.pop(fut)] = fut.result()
+            done += 1
+            progress(done / len(jobs), f"{done} / {len(jobs)} {what}")
+            submit_next()
+    return out
@@ -0,0 +1,212 @@
+"""
+Change‑point base‑price estimator (PELT).
+
+An alternative to the threshold‑and‑validate scan in ``rgm_baseprice``: each
+weekly price series is split into regimes by penalized least squares (a
+change in mean costs ``penalty · σ² · log n``; σ is a robust estimate of
+the week‑to‑week noise, so one penalty fits every series), and the base
+price of a regime is a percentile of its prices.  Promo weeks (more than
+``promo_tol`` % under the local ``perc`` percentile) carry no weight in the
+cost, so temporary dips never open a regime of their own.
+
+The optimal partition is found with PELT (optimal partitioning with
+pruning of candidates that can never be optimal again).  Series are run in
+lock‑step, a block of similar‑length series at a time: each week is one
+vector step over the block's live candidates, so thousands of series cost a
+few hundred NumPy calls instead of a Python loop per series and week.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_PARAMS: Dict[str, float] = {"penalty": 3.0, "min_size": 8, "perc": 75.0, "promo_tol": 5.0}
+BLOCK_SERIES = 1_024            # series per lock‑step block (sorted by length)
+
+ProgressFn = Callable[[float, str], None]
+
+
+def _noop(_frac: float, _msg: str) -> None:
+    pass
+
+
+# ────────────────────────────
+# ▼ PELT
+# ────────────────────────────
+def _fill_gaps(x: np.ndarray) -> np.ndarray:
+    """Carry the last finite price forward (backward at the start) along each row."""
+    ok = np.isfinite(x)
+    idx = np.where(ok, np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    out = np.take_along_axis(x, idx, axis=1)
+    first = np.argmax(ok, axis=1)
+    lead = np.arange(x.shape[1]) < first[:, None]
+    out[lead] = np.take_along_axis(x, first[:, None], axis=1).repeat(x.shape[1], axis=1)[lead]
+    return np.nan_to_num(out)
+
+
+def noise_scale(x: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Per row σ from the median absolute week‑to‑week difference (robust to level shifts)."""
+    d = np.abs(np.diff(x, axis=1))
+    d[np.arange(d.shape[1]) >= (lengths - 1)[:, None]] = np.nan
+    with np.errstate(all="ignore"):
+        sigma = np.nanmedian(d, axis=1) * 1.4826 / np.sqrt(2)
+        level = np.abs(np.nanmedian(np.where(np.arange(x.shape[1]) < lengths[:, None], x, np.nan), axis=1))
+    floor = np.maximum(level * 1e-3, 1e-9)          # flat series: changes of ~0.1 % still count
+    return np.where(np.isfinite(sigma) & (sigma > floor), sigma, floor)
+
+
+def _window_percentile(x: np.ndarray, before: int, after: int, perc: float) -> np.ndarray:
+    """Linear‑interpolated ``perc`` percentile of the finite values in weeks [t‑before, t+after] (NaN if none)."""
+    padded = np.pad(x, ((0, 0), (before, after)), constant_values=np.nan)
+    win = np.sort(sliding_window_view(padded, before + after + 1, axis=1), axis=-1)   # NaN sorts last
+    valid = np.isfinite(win).sum(axis=-1)
+    # np.nanpercentile, without its per‑row loop
+    rank = np.maximum(valid - 1, 0) * (perc / 100)
+    below = np.floor(rank).astype(np.int64)
+    above = np.minimum(below + 1, np.maximum(valid - 1, 0))
+    lo_v = np.take_along_axis(win, below[..., None], axis=-1)[..., 0]
+    hi_v = np.take_along_axis(win, above[..., None], axis=-1)[..., 0]
+    return np.where(valid > 0, lo_v + (hi_v - lo_v) * (rank - below), np.nan)
+
+
+def promo_weeks(x: np.ndarray, min_size: int, perc: float, promo_tol: float) -> np.ndarray:
+    """
+    Weeks priced more than *promo_tol* % under the ``perc`` percentile of both
+    the min_size weeks up to them and the min_size weeks from them on – the
+    lower of the two one‑sided references, so the weeks before a step up are
+    not mistaken for a dip.
+    """
+    h = max(int(min_size), 1)
+    ref = np.fmin(_window_percentile(x, h, 0, perc), _window_percentile(x, 0, h, perc))
+    with np.errstate(invalid="ignore"):
+        return np.isfinite(ref) & (x < ref * (1 - promo_tol / 100))
+
+
+def pelt_block(x: np.ndarray, lengths: np.ndarray, beta: np.ndarray, min_size: int,
+               weights: Optional[np.ndarray] = None) -> List[np.ndarray]:
+    """
+    Optimal change points of every row ``x[k, :lengths[k]]`` under a
+    (weighted) L2 change‑in‑mean cost plus ``beta[k]`` per change, segments
+    at least *min_size* weeks long.  Returns, per row, the start of every
+    segment after the first.
+    """
+    n_rows, width = x.shape
+    m = max(int(min_size), 1)
+    w = np.ones_like(x) if weights is None else weights.astype("float64")
+    x = np.where(w > 0, x, 0.0)
+    c0 = np.zeros((n_rows, width + 1))
+    c1 = np.zeros((n_rows, width + 1))
+    c2 = np.zeros((n_rows, width + 1))
+    np.cumsum(w, axis=1, out=c0[:, 1:])
+    np.cumsum(w * x, axis=1, out=c1[:, 1:])
+    np.cumsum(w * x * x, axis=1, out=c2[:, 1:])
+    f = np.full((n_rows, width + 1), np.inf)
+    f[:, 0] = -beta
+    last = np.zeros((n_rows, width + 1), dtype=np.int64)
+    # week at which each candidate was pruned; with a minimum segment length a
+    # pruning at t only takes effect from t + min_size, when t itself can start the last segment
+    never = np.iinfo(np.int64).max
+    pruned = np.full((n_rows, width + 1), never, dtype=np.int64)
+    rows = np.arange(n_rows)
+    lo = 0
+    for t in range(m, width + 1):
+        hi = t - m + 1                               # candidates s in [lo, hi): segment (s, t] ≥ m weeks
+        s0 = c0[:, t, None] - c0[:, lo:hi]
+        s1 = c1[:, t, None] - c1[:, lo:hi]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cost = (c2[:, t, None] - c2[:, lo:hi]) - np.where(s0 > 0, s1 * s1 / s0, 0.0)
+        base = f[:, lo:hi] + cost
+        total = np.where(pruned[:, lo:hi] > t - m, base, np.inf) + beta[:, None]
+        j = np.argmin(total, axis=1)
+        f[:, t] = total[rows, j]
+        last[:, t] = lo + j
+        # PELT: once F(s) + C(s, t) > F(t), s never starts the last segment again
+        window = pruned[:, lo:hi]
+        window[(window == never) & ~(base <= f[:, t, None])] = t
+        live = (window > t + 1 - m) & np.isfinite(f[:, lo:hi])
+        busy = live.any(axis=0)
+        lo += int(np.argmax(busy)) if busy.any() else hi - lo
+    out = []
+    for k in range(n_rows):
+        cps, pos = [], int(lengths[k])
+        while pos > 0:
+            pos = int(last[k, pos])
+            if pos > 0:
+                cps.append(pos)
+        out.append(np.asarray(cps[::-1], dtype=np.int64))
+    return out
+
+
+# ────────────────────────────
+# ▼ Base prices
+# ────────────────────────────
+def changepoint_base_prices(price: np.ndarray, starts: np.ndarray, params: Optional[Dict] = None,
+                            progress: ProgressFn = _noop) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``(base price of every week, change‑point flag of every week)`` for the
+    series ``price[starts[k]:starts[k+1]]`` (``rgm_baseprice.weekly_table``
+    layout).  Series shorter than two segments keep one regime.
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    price = np.asarray(price, dtype="float64")
+    bounds = np.r_[starts, len(price)].astype(np.int64)
+    lo, lengths = bounds[:-1], np.diff(bounds)
+    flag = np.zeros(len(price), dtype=bool)
+    order = np.argsort(lengths, kind="stable")
+    done = 0
+    for b in range(0, len(order), BLOCK_SERIES):
+        block = order[b:b + BLOCK_SERIES]
+        n = lengths[block]
+        width = int(n.max()) if len(n) else 0
+        if width < 2 * max(int(p["min_size"]), 1):
+            done += len(block)
+            continue
+        cols = np.arange(width)
+        take = np.minimum(lo[block, None] + cols, len(price) - 1)
+        x = np.where(cols < n[:, None], price[take], np.nan)
+        w = np.isfinite(x) & ~promo_weeks(x, p["min_size"], p["perc"], p["promo_tol"])
+        x = _fill_gaps(np.where(w, x, np.nan))
+        sigma = noise_scale(x, n)
+        x = x / sigma[:, None]                       # unit noise: one penalty for every series
+        beta = p["penalty"] * np.log(np.maximum(n, 2)).astype("float64")
+        for k, cps in zip(block, pelt_block(x, n, beta, int(p["min_size"]), w)):
+            flag[lo[k] + cps] = True
+        done += len(block)
+        progress(done / len(order), f"{done:,} / {len(order):,} series")
+    # regime ids → percentile of every regime's observed prices
+    series_start = np.zeros(len(price), dtype=bool)
+    series_start[lo[lengths > 0]] = True
+    regime = np.cumsum(series_start | flag) - 1
+    level = (pd.Series(price).groupby(regime).quantile(p["perc"] / 100)
+               .reindex(np.arange(regime.max() + 1 if len(regime) else 0)).to_numpy())
+    progress(1.0, f"{len(order):,} series")
+    return (level[regime] if len(regime) else np.empty(0)), flag
+
+
+def changepoint_series(price: np.ndarray, penalty: float = DEFAULT_PARAMS["penalty"],
+                       min_size: int = DEFAULT_PARAMS["min_size"], perc: float = DEFAULT_PARAMS["perc"],
+                       promo_tol: float = DEFAULT_PARAMS["promo_tol"]) -> Tuple[np.ndarray, np.ndarray]:
+    """``(base_price, change_point_positions)`` of one weekly price series."""
+    base, flag = changepoint_base_prices(np.asarray(price, dtype="float64"), np.array([0]),
+                                         {"penalty": penalty, "min_size": min_size, "perc": perc,
+                                          "promo_tol": promo_tol})
+    return base, np.flatnonzero(flag)
+
+
+def changepoint_many(prices: List[np.ndarray], params: List[Dict],
+                     progress: ProgressFn = _noop) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """``changepoint_series`` of each series, in input order; series sharing parameters run as one batch."""
+    out: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(prices)
+    groups: Dict[tuple, List[int]] = {}
+    for k, kw in enumerate(params):
+        groups.setdefault(tuple(sorted({**DEFAULT_PARAMS, **kw}.items())), []).append(k)
+    for g, (key, members) in enumerate(groups.items()):
+        arrs = [np.asarray(prices[k], dtype="float64") for k in members]
+        starts = np.r_[0, np.cumsum([len(a) for a in arrs])[:-1]].astype(np.int64)
+        base, flag = changepoint_base_prices(np.concatenate(arrs) if arrs else np.empty(0), starts, dict(key))
+        for k, a, s in zip(members, arrs, starts):
+            out[k] = (base[s:s + len(a)], np.flatnonzero(flag[s:s + len(a)]))
+        progress((g + 1) / len(groups), f"{g + 1} / {len(groups)} parameter sets")
+    return out
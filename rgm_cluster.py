@@ -0,0 +1,122 @@
+"""
+Exact one‑dimensional k‑means for the promo‑depth bins.
+
+``PromoDepth`` is a single column, so optimal k‑means is a partition of the
+sorted values into contiguous runs.  ``kmeans_1d`` finds it by dynamic
+programming (as in Ckmeans.1d.dp): layer *m* holds the best cost of every
+prefix split into *m* clusters, and the optimal split points are monotone,
+so each layer is filled by divide and conquer – one vectorized NumPy step
+per recursion level, O(k · n log n) overall.  A single call yields the
+optimal inertia for every k up to ``k_max`` (the elbow plot) and the labels
+and centers for any of them, with no refits and no random starts.
+
+Values are standardized first by default, like the ``StandardScaler`` +
+``KMeans`` pipeline it replaces, so the inertias (and hence the elbow) are
+on the same scale; centers are returned in the original units.
+"""
+import numpy as np
+
+K_MAX = 7
+
+
+class KMeans1D:
+    """Optimal partitions of one sorted sample for k = 1 … ``k_max``."""
+
+    def __init__(self, values: np.ndarray, order: np.ndarray, back: np.ndarray, inertias: np.ndarray):
+        self._values = values            # sorted, original units
+        self._order = order              # sorted position → input position
+        self._back = back                # back[m, i]: start of the last cluster of the best m+1 split of i points
+        self.inertias = inertias         # inertias[k‑1], on the scale the fit ran on
+        self.k_max = len(inertias)
+
+    def bounds(self, k: int) -> np.ndarray:
+        """Start of every cluster in the sorted values, plus the end (k + 1 positions)."""
+        if not 1 <= k <= self.k_max:
+            raise ValueError(f"k must be in 1..{self.k_max}")
+        cuts = [len(self._values)]
+        for m in range(k - 1, -1, -1):
+            cuts.append(int(self._back[m, cuts[-1]]))
+        return np.asarray(cuts[::-1], dtype=np.int64)
+
+    def labels(self, k: int) -> np.ndarray:
+        """Cluster of every input value; clusters are numbered by increasing center."""
+        sorted_labels = np.repeat(np.arange(k), np.diff(self.bounds(k)))
+        out = np.empty(len(sorted_labels), dtype=np.int64)
+        out[self._order] = sorted_labels
+        return out
+
+    def centers(self, k: int) -> np.ndarray:
+        """Mean of every cluster (original units), ascending."""
+        b = self.bounds(k)
+        sums = np.add.reduceat(self._values, b[:-1]) if len(self._values) else np.zeros(k)
+        return sums / np.diff(b)
+
+
+def _sse(c1: np.ndarray, c2: np.ndarray, j: np.ndarray, i: np.ndarray) -> np.ndarray:
+    """Sum of squared deviations of sorted values j … i‑1 (prefix sums c1, c2)."""
+    s1 = c1[i] - c1[j]
+    return np.maximum(c2[i] - c2[j] - s1 * s1 / (i - j), 0.0)
+
+
+def _layer(prev: np.ndarray, c1: np.ndarray, c2: np.ndarray, m: int, n: int):
+    """
+    ``cur[i] = min_j prev[j] + sse(j, i)`` for i = m+1 … n, j = m … i‑1, and
+    the (leftmost) argmin.  The argmin is monotone in i, so the rows are
+    solved level by level: the middle row of every open interval at once,
+    each searching only between its neighbours' argmins.
+    """
+    cur = np.full(n + 1, np.inf)
+    arg = np.zeros(n + 1, dtype=np.int64)
+    i_lo, i_hi = np.array([m + 1]), np.array([n])
+    j_lo, j_hi = np.array([m]), np.array([n - 1])
+    while len(i_lo):
+        mid = (i_lo + i_hi) // 2
+        top = np.minimum(j_hi, mid - 1)
+        width = top - j_lo + 1
+        seg = np.repeat(np.arange(len(mid)), width)
+        j = j_lo[seg] + np.arange(width.sum()) - np.repeat(np.cumsum(width) - width, width)
+        i = mid[seg]
+        val = prev[j] + _sse(c1, c2, j, i)
+        starts = np.cumsum(width) - width
+        best = np.minimum.reduceat(val, starts)
+        hit = np.flatnonzero(val <= best[seg])
+        first = hit[np.r_[True, seg[hit][1:] != seg[hit][:-1]]]          # leftmost minimum per row
+        opt = j[first]
+        cur[mid], arg[mid] = val[first], opt
+        left = i_lo <= mid - 1
+        right = mid + 1 <= i_hi
+        i_lo, i_hi, j_lo, j_hi = (np.r_[i_lo[left], mid[right] + 1], np.r_[mid[left] - 1, i_hi[right]],
+                                  np.r_[j_lo[left], opt[right]], np.r_[opt[left], j_hi[right]])
+    return cur, arg
+
+
+def kmeans_1d(values, k_max: int = K_MAX, standardize: bool = True) -> KMeans1D:
+    """
+    Exact k‑means of a 1‑D sample for every k in 1 … min(k_max, n).  NaN
+    values are not allowed (drop them first).
+    """
+    x = np.asarray(values, dtype="float64").ravel()
+    if not len(x):
+        raise ValueError("kmeans_1d needs at least one value")
+    if np.isnan(x).any():
+        raise ValueError("kmeans_1d: NaN in input")
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+    n = len(xs)
+    k_max = max(1, min(int(k_max), n))
+    z = xs
+    if standardize:
+        sd = xs.std()
+        z = (xs - xs.mean()) / (sd if sd > 0 else 1.0)     # StandardScaler leaves constant data unscaled
+    c1 = np.r_[0.0, np.cumsum(z)]
+    c2 = np.r_[0.0, np.cumsum(z * z)]
+    back = np.zeros((k_max, n + 1), dtype=np.int64)
+    cost = np.empty(k_max)
+    idx = np.arange(1, n + 1)
+    layer = np.full(n + 1, np.inf)
+    layer[1:] = _sse(c1, c2, np.zeros(n, dtype=np.int64), idx)
+    cost[0] = layer[n]
+    for m in range(1, k_max):
+        layer, back[m] = _layer(layer, c1, c2, m, n)
+        cost[m] = layer[n]
+    return KMeans1D(xs, order, back, cost)
@@ -0,0 +1,185 @@
+"""
+Correlation matrices for the Feature Overview pages.
+
+* Pearson  – one BLAS ``corrcoef`` when there are no gaps, pandas' pairwise
+  routine otherwise;
+* Spearman – every column is ranked once, then Pearson on the ranks; only
+  pairs whose gaps (NaNs) differ are re‑ranked on their common rows;
+* Kendall  – tau‑b per pair from a merge‑count of discordant pairs
+  (O(n log² n) in NumPy instead of pandas' O(n²)), or an explicit estimate
+  on a fixed random sample of rows.
+
+``CorrelationCache`` keeps finished matrices per (dataset version, filter,
+method, columns, sample) so re‑renders and threshold masking never
+recompute.
+"""
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+KENDALL_SAMPLE_ROWS = 50_000      # default sample size for the Kendall estimate
+CACHE_SIZE = 16
+
+
+# ────────────────────────────
+# ▼ Kendall tau‑b
+# ────────────────────────────
+def _pairs_tied(codes: np.ndarray) -> int:
+    counts = np.bincount(codes)
+    return int((counts * (counts - 1) // 2).sum())
+
+
+def _count_inversions(r: np.ndarray) -> int:
+    """Strict inversions of an integer sequence by bottom‑up merge counting."""
+    n = len(r)
+    if n < 2:
+        return 0
+    size = 1 << (n - 1).bit_length()
+    big = int(r.max()) + 1
+    a = np.full(size, big, dtype=np.int64)
+    a[:n] = r
+    span = big + 1
+    inv, w = 0, 1
+    while w < size:
+        blocks = a.reshape(-1, 2, w)
+        off = (np.arange(blocks.shape[0], dtype=np.int64) * span)[:, None]
+        left = (blocks[:, 0, :] + off).ravel()          # globally sorted
+        right = (blocks[:, 1, :] + off).ravel()
+        pos = np.searchsorted(left, right, side="right") - np.repeat(np.arange(blocks.shape[0]) * w, w)
+        inv += int((w - pos).sum())
+        a = np.sort(blocks.reshape(-1, 2 * w), axis=1).ravel()
+        w *= 2
+    return inv
+
+
+def kendall_tau_b(x: np.ndarray, y: np.ndarray) -> float:
+    """Kendall's tau‑b of two complete (NaN‑free) vectors."""
+    n = len(x)
+    if n < 2:
+        return np.nan
+    xc = np.unique(x, return_inverse=True)[1].astype(np.int64)
+    yc = np.unique(y, return_inverse=True)[1].astype(np.int64)
+    order = np.lexsort((yc, xc))                 # by x, ties by y → no inversions inside x ties
+    discordant = _count_inversions(yc[order])
+    n0 = n * (n - 1) // 2
+    n1, n2 = _pairs_tied(xc), _pairs_tied(yc)
+    n3 = _pairs_tied(np.unique(xc * (int(yc.max()) + 1) + yc, return_inverse=True)[1])
+    s = n0 - n1 - n2 + n3 - 2 * discordant
+    denom = np.sqrt(float(n0 - n1) * float(n0 - n2))
+    return s / denom if denom else np.nan
+
+
+def kendall_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    cols = list(df.columns)
+    arr = df.to_numpy(dtype="float64", na_value=np.nan)
+    out = np.eye(len(cols))
+    for i in range(len(cols)):
+        for j in range(i + 1, len(cols)):
+            ok = ~(np.isnan(arr[:, i]) | np.isnan(arr[:, j]))
+            out[i, j] = out[j, i] = kendall_tau_b(arr[ok, i], arr[ok, j])
+    return pd.DataFrame(out, index=cols, columns=cols)
+
+
+# ────────────────────────────
+# ▼ Pearson / Spearman
+# ────────────────────────────
+def pearson_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    arr = df.to_numpy(dtype="float64", na_value=np.nan)
+    if not np.isnan(arr).any():
+        return pd.DataFrame(np.corrcoef(arr, rowvar=False), index=df.columns, columns=df.columns)
+    return df.astype("float64").corr(method="pearson")
+
+
+def _subset_ranks(order: np.ndarray, values: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    """
+    Average ranks (ties share theirs) of ``values[keep]``, in row order –
+    from the sort order of the whole column, so no re‑sort per pair.
+    """
+    o = order[keep[order]]
+    v = values[o]
+    start = np.flatnonzero(np.r_[True, v[1:] != v[:-1]])
+    size = np.diff(np.r_[start, len(v)])
+    ranks = np.empty(len(values))
+    ranks[o] = np.repeat(start + (size + 1) / 2, size)
+    return ranks[keep]
+
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> float:
+    if len(x) < 2:
+        return np.nan
+    x, y = x - x.mean(), y - y.mean()
+    denom = np.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / denom) if denom else np.nan
+
+
+def spearman_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pairwise‑complete Spearman, as ``df.corr("spearman")``.  Every column is
+    ranked once and correlated as Pearson on the ranks – exact for pairs
+    with the same gaps; a pair whose gaps differ is re‑ranked on its
+    common rows.
+    """
+    arr = df.to_numpy(dtype="float64", na_value=np.nan)
+    out = pearson_matrix(df.rank(method="average")).to_numpy(copy=True)
+    gaps = np.isnan(arr)
+    holed = set(np.flatnonzero(gaps.any(axis=0)).tolist())
+    orders = {}
+    for i in sorted(holed):
+        for j in range(arr.shape[1]):
+            if j == i or (j in holed and j < i) or np.array_equal(gaps[:, i], gaps[:, j]):
+                continue
+            ok = ~(gaps[:, i] | gaps[:, j])
+            for c in (i, j):
+                if c not in orders:
+                    orders[c] = np.argsort(arr[:, c], kind="stable")
+            out[i, j] = out[j, i] = _pearson(_subset_ranks(orders[i], arr[:, i], ok),
+                                             _subset_ranks(orders[j], arr[:, j], ok))
+    return pd.DataFrame(out, index=df.columns, columns=df.columns)
+
+
+def correlation_matrix(df: pd.DataFrame, method: str = "pearson",
+                       sample: Optional[int] = None, seed: int = 0) -> pd.DataFrame:
+    """``df.corr(method)`` equivalent; *sample* rows are drawn once for Kendall estimates."""
+    if sample is not None and len(df) > sample:
+        rows = np.sort(np.random.default_rng(seed).choice(len(df), sample, replace=False))
+        df = df.iloc[rows]
+    if method == "pearson":
+        return pearson_matrix(df)
+    if method == "spearman":
+        return spearman_matrix(df)
+    if method == "kendall":
+        return kendall_matrix(df)
+    raise ValueError(f"unknown correlation method: {method}")
+
+
+class CorrelationCache:
+    """LRU of finished correlation matrices."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+
+    def get(self, key: Hashable, df: pd.DataFrame, cols: Sequence[str], method: str,
+            sample: Optional[int] = None) -> pd.DataFrame:
+        full_key = (key, tuple(cols), method, sample)
+        corr = self._items.get(full_key)
+        if corr is None:
+            corr = self._items[full_key] = correlation_matrix(df[list(cols)], method, sample)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        else:
+            self._items.move_to_end(full_key)
+        return corr
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def retain(self, keep: Callable[[Hashable], bool]) -> None:
+        """Drop the matrices whose key fails *keep* (e.g. superseded dataset versions)."""
+        for key in [k for k in self._items if not keep(k[0])]:
+            del self._items[key]
+
+    def values(self) -> list:
+        return list(self._items.values())
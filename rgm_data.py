@@ -0,0 +1,268 @@
+"""
+Dataset representation helpers – compact dtypes for RGM panel data.
+
+Dimension columns (Channel, Brand, PPG, …) are stored as ``category`` and
+integer columns are downcast to the narrowest dtype that holds every value
+exactly; float measures are kept as float64.  ``compact_dataset`` applies this once, at validation, and every
+page consumes the result: equality filters on a categorical compare integer
+codes instead of Python strings.
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+DIMENSION_COLS = ["Channel", "Brand", "Variant", "PackType", "PackSize", "PPG", "Market"]
+CATEGORY_MAX_RATIO = 0.5      # other text columns become categorical below this unique/rows ratio
+MIN_INT_BYTES = 4             # never below int32 – pages multiply measures in place
+TIME_COLS = ["Date", "Year", "Month", "Week"]
+# stage a dataset is derived from when it is first committed without an explicit parent
+STAGE_PARENTS = {"dataframe1": "D0", "create_data": "dataframe1", "transform_data": "create_data"}
+
+
+# ────────────────────────────
+# ▼ Column compaction
+# ────────────────────────────
+def _downcast_int(s: pd.Series) -> pd.Series:
+    out = pd.to_numeric(s, downcast="integer")
+    return out.astype("int32") if out.dtype.itemsize < MIN_INT_BYTES else out
+
+
+def downcast_numeric(s: pd.Series) -> pd.Series:
+    """
+    Narrowest int dtype (≥ int32); float measures stay float64.
+
+    SalesValue, Volume, Price and BasePrice are summed and divided on every
+    page, and float32 arithmetic drifts visibly in those totals, so narrower
+    float columns are widened rather than narrowed.
+    """
+    if pd.api.types.is_bool_dtype(s) or not pd.api.types.is_numeric_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        return _downcast_int(s)
+    if pd.api.types.is_float_dtype(s) and s.dtype != "float64":
+        return s.astype("float64")
+    return s
+
+
+def is_dimension(col: str, s: pd.Series) -> bool:
+    """Known dimension column, or a text column with few distinct values."""
+    if col in DIMENSION_COLS:
+        return True
+    if col in TIME_COLS:
+        return False
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return True
+    if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+        n = len(s)
+        return n > 0 and s.nunique(dropna=True) / n < CATEGORY_MAX_RATIO
+    return False
+
+
+def infer_schema(sample: pd.DataFrame) -> dict:
+    """``{column: "category" | "numeric" | "other"}`` decided from a sample chunk."""
+    schema = {}
+    for col in sample.columns:
+        s = sample[col]
+        if is_dimension(col, s):
+            schema[col] = "category"
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            schema[col] = "numeric"
+        else:
+            schema[col] = "other"
+    return schema
+
+
+def apply_schema(chunk: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Cast one chunk's dimension columns to ``category`` (numerics are downcast after concat)."""
+    out = {}
+    for col in chunk.columns:
+        s = chunk[col]
+        kind = schema.get(col, "other")
+        if kind == "category" and not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype("category")
+        out[col] = s
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def concat_chunks(chunks: List[pd.DataFrame], schema: Optional[dict] = None) -> pd.DataFrame:
+    """Concatenate chunks keeping categoricals categorical, then downcast numerics."""
+    if not chunks:
+        return pd.DataFrame()
+    columns = list(chunks[0].columns)
+    data = {}
+    for col in columns:
+        parts = [c[col] for c in chunks if col in c.columns]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            try:
+                data[col] = pd.Series(union_categoricals(parts, ignore_order=True))
+            except TypeError:       # e.g. PackSize parsed as int in one chunk, str in another
+                data[col] = pd.concat([p.astype(object) for p in parts], ignore_index=True).astype("category")
+        else:
+            data[col] = pd.concat(parts, ignore_index=True)
+        if schema is None or schema.get(col) == "numeric":
+            data[col] = downcast_numeric(data[col])
+    return pd.DataFrame(data, columns=columns)
+
+
+
+# ────────────────────────────
+# ▼ Canonical dataset
+# ────────────────────────────
+def sorted_categorical(s: pd.Series) -> pd.Series:
+    """Categorical with unused levels dropped and categories sorted – a stable code table."""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype("category")
+    cats = sorted(s.cat.remove_unused_categories().cat.categories, key=str)
+    return s.cat.set_categories(cats)
+
+
+def compact_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical compact frame: sorted categorical dimensions, downcast integer
+    columns, float64 measures and a datetime ``Date``.  A no‑op on frames it has already produced.
+    """
+    if df.attrs.get("rgm_compact"):
+        return df
+
+    data, date_failures = {}, 0
+    for col in df.columns:
+        s = df[col]
+        if col == "Date" and not pd.api.types.is_datetime64_any_dtype(s):
+            parsed = pd.to_datetime(s, errors="coerce")
+            date_failures = int(parsed.isna().sum() - s.isna().sum())
+            if date_failures == 0:
+                s = parsed
+        elif is_dimension(col, s):
+            s = sorted_categorical(s)
+        else:
+            s = downcast_numeric(s)
+        data[col] = s
+
+    out = pd.DataFrame(data, index=df.index)
+    out.attrs.update(df.attrs)
+    out.attrs["rgm_compact"] = True
+    out.attrs["date_parse_failures"] = date_failures
+    return out
+
+
+def expand_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    """Plain object columns again, for code that zero‑fills or concatenates dimensions."""
+    cats = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not cats:
+        return df
+    return df.astype({c: object for c in cats})
+
+
+# ────────────────────────────
+# ▼ Copy‑on‑write dataset registry
+# ────────────────────────────
+def enable_copy_on_write() -> None:
+    """Turn on pandas Copy‑on‑Write (always on from pandas 3)."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def _extension_buffer(arr):
+    """Address of the data behind an extension array (views of it share it)."""
+    chunked = getattr(arr, "_pa_array", None)                 # Arrow‑backed (str, …)
+    if chunked is not None:
+        return tuple(b.address for c in chunked.chunks for b in c.buffers() if b is not None)
+    for attr in ("_ndarray", "_data"):                          # NumPy‑backed / masked (Int64, …)
+        data = getattr(arr, attr, None)
+        if isinstance(data, np.ndarray):
+            return data.__array_interface__["data"][0]
+    return id(arr)
+
+
+def column_buffers(df: pd.DataFrame) -> dict:
+    """``{column: (address, nbytes)}`` of each column's backing buffer."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            arr = s.cat.codes.to_numpy()
+        else:
+            # only NumPy dtypes hand back their own block; extension arrays convert to a temporary
+            arr = s.to_numpy() if isinstance(s.dtype, np.dtype) else None
+        if isinstance(arr, np.ndarray):
+            out[col] = (arr.__array_interface__["data"][0], arr.nbytes)
+        else:
+            out[col] = (_extension_buffer(s.array), int(s.memory_usage(index=False, deep=False)))
+    return out
+
+
+class DatasetVersion:
+    """One immutable stage of the dataset (e.g. ``D0`` → ``dataframe1`` → ``create_data``)."""
+
+    def __init__(self, stage: str, version: int, frame: pd.DataFrame,
+                 parent: Optional["DatasetVersion"] = None):
+        self.stage = stage
+        self.version = version
+        self.frame = frame
+        # only the lineage is kept – holding the parent frame would pin every old version
+        self.parent = (parent.stage, parent.version) if parent is not None else None
+        own = column_buffers(frame)
+        base = column_buffers(parent.frame) if parent is not None else {}
+        self.changed = [c for c, b in own.items() if base.get(c) != b]
+        self.new_bytes = sum(own[c][1] for c in self.changed)
+
+    def view(self) -> pd.DataFrame:
+        """Cheap shallow view – with Copy‑on‑Write, writes never reach the snapshot."""
+        return self.frame.copy(deep=False)
+
+
+class DatasetRegistry:
+    """
+    Named dataset stages kept as copy‑on‑write versions.
+
+    ``commit`` snapshots a frame without copying its data; columns the page
+    did not touch keep pointing at the parent's buffers, so only changed or
+    added columns cost memory.  ``checkout`` hands out a shallow view.
+    """
+
+    def __init__(self):
+        self._stages: dict = {}
+        self._counter = 0
+
+    def __contains__(self, stage: str) -> bool:
+        return stage in self._stages
+
+    def stages(self) -> List[str]:
+        return list(self._stages)
+
+    def get(self, stage: str) -> Optional[DatasetVersion]:
+        return self._stages.get(stage)
+
+    def checkout(self, stage: str) -> Optional[pd.DataFrame]:
+        v = self._stages.get(stage)
+        return v.view() if v is not None else None
+
+    def commit(self, stage: str, df: pd.DataFrame, parent: Optional[str] = None) -> pd.DataFrame:
+        """Register *df* as the new version of *stage*; returns the stored snapshot."""
+        self._counter += 1
+        if parent:
+            base = self._stages.get(parent)
+        else:
+            base = self._stages.get(stage) or self._stages.get(STAGE_PARENTS.get(stage))
+        snap = df.copy(deep=False)
+        self._stages[stage] = DatasetVersion(stage, self._counter, snap, base)
+        return snap
+
+    def drop(self, stage: str) -> None:
+        self._stages.pop(stage, None)
+
+    def summary(self) -> pd.DataFrame:
+        rows = []
+        for stage, v in self._stages.items():
+            rows.append({
+                "Stage": stage,
+                "Version": v.version,
+                "Parent": f"{v.parent[0]} v{v.parent[1]}" if v.parent else "—",
+                "Rows": len(v.frame),
+                "Columns": v.frame.shape[1],
+                "Changed columns": len(v.changed),
+                "New MB": round(v.new_bytes / 1e6, 2),
+            })
+        return pd.DataFrame(rows)
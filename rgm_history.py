@@ -0,0 +1,143 @@
+"""
+Column‑delta undo / redo history for the Transform page.
+
+Instead of pushing a full copy of the working frame before every action,
+``checkpoint`` keeps a shallow (copy‑on‑write) snapshot and ``seal``
+reduces it to the columns the action actually added, dropped or replaced.
+Undo and redo then rebuild the frame by swapping only those columns, and
+the stored deltas are kept under a memory cap – the oldest steps are
+forgotten first.
+"""
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from rgm_data import column_buffers
+
+HISTORY_MAX_MB = float(os.environ.get("RGM_HISTORY_MB", 256))
+
+
+def _nbytes(s: pd.Series) -> int:
+    return int(s.memory_usage(index=False, deep=False))
+
+
+def _assemble(cols: Dict[str, pd.Series], order: List[str], index: pd.Index) -> pd.DataFrame:
+    """Frame from column Series without copying their data."""
+    return pd.DataFrame({c: cols[c] for c in order if c in cols}, index=index, copy=False)
+
+
+class Delta:
+    """What one transformation changed, column by column."""
+
+    def __init__(self, desc: str, before: pd.DataFrame, after: pd.DataFrame):
+        self.desc = desc
+        self.before_cols = list(before.columns)
+        self.after_cols = list(after.columns)
+        self.rows_changed = not before.index.equals(after.index)
+        if self.rows_changed:
+            # row filters cannot be expressed per column – keep both sides whole
+            self.old = {c: before[c] for c in before.columns}
+            self.new = {c: after[c] for c in after.columns}
+            self.old_index, self.new_index = before.index, after.index
+            return
+
+        b_buf, a_buf = column_buffers(before), column_buffers(after)
+        self.old: Dict[str, pd.Series] = {}
+        self.new: Dict[str, pd.Series] = {}
+        for c in self.before_cols:
+            if c not in a_buf:
+                self.old[c] = before[c]
+            elif b_buf[c] != a_buf[c] and not before[c].equals(after[c]):
+                self.old[c], self.new[c] = before[c], after[c]
+        for c in self.after_cols:
+            if c not in b_buf:
+                self.new[c] = after[c]
+        self.old_index = self.new_index = after.index
+
+    @property
+    def empty(self) -> bool:
+        return not (self.old or self.new or self.rows_changed or self.before_cols != self.after_cols)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(_nbytes(s) for s in self.old.values()) + sum(_nbytes(s) for s in self.new.values())
+
+    def _swap(self, current: pd.DataFrame, drop: Dict, put: Dict, order: List[str], index) -> pd.DataFrame:
+        if self.rows_changed:
+            return _assemble(put, order, index)
+        cols = {c: current[c] for c in current.columns if c not in drop}
+        cols.update(put)
+        return _assemble(cols, order, index)
+
+    def undo(self, current: pd.DataFrame) -> pd.DataFrame:
+        return self._swap(current, self.new, self.old, self.before_cols, self.old_index)
+
+    def redo(self, current: pd.DataFrame) -> pd.DataFrame:
+        return self._swap(current, self.old, self.new, self.after_cols, self.new_index)
+
+
+class TransformHistory:
+    """Undo / redo stacks of column deltas with a memory cap (MB)."""
+
+    def __init__(self, max_mb: float = HISTORY_MAX_MB):
+        self.max_mb = max_mb
+        self.undo_stack: List[Delta] = []
+        self.redo_stack: List[Delta] = []
+        self._pending = None          # (desc, shallow snapshot) until sealed
+
+    # ────────────────────────────
+    # ▼ Recording
+    # ────────────────────────────
+    def checkpoint(self, df: pd.DataFrame, desc: str) -> None:
+        """Mark the state before an action; costs nothing until the action writes."""
+        self._pending = (desc, df.copy(deep=False))
+
+    def seal(self, current: Optional[pd.DataFrame]) -> Optional[Delta]:
+        """Turn the pending checkpoint into a delta against *current*."""
+        if self._pending is None or current is None:
+            return None
+        desc, before = self._pending
+        self._pending = None
+        delta = Delta(desc, before, current)
+        if delta.empty:
+            return None
+        self.undo_stack.append(delta)
+        self.redo_stack.clear()
+        self.trim()
+        return delta
+
+    def trim(self) -> None:
+        """Forget the oldest steps until the history fits in ``max_mb``."""
+        cap = self.max_mb * 1e6
+        while self.undo_stack and self.nbytes > cap:
+            if self.redo_stack:
+                self.redo_stack.pop(0)
+            else:
+                self.undo_stack.pop(0)
+
+    # ────────────────────────────
+    # ▼ Undo / redo
+    # ────────────────────────────
+    def undo(self, current: pd.DataFrame) -> Optional[pd.DataFrame]:
+        self.seal(current)
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        self.redo_stack.append(delta)
+        return delta.undo(current)
+
+    def redo(self, current: pd.DataFrame) -> Optional[pd.DataFrame]:
+        self.seal(current)
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        self.undo_stack.append(delta)
+        return delta.redo(current)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(d.nbytes for d in self.undo_stack) + sum(d.nbytes for d in self.redo_stack)
+
+    def descriptions(self) -> List[str]:
+        return [d.desc for d in self.undo_stack]
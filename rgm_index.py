@@ -0,0 +1,166 @@
+"""
+Inverted index of categorical values → row positions.
+
+The sidebar filters and the Channel → Brand → Aggregator → PPG drill‑downs
+used to rebuild a boolean mask over the whole frame for every widget on
+every rerun.  ``CategoryIndex`` factorizes each filter column once (lazily,
+on first use) and keeps, per value, the sorted positions of its rows:
+
+* ``select`` starts from the shortest posting list and narrows it with the
+  other filters' codes – O(result) instead of O(rows × filters);
+* ``values`` lists the options still present in a slice (drill‑down menus);
+* ``groups`` enumerates composite keys (e.g. Channel/Brand/PPG) with their
+  positions, for loops over every combination.
+
+``IndexCache`` keeps indexes per dataset version.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_SIZE = 8
+
+
+class _Postings:
+    """One column: value codes plus the rows of each code, grouped."""
+
+    def __init__(self, s: pd.Series):
+        codes, uniques = pd.factorize(s, sort=False)
+        self.codes = codes.astype(np.int64, copy=False)
+        self.uniques = list(uniques)
+        self.lookup: Dict[Hashable, int] = {v: i for i, v in enumerate(self.uniques)}
+        # rows sorted by code (stable → ascending positions inside each value); NaN (-1) first
+        self.order = np.argsort(self.codes, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(self.codes + 1,
+                                                                  minlength=len(self.uniques) + 1))))
+
+    def code(self, value) -> int:
+        try:
+            return self.lookup.get(value, -2)
+        except TypeError:                         # unhashable filter value
+            return -2
+
+    def positions(self, code: int) -> np.ndarray:
+        return self.order[self.offsets[code + 1]:self.offsets[code + 2]]
+
+    def count(self, code: int) -> int:
+        return int(self.offsets[code + 2] - self.offsets[code + 1])
+
+
+class CategoryIndex:
+    """Value → row‑position postings for the categorical columns of one frame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = len(df)
+        self._df = df                            # columns are indexed on first use
+        self._cols: Dict[str, _Postings] = {}
+        self._groups: Dict[tuple, list] = {}
+
+    def column(self, col: str) -> _Postings:
+        if col not in self._cols:
+            self._cols[col] = _Postings(self._df[col])
+        return self._cols[col]
+
+    def positions(self, col: str, value) -> np.ndarray:
+        p = self.column(col)
+        code = p.code(value)
+        return p.positions(code) if code >= 0 else np.array([], dtype=np.int64)
+
+    def select(self, filters: Iterable[Tuple[str, object]] = (),
+               exclude: Iterable[Tuple[str, object]] = ()) -> np.ndarray:
+        """Sorted positions of the rows matching every ``(col, value)`` filter and no *exclude* pair."""
+        terms = []
+        for col, value in filters:
+            p = self.column(col)
+            code = p.code(value)
+            if code < 0:
+                return np.array([], dtype=np.int64)
+            terms.append((p.count(code), p, code))
+        if terms:
+            terms.sort(key=lambda t: t[0])
+            _, p, code = terms[0]
+            pos = p.positions(code)
+            for _, p, code in terms[1:]:
+                pos = pos[p.codes[pos] == code]
+        else:
+            pos = np.arange(self.rows)
+        for col, value in exclude:
+            p = self.column(col)
+            code = p.code(value)
+            if code >= 0:
+                pos = pos[p.codes[pos] != code]
+        return pos
+
+    def take(self, df: pd.DataFrame, pos: np.ndarray) -> pd.DataFrame:
+        """Rows *pos* of *df* (the indexed frame or a column‑extended view of it)."""
+        return df if len(pos) == self.rows else df.iloc[pos]
+
+    def slice(self, df: pd.DataFrame, filters: Iterable[Tuple[str, object]] = (),
+              exclude: Iterable[Tuple[str, object]] = ()) -> pd.DataFrame:
+        return self.take(df, self.select(filters, exclude))
+
+    def values(self, col: str, pos: Optional[np.ndarray] = None) -> list:
+        """Sorted distinct non‑null values of *col*, optionally within the rows *pos*."""
+        p = self.column(col)
+        if pos is None:
+            present = np.flatnonzero(np.diff(p.offsets[1:]) > 0)
+        else:
+            present = np.unique(p.codes[pos])
+            present = present[present >= 0]
+        return sorted(p.uniques[c] for c in present)
+
+    def groups(self, cols: Sequence[str],
+               within: Optional[np.ndarray] = None) -> List[Tuple[tuple, np.ndarray]]:
+        """
+        ``[(key, positions)]`` for every non‑null combination of *cols*,
+        ordered like nested loops over first appearance.  Full‑frame results
+        are memoized.
+        """
+        cols = tuple(cols)
+        if within is None and cols in self._groups:
+            return self._groups[cols]
+        posts = [self.column(c) for c in cols]
+        pos = np.arange(self.rows) if within is None else np.asarray(within)
+        sub = np.stack([p.codes[pos] for p in posts]) if posts else np.empty((0, len(pos)), np.int64)
+        keep = (sub >= 0).all(axis=0)
+        pos, sub = pos[keep], sub[:, keep]
+        order = np.lexsort(sub[::-1])            # stable: positions stay ascending per group
+        pos, sub = pos[order], sub[:, order]
+        breaks = np.flatnonzero((np.diff(sub, axis=1) != 0).any(axis=0)) + 1
+        bounds = zip(np.r_[0, breaks], np.r_[breaks, len(pos)]) if len(pos) else ()
+        out = [(tuple(p.uniques[sub[j, s]] for j, p in enumerate(posts)), pos[s:e])
+               for s, e in bounds]
+        if within is None:
+            self._groups[cols] = out
+        return out
+
+
+class IndexCache:
+    """Small LRU of category indexes keyed by dataset version."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Hashable, CategoryIndex]" = OrderedDict()
+
+    def get(self, key: Hashable, df: pd.DataFrame) -> CategoryIndex:
+        idx = self._items.get(key)
+        if idx is None:
+            idx = self._items[key] = CategoryIndex(df)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        else:
+            self._items.move_to_end(key)
+        return idx
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def retain(self, keep: Callable[[Hashable], bool]) -> None:
+        """Drop the indexes whose key fails *keep* (e.g. superseded dataset versions)."""
+        for key in [k for k in self._items if not keep(k)]:
+            del self._items[key]
+
+    def values(self) -> list:
+        return list(self._items.values())
@@ -0,0 +1,172 @@
+"""
+Streaming ingest for CSV / Excel uploads.
+
+Files are read in row chunks; the first chunk fixes the schema (which
+columns become categoricals, which are numeric measures) and every later
+chunk is compacted as soon as it is read, so peak memory stays close to the
+size of the final compact frame instead of the raw string columns.
+
+``submit_ingest`` runs the whole thing – hashing, parsing, compaction and
+the write to the artifact store – on a background thread so the Streamlit
+script thread stays free; the returned ``IngestJob`` exposes progress and
+can be cancelled.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from rgm_data import apply_schema, concat_chunks, infer_schema
+
+CHUNK_ROWS = 200_000
+INGEST_WORKERS = int(os.environ.get("RGM_INGEST_WORKERS", 2))
+
+ProgressFn = Callable[[float, str], None]
+
+
+def _noop(_frac: float, _msg: str) -> None:
+    pass
+
+
+def _size_of(fh) -> int:
+    size = getattr(fh, "size", None)
+    if size is None:
+        pos = fh.tell()
+        fh.seek(0, os.SEEK_END)
+        size = fh.tell()
+        fh.seek(pos)
+    return size or 1
+
+
+# ────────────────────────────
+# ▼ Chunk readers
+# ────────────────────────────
+def iter_csv_chunks(fh, chunk_rows: int = CHUNK_ROWS, progress: ProgressFn = _noop) -> Iterator[pd.DataFrame]:
+    """Yield raw CSV chunks, reporting progress by bytes consumed."""
+    total = _size_of(fh)
+    rows = 0
+    for chunk in pd.read_csv(fh, chunksize=chunk_rows):
+        rows += len(chunk)
+        progress(min(fh.tell() / total, 1.0), f"{rows:,} rows read")
+        yield chunk
+
+
+def iter_excel_chunks(fh, chunk_rows: int = CHUNK_ROWS, progress: ProgressFn = _noop) -> Iterator[pd.DataFrame]:
+    """Yield chunks of the first worksheet using openpyxl's streaming reader."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        total = max((ws.max_row or 1) - 1, 1)
+        rows_iter = ws.iter_rows(values_only=True)
+        header = next(rows_iter, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+
+        buf, rows = [], 0
+        for row in rows_iter:
+            buf.append(row)
+            if len(buf) >= chunk_rows:
+                rows += len(buf)
+                progress(min(rows / total, 1.0), f"{rows:,} rows read")
+                yield pd.DataFrame.from_records(buf, columns=columns)
+                buf = []
+        if buf:
+            rows += len(buf)
+            progress(1.0, f"{rows:,} rows read")
+            yield pd.DataFrame.from_records(buf, columns=columns)
+    finally:
+        wb.close()
+
+
+# ────────────────────────────
+# ▼ Entry point
+# ────────────────────────────
+def read_upload(fh, name: Optional[str] = None, chunk_rows: int = CHUNK_ROWS,
+                progress: Optional[ProgressFn] = None) -> pd.DataFrame:
+    """Read a CSV / XLSX upload chunk by chunk into a compact DataFrame."""
+    progress = progress or _noop
+    name = name or getattr(fh, "name", "")
+    reader = iter_csv_chunks if name.lower().endswith(".csv") else iter_excel_chunks
+
+    schema, chunks = None, []
+    for chunk in reader(fh, chunk_rows, progress):
+        if schema is None:
+            schema = infer_schema(chunk)
+        chunks.append(apply_schema(chunk, schema))
+
+    progress(1.0, "Compacting columns")
+    return concat_chunks(chunks, schema)
+
+
+# ────────────────────────────
+# ▼ Background jobs
+# ────────────────────────────
+class IngestCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled."""
+
+
+class IngestJob:
+    """One upload being parsed into the artifact store off the script thread."""
+
+    def __init__(self, name: str, data: bytes, store, chunk_rows: int = CHUNK_ROWS):
+        self.name = name
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.state = "queued"            # queued → running → done | cancelled | failed
+        self.progress = 0.0
+        self.message = "Waiting for a worker"
+        self.dataset: Optional[str] = None
+        self.status: Optional[str] = None
+        self.error: Optional[str] = None
+        self._data = data
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "cancelled", "failed")
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        if self.state == "queued":
+            self.state, self.message = "cancelled", "Cancelled"
+
+    def _progress(self, frac: float, msg: str) -> None:
+        if self._cancel.is_set():
+            raise IngestCancelled(self.name)
+        self.progress, self.message = frac, msg
+
+    def run(self) -> None:
+        if self._cancel.is_set():
+            return
+        self.state = "running"
+        fh = io.BytesIO(self._data)
+        fh.name = self.name
+        try:
+            self.dataset, self.status = self.store.add_upload(
+                fh, lambda f: read_upload(f, self.name, self.chunk_rows, self._progress)
+            )
+            self.state, self.progress, self.message = "done", 1.0, "Ready"
+        except IngestCancelled:
+            self.state, self.message = "cancelled", "Cancelled"
+        except Exception as exc:          # surfaced in the sidebar, never kills the worker
+            self.state, self.error, self.message = "failed", str(exc), "Failed"
+        finally:
+            self._data = None             # release the raw upload bytes
+
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="rgm-ingest")
+
+
+def submit_ingest(fh, store, name: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> IngestJob:
+    """Queue an upload for background ingest and return its job handle."""
+    name = name or getattr(fh, "name", "upload")
+    data = fh.getvalue() if hasattr(fh, "getvalue") else fh.read()
+    job = IngestJob(name, data, store, chunk_rows)
+    _executor.submit(job.run)
+    return job
@@ -0,0 +1,443 @@
+"""
+Per‑session memory budget for large ``st.session_state`` artifacts.
+
+Registered artifacts are measured after every run; when the session is
+over budget the least‑recently‑used ones are pickled into the project's
+artifact store and replaced by a small ``Spilled`` placeholder.
+
+* dict‑valued artifacts (``uploaded_files``, ``type2_dfs``, …) are wrapped
+  in a ``SpillDict`` – each entry is spilled on its own and faults back in
+  transparently on ``d[key]``;
+* single artifacts (``final_df``, ``transform_history``, …) are restored
+  before the pages that read them run (see ``restore``).
+
+Session caches (``index_cache``, ``profile_cache``, …) are measured too and,
+when over budget, cleared rather than spilled – they rebuild on demand.
+
+Anything touched during the current run is never evicted.  Sizes count
+column buffers, not objects: a buffer shared by several artifacts counts
+once, and one still held by a dataset stage (``D0`` is a shallow snapshot
+of the selected upload) counts for nothing – spilling it frees nothing.
+
+Spill files live in ``<project>/_spill/<session>``; the directory is removed
+when its manager is garbage‑collected (the session ended) or the process
+exits, and directories idle for ``SPILL_MAX_AGE_H`` hours are swept when a
+new session starts.
+"""
+import os
+import pickle
+import shutil
+import sys
+import time
+import uuid
+import weakref
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from rgm_data import column_buffers
+from rgm_store import STORE_ROOT, ArtifactStore, check_project_id
+
+MEMORY_BUDGET_MB = float(os.environ.get("RGM_SESSION_BUDGET_MB", 1024))
+SPILL_MAX_AGE_H = float(os.environ.get("RGM_SPILL_MAX_AGE_H", 24))
+DICT_ARTIFACTS = ("uploaded_files", "type2_dfs", "type2_results", "type2_predictions", "view_figs")
+SINGLE_ARTIFACTS = ("final_df", "predictions_df", "combined_results", "transform_history")
+CACHE_ARTIFACTS = ("index_cache", "profile_cache", "sketch_cache", "corr_cache",
+                   "baseprice_cache", "baseprice_figures")
+
+
+class Spilled:
+    """Placeholder for an artifact that currently lives on disk."""
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __repr__(self) -> str:
+        return f"<spilled {self.name} ({self.nbytes / 1e6:.1f} MB)>"
+
+
+def estimate_bytes(obj) -> int:
+    """In‑memory size of a frame, array, history or container of those."""
+    if obj is None or isinstance(obj, Spilled):
+        return 0
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(index=True, deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(getattr(obj, "nbytes", None), int):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(estimate_bytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_bytes(v) for v in obj)
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def _index_key(df: pd.DataFrame):
+    """Buffer key of a frame's index – None for a RangeIndex, which holds no data."""
+    idx = df.index
+    if isinstance(idx, pd.RangeIndex):
+        return None
+    if isinstance(idx.dtype, np.dtype):
+        return ("index", idx.to_numpy().__array_interface__["data"][0])
+    return ("index", id(idx))
+
+
+def footprint_keys(df: pd.DataFrame) -> List[tuple]:
+    """Buffer keys of a frame: one per column and the index (views of one frame share them)."""
+    keys = [("col", addr) for addr, _ in column_buffers(df).values()]
+    idx = _index_key(df)
+    return keys + [idx] if idx is not None else keys
+
+
+def footprint(obj) -> Dict:
+    """``{buffer key: bytes}`` – per column for frames, the whole object otherwise."""
+    if isinstance(obj, pd.DataFrame):
+        usage = obj.memory_usage(index=True, deep=True)
+        out = {("col", addr): int(usage.get(col, 0)) for col, (addr, _) in column_buffers(obj).items()}
+        idx = _index_key(obj)
+        if idx is not None:
+            out[idx] = int(usage.get("Index", 0))
+        return out
+    return {("obj", id(obj)): estimate_bytes(obj)}
+
+
+def deep_footprint(obj, out: Dict = None, seen: set = None) -> Dict:
+    """
+    ``footprint`` of everything *obj* references: frames, series and arrays
+    inside containers and inside this package's own objects (cache entries
+    such as ``CategoryIndex`` keep the frame they were built from).
+    """
+    out = {} if out is None else out
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen:
+        return out
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        out.update(footprint(obj))
+    elif isinstance(obj, pd.Series):
+        out.update(footprint(obj.to_frame()))
+    elif isinstance(obj, np.ndarray):
+        out[("col", obj.__array_interface__["data"][0])] = int(obj.nbytes)
+    elif isinstance(obj, (str, bytes, int, float, bool, np.generic)):
+        out[("obj", id(obj))] = sys.getsizeof(obj)
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            deep_footprint(v, out, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for v in obj:
+            deep_footprint(v, out, seen)
+    elif type(obj).__module__.startswith("rgm_") and hasattr(obj, "__dict__"):
+        for v in vars(obj).values():
+            deep_footprint(v, out, seen)
+    else:
+        out.update(footprint(obj))
+    return out
+
+
+def _spill_root(project_id) -> str:
+    return os.path.join(STORE_ROOT, check_project_id(project_id), "_spill")
+
+
+def _last_write(path: str) -> float:
+    stamps = [os.path.getmtime(path)]
+    for entry in os.scandir(path):
+        try:
+            stamps.append(entry.stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return max(stamps)
+
+
+_live: "weakref.WeakSet" = weakref.WeakSet()       # managers of this process – never swept
+
+
+def sweep_spill(project_id, max_age_h: float = SPILL_MAX_AGE_H) -> int:
+    """Remove spill directories of sessions idle for more than *max_age_h* hours."""
+    root = _spill_root(project_id)
+    live = {m.store.path for m in list(_live)}
+    cutoff = time.time() - max_age_h * 3600
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            stale = entry.is_dir() and entry.path not in live and _last_write(entry.path) < cutoff
+        except FileNotFoundError:
+            continue
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class SpillDict(MutableMapping):
+    """dict whose values may be spilled to disk and are loaded on access."""
+
+    def __init__(self, data: Dict, manager: "MemoryManager", key: str):
+        self._data = dict(data)
+        self._manager = manager
+        self._key = key
+
+    def unit(self, k) -> str:
+        return f"{self._key}[{k}]"
+
+    def __getitem__(self, k):
+        v = self._data[k]
+        if isinstance(v, Spilled):
+            v = self._data[k] = self._manager.load(v)
+        self._manager.touch(self.unit(k))
+        return v
+
+    def __setitem__(self, k, v) -> None:
+        old = self._data.get(k)
+        if isinstance(old, Spilled):
+            self._manager.discard(old)
+        self._data[k] = v
+        self._manager.touch(self.unit(k))
+
+    def __delitem__(self, k) -> None:
+        v = self._data.pop(k)
+        if isinstance(v, Spilled):
+            self._manager.discard(v)
+        self._manager.forget(self.unit(k))
+
+    def __contains__(self, k) -> bool:        # membership must not fault values in
+        return k in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def raw_items(self):
+        """Items without loading spilled values."""
+        return self._data.items()
+
+    def evict(self, k) -> None:
+        self._data[k] = self._manager.spill(self.unit(k), self._data[k])
+
+
+class MemoryManager:
+    """Tracks artifact sizes and last use, and enforces the session budget."""
+
+    def __init__(self, project_id, budget_mb: float = MEMORY_BUDGET_MB,
+                 dict_keys: Iterable[str] = DICT_ARTIFACTS,
+                 single_keys: Iterable[str] = SINGLE_ARTIFACTS,
+                 cache_keys: Iterable[str] = CACHE_ARTIFACTS):
+        self.budget_mb = budget_mb
+        self.dict_keys = tuple(dict_keys)
+        self.single_keys = tuple(single_keys)
+        self.cache_keys = tuple(cache_keys)
+        # spill files are private to this session and go away with it
+        sweep_spill(project_id)
+        self.store = ArtifactStore(uuid.uuid4().hex[:12], root=_spill_root(project_id))
+        weakref.finalize(self, shutil.rmtree, self.store.path, True)
+        _live.add(self)
+        self._tick = 0
+        self._run_start = 0
+        self._last: Dict[str, int] = {}
+        self._sizes: Dict[str, tuple] = {}    # unit -> (identity, footprint)
+        self.evicted: List[str] = []
+
+    # ────────────────────────────
+    # ▼ Bookkeeping
+    # ────────────────────────────
+    def touch(self, unit: str) -> None:
+        self._tick += 1
+        self._last[unit] = self._tick
+
+    def forget(self, unit: str) -> None:
+        self._last.pop(unit, None)
+        self._sizes.pop(unit, None)
+
+    def begin_run(self) -> None:
+        """Start of a script run – whatever is touched from now on is pinned."""
+        self._run_start = self._tick + 1
+        self.evicted = []
+        try:
+            os.utime(self.store.path)         # a live session's spill directory is never swept
+        except FileNotFoundError:
+            pass
+
+    def footprint_of(self, unit: str, obj) -> Dict:
+        if isinstance(obj, Spilled):
+            return {}
+        cached = self._sizes.get(unit)
+        if cached is not None and cached[0] == id(obj):
+            return cached[1]
+        fp = footprint(obj)
+        self._sizes[unit] = (id(obj), fp)
+        if cached is not None:                # replaced by the page → counts as a use
+            self.touch(unit)
+        return fp
+
+    def cache_footprint_of(self, unit: str, cache) -> Dict:
+        """Footprint of a session cache's entries – re‑measured when its entries change."""
+        entries = cache.values()
+        ident = tuple(map(id, entries))
+        cached = self._sizes.get(unit)
+        if cached is not None and cached[0] == ident:
+            return cached[1]
+        fp = deep_footprint(entries)
+        self._sizes[unit] = (ident, fp)
+        if cached is not None:                # replaced by the page → counts as a use
+            self.touch(unit)
+        return fp
+
+    def size_of(self, unit: str, obj) -> int:
+        return sum(self.footprint_of(unit, obj).values())
+
+    # ────────────────────────────
+    # ▼ Spill / fault‑in
+    # ────────────────────────────
+    def spill(self, unit: str, obj) -> Spilled:
+        nbytes = self.size_of(unit, obj)
+        self.store.put_object(unit, obj)
+        self._sizes.pop(unit, None)
+        self.evicted.append(unit)
+        return Spilled(unit, nbytes)
+
+    def load(self, sp: Spilled):
+        obj = self.store.get_object(sp.name)
+        self.store.delete(sp.name)
+        return obj
+
+    def discard(self, sp: Spilled) -> None:
+        self.store.delete(sp.name)
+
+    def adopt(self, state) -> None:
+        """Wrap plain dict artifacts in ``SpillDict`` (pages may reassign ``{}``)."""
+        for key in self.dict_keys:
+            v = state.get(key)
+            if isinstance(v, dict):
+                state[key] = SpillDict(v, self, key)
+
+    def restore(self, state, keys: Iterable[str]) -> None:
+        """Fault single artifacts back in before a page that reads them."""
+        for key in keys:
+            v = state.get(key)
+            if isinstance(v, Spilled):
+                state[key] = self.load(v)
+            if key in state:
+                self.touch(key)
+
+    # ────────────────────────────
+    # ▼ Budget
+    # ────────────────────────────
+    def _held_elsewhere(self, state) -> set:
+        """Buffers of frames in session state outside the registered artifacts (dataset stages …)."""
+        own = set(self.single_keys) | set(self.dict_keys) | set(self.cache_keys)
+        held = set()
+        for key, v in state.items():
+            if key not in own and isinstance(v, pd.DataFrame):
+                held.update(footprint_keys(v))
+        return held
+
+    def _units(self, state) -> List[tuple]:
+        """
+        ``(unit, footprint, evict_fn)`` for every resident artifact; buffers
+        still held outside the artifacts are left out – spilling them frees
+        nothing.
+        """
+        held = self._held_elsewhere(state)
+        out = []
+
+        def add(unit, v, evict, measure=self.footprint_of):
+            fp = measure(unit, v)
+            out.append((unit, {k: b for k, b in fp.items() if k not in held}, evict))
+
+        for key in self.single_keys:
+            v = state.get(key)
+            if v is None or isinstance(v, Spilled):
+                continue
+            add(key, v, lambda key=key, v=v: state.__setitem__(key, self.spill(key, v)))
+        for key in self.dict_keys:
+            d = state.get(key)
+            if not isinstance(d, SpillDict):
+                continue
+            for k, v in list(d.raw_items()):
+                if isinstance(v, Spilled):
+                    continue
+                add(d.unit(k), v, lambda d=d, k=k: d.evict(k))
+        for key in self.cache_keys:
+            cache = state.get(key)
+            if cache is not None:
+                add(key, cache, lambda key=key, c=cache: self.clear_cache(key, c), self.cache_footprint_of)
+        return out
+
+    def clear_cache(self, unit: str, cache) -> None:
+        cache.clear()
+        self._sizes.pop(unit, None)
+        self.evicted.append(unit)
+
+    @staticmethod
+    def _sizes_once(units) -> Dict:
+        """``{unit: bytes}`` with every shared buffer attributed to its first holder."""
+        seen, out = set(), {}
+        for unit, fp, _ in units:
+            out[unit] = sum(b for k, b in fp.items() if k not in seen)
+            seen.update(fp)
+        return out
+
+    def enforce(self, state) -> List[str]:
+        """Evict least‑recently‑used artifacts until the session fits the budget."""
+        self.adopt(state)
+        units = self._units(state)
+        for unit, _, _ in units:
+            self._last.setdefault(unit, self._tick)
+        holders: Dict = {}
+        nbytes: Dict = {}
+        for _, fp, _ in units:
+            for k, b in fp.items():
+                holders[k] = holders.get(k, 0) + 1
+                nbytes[k] = b
+        total = sum(nbytes.values())
+        budget = self.budget_mb * 1e6
+        candidates = sorted((u for u in units if self._last[u[0]] < self._run_start),
+                            key=lambda u: self._last[u[0]])
+        for unit, fp, evict in candidates:
+            if total <= budget:
+                break
+            freed = [k for k in fp if holders[k] == 1]
+            if not freed:                     # every buffer is shared with another artifact
+                continue
+            evict()
+            for k in fp:
+                holders[k] -= 1
+            total -= sum(nbytes[k] for k in freed)
+        return self.evicted
+
+    def breakdown(self, state) -> pd.DataFrame:
+        """One row per registered artifact: size it would free, residency and LRU rank."""
+        freeable = self._sizes_once(self._units(state))
+        rows = []
+        for key in self.single_keys:
+            v = state.get(key)
+            if v is not None:
+                rows.append((key, v))
+        for key in self.dict_keys:
+            d = state.get(key)
+            if isinstance(d, SpillDict):
+                rows.extend((d.unit(k), v) for k, v in d.raw_items())
+        rows.extend((key, state[key]) for key in self.cache_keys if state.get(key) is not None)
+        out = pd.DataFrame([{
+            "Artifact": unit,
+            "MB": round((v.nbytes if isinstance(v, Spilled) else freeable.get(unit, 0)) / 1e6, 2),
+            "Where": "disk" if isinstance(v, Spilled) else "memory",
+            "Idle": self._tick - self._last.get(unit, self._tick),
+        } for unit, v in rows], columns=["Artifact", "MB", "Where", "Idle"])
+        return out.sort_values(["Where", "MB"], ascending=[False, False], ignore_index=True)
+
+    def resident_mb(self, state) -> float:
+        return sum(self._sizes_once(self._units(state)).values()) / 1e6
@@ -0,0 +1,39 @@
+"""
+Paging for long per‑entity sections (PPGs, saved models).
+
+Pages that drew an expander, a row of inputs and a full chart for every
+entity now show one page of compact rows (label + sparkline) and the full
+detail of a single entity.  ``paginate`` does the bookkeeping: a
+case‑insensitive search over the labels (every word must match), then the
+slice of the current page.
+"""
+import os
+from typing import List, NamedTuple, Sequence
+
+PAGE_SIZE = int(os.environ.get("RGM_PAGE_SIZE", 10))
+PAGE_SIZES = (5, 10, 25, 50)
+
+
+class Page(NamedTuple):
+    positions: List[int]      # positions in the full label list, in order
+    page: int                 # 1‑based, clamped to [1, pages]
+    pages: int
+    matches: int              # labels left after the search
+
+
+def search(labels: Sequence[str], query: str = "") -> List[int]:
+    """Positions of the labels containing every word of *query* (case‑insensitive)."""
+    words = str(query or "").lower().split()
+    if not words:
+        return list(range(len(labels)))
+    return [i for i, lab in enumerate(labels) if all(w in str(lab).lower() for w in words)]
+
+
+def paginate(labels: Sequence[str], query: str = "", page: int = 1, per_page: int = PAGE_SIZE) -> Page:
+    """The entities on page *page* of the labels matching *query*."""
+    hits = search(labels, query)
+    per_page = max(int(per_page), 1)
+    pages = max((len(hits) + per_page - 1) // per_page, 1)
+    page = min(max(int(page), 1), pages)
+    start = (page - 1) * per_page
+    return Page(hits[start:start + per_page], page, pages, len(hits))
@@ -0,0 +1,158 @@
+"""
+Lightweight Plotly traces for large data.
+
+* ``histogram_figure`` bins on the server with NumPy and ships only the
+  bin edges and counts instead of the raw column;
+* ``line_trace`` downsamples long series with Largest‑Triangle‑Three‑Buckets
+  (LTTB), which keeps peaks and troughs – promo dips survive;
+* every trace switches to WebGL (``Scattergl``) above ``WEBGL_POINTS``;
+* ``sparkline_svg`` draws compact inline summaries for long entity lists.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+MAX_LINE_POINTS = 2_000       # points per line after downsampling
+WEBGL_POINTS = 1_000          # SVG below, WebGL from here on
+HIST_BINS = 30
+SPARK_WIDTH, SPARK_HEIGHT = 160, 32
+SPARK_COLORS = ("#1f77b4", "#d62728", "#ff7f0e")
+
+
+# ────────────────────────────
+# ▼ Histograms
+# ────────────────────────────
+def histogram_bins(values, nbins: int = HIST_BINS) -> Tuple[np.ndarray, np.ndarray]:
+    """``(edges, counts)`` of the finite values, computed with NumPy."""
+    arr = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    arr = arr[np.isfinite(arr)]
+    if arr.size == 0:
+        return np.array([0.0, 1.0]), np.array([0])
+    counts, edges = np.histogram(arr, bins=nbins)
+    return edges, counts
+
+
+def histogram_figure(values, nbins: int = HIST_BINS, color: Optional[str] = None,
+                     name: Optional[str] = None) -> go.Figure:
+    """Bar chart of pre‑computed bins – a few hundred bytes whatever the row count."""
+    edges, counts = histogram_bins(values, nbins)
+    label = name or getattr(values, "name", None) or "value"
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color=color,
+        name=str(label),
+        customdata=np.stack([edges[:-1], edges[1:]], axis=-1),
+        hovertemplate="%{customdata[0]:.4g} – %{customdata[1]:.4g}<br>count: %{y}<extra></extra>",
+    ))
+    fig.update_layout(bargap=0, xaxis_title=str(label), yaxis_title="count")
+    return fig
+
+
+# ────────────────────────────
+# ▼ Downsampling
+# ────────────────────────────
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the points kept by Largest‑Triangle‑Three‑Buckets."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        if nhi <= nlo:
+            nlo, nhi = n - 1, n
+        # third vertex: average of the next bucket
+        ny = y[nlo:nhi]
+        ok = np.isfinite(ny)
+        cx = x[nlo:nhi].mean()
+        cy = ny[ok].mean() if ok.any() else y[a]
+        # keep the point forming the largest triangle with the previous pick
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        keep[i + 1] = a
+    return keep
+
+
+def _positions(x) -> np.ndarray:
+    """Numeric x for LTTB: the values themselves, or the row position."""
+    s = pd.Series(x)
+    if pd.api.types.is_numeric_dtype(s):
+        return s.to_numpy(dtype="float64", na_value=np.nan)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.astype("int64").to_numpy(dtype="float64")
+    return np.arange(len(s), dtype="float64")
+
+
+def _take(v, idx):
+    if v is None:
+        return None
+    if isinstance(v, (pd.Series, pd.Index)):
+        return v.to_numpy()[idx]
+    arr = np.asarray(v)
+    return arr[idx] if arr.ndim and len(arr) > 1 else v
+
+
+def line_trace(x, y, max_points: int = MAX_LINE_POINTS, webgl_points: int = WEBGL_POINTS,
+               customdata=None, **kwargs):
+    """Scatter trace for a (possibly long) line, LTTB‑downsampled and WebGL when large."""
+    n = len(y)
+    if n > max_points:
+        idx = lttb_indices(_positions(x), pd.Series(y).to_numpy(dtype="float64", na_value=np.nan), max_points)
+        x, y, customdata = _take(x, idx), _take(y, idx), _take(customdata, idx)
+        marker = kwargs.get("marker")
+        if isinstance(marker, dict):
+            kwargs["marker"] = {k: _take(v, idx) if isinstance(v, (list, np.ndarray, pd.Series)) else v
+                                for k, v in marker.items()}
+    cls = go.Scattergl if len(y) > webgl_points else go.Scatter
+    return cls(x=x, y=y, customdata=customdata, **kwargs)
+
+
+def marker_trace(x, y, webgl_points: int = WEBGL_POINTS, **kwargs):
+    """Marker‑only trace – never thinned (each point is an event), WebGL when large."""
+    cls = go.Scattergl if len(y) > webgl_points else go.Scatter
+    return cls(x=x, y=y, **kwargs)
+
+
+# ────────────────────────────
+# ▼ Sparklines
+# ────────────────────────────
+def sparkline_svg(*series, colors: Sequence[str] = SPARK_COLORS, width: int = SPARK_WIDTH,
+                  height: int = SPARK_HEIGHT) -> str:
+    """
+    Inline SVG of one or more series on a shared y scale – a few hundred
+    bytes of markdown instead of a Plotly chart.  Long series are thinned
+    with LTTB to one point per pixel; gaps break the line.
+    """
+    ys = [pd.Series(s).to_numpy(dtype="float64", na_value=np.nan) for s in series]
+    finite = np.concatenate([y[np.isfinite(y)] for y in ys]) if ys else np.empty(0)
+    lo, hi = (finite.min(), finite.max()) if finite.size else (0.0, 1.0)
+    span = (hi - lo) or 1.0
+    paths = []
+    for y, color in zip(ys, colors):
+        n = len(y)
+        if n == 0:
+            continue
+        idx = lttb_indices(np.arange(n, dtype="float64"), y, width) if n > width else np.arange(n)
+        px = idx * (width - 2) / max(n - 1, 1) + 1
+        py = height - 1 - (y[idx] - lo) * (height - 2) / span
+        d, pen = [], "M"
+        for xv, yv in zip(px, py):
+            if np.isfinite(yv):
+                d.append(f"{pen}{xv:.1f},{yv:.1f}")
+                pen = "L"
+            else:
+                pen = "M"
+        if d:
+            paths.append(f'<path d="{" ".join(d)}" fill="none" stroke="{color}" stroke-width="1.2"/>')
+    return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+            f'xmlns="http://www.w3.org/2000/svg">{"".join(paths)}</svg>')
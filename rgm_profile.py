@@ -0,0 +1,146 @@
+"""
+Column profiling for the Validate and Feature Overview pages.
+
+``DatasetProfile`` computes every statistic those pages show – missing
+counts and rows, distinct counts, examples, describe(), IQR outliers and
+memory – in one pass over the frame: the missing mask is built once and
+all numeric measures are reduced from a single float64 matrix.
+``ProfileCache`` keeps recent profiles per (dataset version, filter) key so
+widget interactions re‑render from the cache instead of re‑scanning.
+"""
+import warnings
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+TIME_KEYS = {"Year", "Month", "Week"}     # numeric dtype, but not a measure
+CACHE_SIZE = 8
+IQR_K = 1.5
+
+
+class DatasetProfile:
+    """All per‑column statistics of one frame."""
+
+    def __init__(self, df: pd.DataFrame, time_keys: Iterable[str] = TIME_KEYS):
+        self.rows, self.cols = df.shape
+        self.dtypes = df.dtypes.astype(str)
+        self.memory_bytes = int(df.memory_usage(deep=True).sum())
+
+        # ── missing values: one mask for counts and rows ──
+        na = df.isna().to_numpy()
+        self.missing = pd.Series(na.sum(axis=0), index=df.columns, dtype="int64")
+        self.missing_row_pos = np.flatnonzero(na.any(axis=1)) if na.size else np.array([], dtype=int)
+        self.missing_cells = int(self.missing.sum())
+
+        # ── distinct values & examples ──
+        self.unique = pd.Series({c: df[c].nunique(dropna=True) for c in df.columns}, dtype="int64")
+        self.examples = {c: _examples(df[c]) for c in df.columns}
+
+        # ── numeric measures from one matrix ──
+        self.numeric_cols: List[str] = [c for c in df.select_dtypes(include=[np.number]).columns
+                                        if c not in time_keys]
+        self.categorical_cols: List[str] = df.select_dtypes(include=["object", "category"]).columns.tolist()
+        self.describe, self.outliers = _numeric_stats(df, self.numeric_cols)
+
+        self._df = df               # kept for lazily computed value counts only
+        self._value_counts: Dict[str, pd.Series] = {}
+
+    @property
+    def pct_missing(self) -> float:
+        cells = self.rows * self.cols
+        return self.missing_cells / cells * 100 if cells else 0.0
+
+    def column_table(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Column": self.dtypes.index,
+            "Type": self.dtypes.values,
+            "Missing": self.missing.values,
+            "Unique": self.unique.values,
+            "Examples": [self.examples[c] for c in self.dtypes.index],
+        })
+
+    def missing_rows(self, df: pd.DataFrame, n: Optional[int] = None) -> pd.DataFrame:
+        pos = self.missing_row_pos if n is None else self.missing_row_pos[:n]
+        return df.iloc[pos]
+
+    def value_counts(self, col: str) -> pd.Series:
+        """``value_counts(dropna=False)`` of *col*, computed once."""
+        if col not in self._value_counts:
+            self._value_counts[col] = self._df[col].value_counts(dropna=False)
+        return self._value_counts[col]
+
+    def varying_numeric(self) -> List[str]:
+        """Numeric measures with more than one distinct value (correlation candidates)."""
+        return [c for c in self.numeric_cols if self.unique[c] > 1]
+
+
+def _examples(s: pd.Series, k: int = 3) -> str:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        vals = s.cat.categories[pd.unique(codes[codes >= 0])[:k]]
+    else:
+        vals = s.dropna().unique()[:k]
+    return ", ".join(map(str, vals)) or "—"
+
+
+def _numeric_stats(df: pd.DataFrame, cols: List[str]):
+    """``describe().T`` and the 1.5×IQR outlier table from one float matrix."""
+    stats_cols = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+    if not cols or df.empty:
+        return (pd.DataFrame(columns=stats_cols),
+                pd.DataFrame(columns=["Column", "Outliers", "Lower", "Upper"]))
+
+    arr = df[cols].to_numpy(dtype="float64", na_value=np.nan)
+    count = np.sum(~np.isnan(arr), axis=0)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)     # all‑NaN columns
+        q1, q2, q3 = np.nanpercentile(arr, [25, 50, 75], axis=0)
+        desc = pd.DataFrame({
+            "count": count.astype(float),
+            "mean": np.nanmean(arr, axis=0),
+            "std": np.nanstd(arr, axis=0, ddof=1),
+            "min": np.nanmin(arr, axis=0),
+            "25%": q1, "50%": q2, "75%": q3,
+            "max": np.nanmax(arr, axis=0),
+        }, index=cols)
+        iqr = q3 - q1
+        lb, ub = q1 - IQR_K * iqr, q3 + IQR_K * iqr
+        n_out = ((arr < lb) | (arr > ub)).sum(axis=0)
+    outliers = pd.DataFrame({
+        "Column": cols,
+        "Outliers": n_out,
+        "Lower": [f"{v:.2f}" for v in lb],
+        "Upper": [f"{v:.2f}" for v in ub],
+    })
+    return desc, outliers
+
+
+class ProfileCache:
+    """Small LRU of profiles keyed by (dataset version, filters)."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Hashable, DatasetProfile]" = OrderedDict()
+
+    def get(self, key: Hashable, df: pd.DataFrame) -> DatasetProfile:
+        prof = self._items.get(key)
+        if prof is None:
+            prof = self._items[key] = DatasetProfile(df)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        else:
+            self._items.move_to_end(key)
+        return prof
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def retain(self, keep: Callable[[Hashable], bool]) -> None:
+        """Drop the profiles whose key fails *keep* (e.g. superseded dataset versions)."""
+        for key in [k for k in self._items if not keep(k)]:
+            del self._items[key]
+
+    def values(self) -> list:
+        return list(self._items.values())
@@ -0,0 +1,375 @@
+"""
+Approximate column statistics for very large datasets.
+
+``SketchIndex`` scans a dataset version once and keeps, for every group of
+the chosen filter dimensions, small mergeable summaries of each column:
+
+* HyperLogLog registers          → distinct counts (≈1.6 % std. error);
+* a log‑bucket quantile sketch   → quantiles / IQR bounds with bounded
+  relative error (DDSketch‑style, ``QUANTILE_ALPHA``);
+* exact count / sum / sum² / min / max → count, mean, std, min, max;
+* value counts – exact for low‑cardinality columns, heavy‑hitter top‑K
+  otherwise.
+
+A filter slice (``{"Channel": "GT", …}``) is answered by merging the
+sketches of the matching groups, so changing a filter never rescans rows.
+``SketchProfile`` exposes the same attributes as ``rgm_profile.DatasetProfile``
+so pages can switch between exact and approximate numbers freely.
+"""
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from rgm_profile import TIME_KEYS
+
+HLL_P = 12                     # 2**12 registers per group and column
+QUANTILE_ALPHA = 0.01          # relative accuracy of quantiles
+TOPK_CAPACITY = 64             # heavy hitters kept per group for high‑cardinality columns
+EXACT_COUNT_MAX = 4096         # below this many distinct values, counts are exact
+MAX_GROUPS = 512               # more filter groups than this → sketch the slice instead
+APPROX_ROWS = 5_000_000        # pages default to sketches from this many rows on
+
+_GAMMA = (1 + QUANTILE_ALPHA) / (1 - QUANTILE_ALPHA)
+_LOG_GAMMA = np.log(_GAMMA)
+_ZERO = 1e-12
+
+
+# ────────────────────────────
+# ▼ HyperLogLog
+# ────────────────────────────
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Bit length of uint64 values; the top 53 bits are exact in float64."""
+    hi = (x >> np.uint64(11)).astype(np.float64)
+    lo = (x & np.uint64(0x7FF)).astype(np.float64)
+    return np.where(hi > 0, np.frexp(hi)[1] + 11, np.frexp(lo)[1]).astype(np.int64)
+
+
+def hll_registers(hashes: np.ndarray, group: np.ndarray, n_groups: int, p: int = HLL_P) -> np.ndarray:
+    """``(n_groups, 2**p)`` uint8 HLL registers, one row per group."""
+    m = 1 << p
+    reg = np.zeros((n_groups, m), dtype=np.uint8)
+    if hashes.size == 0:
+        return reg
+    idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    w = hashes << np.uint64(p)
+    rank = np.minimum(64 - _bit_length(w) + 1, 64 - p + 1).astype(np.uint8)
+    np.maximum.at(reg.reshape(-1), group.astype(np.int64) * m + idx, rank)
+    return reg
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """Cardinality estimate from one merged register row."""
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    est = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if est <= 2.5 * m and zeros:
+        est = m * np.log(m / zeros)          # linear counting for small sets
+    return float(est)
+
+
+# ────────────────────────────
+# ▼ Quantile sketch
+# ────────────────────────────
+def _bucket_keys(x: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.ceil(np.log(np.abs(x)) / _LOG_GAMMA).astype(np.int64)
+
+
+def _bucket_value(keys: np.ndarray) -> np.ndarray:
+    return 2 * np.power(_GAMMA, keys) / (_GAMMA + 1)
+
+
+class QuantileSketch:
+    """Log‑bucket counts of positive and negative values plus a zero bucket."""
+
+    def __init__(self, pos: np.ndarray, pos_min: int, neg: np.ndarray, neg_min: int, zero: np.ndarray):
+        self.pos, self.pos_min = pos, pos_min
+        self.neg, self.neg_min = neg, neg_min
+        self.zero = zero
+
+    @classmethod
+    def build(cls, x: np.ndarray, group: np.ndarray, n_groups: int) -> "QuantileSketch":
+        ok = ~np.isnan(x)
+        x, group = x[ok], group[ok]
+        parts = []
+        for mask in (x > _ZERO, x < -_ZERO):
+            keys = _bucket_keys(x[mask])
+            g = group[mask]
+            lo = int(keys.min()) if keys.size else 0
+            width = int(keys.max()) - lo + 1 if keys.size else 0
+            counts = np.bincount(g * width + (keys - lo), minlength=n_groups * width) if width else np.zeros(0)
+            parts.append((counts.reshape(n_groups, width).astype(np.int64), lo))
+        zero = np.bincount(group[np.abs(x) <= _ZERO], minlength=n_groups)
+        (pos, pmin), (neg, nmin) = parts
+        return cls(pos, pmin, neg, nmin, zero)
+
+    def merged(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted bucket representatives and their counts for the selected groups."""
+        pos = self.pos[rows].sum(axis=0)
+        neg = self.neg[rows].sum(axis=0)
+        zero = int(self.zero[rows].sum())
+        neg_keys = self.neg_min + np.arange(neg.size)
+        pos_keys = self.pos_min + np.arange(pos.size)
+        values = np.concatenate([-_bucket_value(neg_keys)[::-1], [0.0], _bucket_value(pos_keys)])
+        counts = np.concatenate([neg[::-1], [zero], pos])
+        return values, counts
+
+    @staticmethod
+    def quantiles(values: np.ndarray, counts: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+        total = counts.sum()
+        if total == 0:
+            return np.full(len(qs), np.nan)
+        cum = np.cumsum(counts)
+        pos = np.searchsorted(cum, np.asarray(qs) * (total - 1), side="right")
+        return values[np.minimum(pos, len(values) - 1)]
+
+
+# ────────────────────────────
+# ▼ Per‑column sketches
+# ────────────────────────────
+class ColumnSketch:
+    """Mergeable summaries of one column for every filter group."""
+
+    def __init__(self, s: pd.Series, group: np.ndarray, n_groups: int, numeric: bool):
+        self.dtype = str(s.dtype)
+        self.numeric = numeric
+        na = s.isna().to_numpy()
+        self.missing = np.bincount(group[na], minlength=n_groups)
+
+        hashes = pd.util.hash_pandas_object(s[~na], index=False).to_numpy()
+        self.hll = hll_registers(hashes, group[~na], n_groups)
+
+        # value counts (dimensions only): exact code counts or heavy hitters
+        self.counts = self.heavy = None
+        self.examples = ", ".join(map(str, s[~na].head(1000).unique()[:3])) or "—"
+        if not numeric:
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                codes, uniques = s.cat.codes.to_numpy().astype(np.int64), s.cat.categories
+            else:
+                codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            self.uniques = uniques
+            valid = codes >= 0
+            if len(uniques) <= EXACT_COUNT_MAX:
+                k = max(len(uniques), 1)
+                self.counts = np.bincount(group[valid] * k + codes[valid],
+                                          minlength=n_groups * k).reshape(n_groups, k)
+            else:
+                vc = pd.DataFrame({"g": group[valid], "c": codes[valid]}).value_counts()
+                self.heavy = vc.groupby(level="g", sort=False).head(TOPK_CAPACITY)
+
+        # numeric moments + quantile sketch
+        self.moments = self.quantile = None
+        if numeric:
+            x = s.to_numpy(dtype="float64", na_value=np.nan)
+            ok = ~np.isnan(x)
+            g, xv = group[ok], x[ok]
+            lo, hi = np.full(n_groups, np.inf), np.full(n_groups, -np.inf)
+            np.minimum.at(lo, g, xv)
+            np.maximum.at(hi, g, xv)
+            self.moments = pd.DataFrame({
+                "n": np.bincount(g, minlength=n_groups),
+                "sum": np.bincount(g, weights=xv, minlength=n_groups),
+                "sum2": np.bincount(g, weights=xv * xv, minlength=n_groups),
+                "min": np.where(np.isinf(lo), np.nan, lo),
+                "max": np.where(np.isinf(hi), np.nan, hi),
+            })
+            self.quantile = QuantileSketch.build(x, group, n_groups)
+
+    # merged views --------------------------------------------------------
+    def value_counts(self, rows: np.ndarray) -> pd.Series:
+        """Value counts of the merged slice (numeric columns: missing only)."""
+        if self.numeric:
+            out = pd.Series(dtype="int64")
+        elif self.counts is not None:
+            c = self.counts[rows].sum(axis=0)[:len(self.uniques)]
+            out = pd.Series(c, index=pd.Index(self.uniques))
+            out = out[out > 0]
+        else:
+            h = self.heavy[self.heavy.index.get_level_values("g").isin(rows)]
+            out = h.groupby(level="c").sum()
+            out.index = pd.Index(self.uniques[out.index.to_numpy()])
+        missing = int(self.missing[rows].sum())
+        if missing:
+            out = pd.concat([out, pd.Series([missing], index=pd.Index([np.nan]))])
+        return out.sort_values(ascending=False, kind="stable")
+
+    def distinct(self, rows: np.ndarray) -> int:
+        if self.counts is not None:
+            return int(np.count_nonzero(self.counts[rows].sum(axis=0)))
+        return int(round(hll_estimate(self.hll[rows].max(axis=0))))
+
+    def describe(self, rows: np.ndarray) -> Dict[str, float]:
+        m = self.moments.iloc[rows]
+        n = m["n"].sum()
+        mean = m["sum"].sum() / n if n else np.nan
+        var = (m["sum2"].sum() - n * mean * mean) / (n - 1) if n > 1 else np.nan
+        values, counts = self.quantile.merged(rows)
+        q1, q2, q3 = QuantileSketch.quantiles(values, counts, [.25, .5, .75])
+        return {"count": float(n), "mean": mean, "std": float(np.sqrt(max(var, 0))) if n > 1 else np.nan,
+                "min": m["min"].min(), "25%": q1, "50%": q2, "75%": q3, "max": m["max"].max(),
+                "_values": values, "_counts": counts}
+
+
+# ────────────────────────────
+# ▼ Index + profile
+# ────────────────────────────
+def _group_ids(df: pd.DataFrame, dims: Sequence[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """Dense group id per row and a table of the groups' dimension values + row counts."""
+    if not dims:
+        return np.zeros(len(df), dtype=np.int64), pd.DataFrame({"_rows": [len(df)]})
+    key = np.zeros(len(df), dtype=np.int64)
+    levels = []
+    for d in dims:
+        s = df[d]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.to_numpy().astype(np.int64), s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        key = key * (len(uniques) + 1) + (codes + 1)       # 0 = missing
+        levels.append((d, codes, uniques))
+    group, first = _factorize_first(key)
+    keys = pd.DataFrame({d: _labels(uniques, codes[first]) for d, codes, uniques in levels})
+    keys["_rows"] = np.bincount(group, minlength=len(first))
+    return group, keys
+
+
+def _labels(uniques: pd.Index, codes: np.ndarray) -> pd.Series:
+    """Values of *codes* as objects; the missing code -1 becomes NaN, which no filter matches."""
+    out = np.asarray(uniques, dtype=object)[np.maximum(codes, 0)] if len(uniques) else np.empty(len(codes), object)
+    out[codes < 0] = np.nan
+    return pd.Series(out, dtype=object)
+
+
+def _factorize_first(key: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense codes of *key* and the first row position of each code."""
+    group, _ = pd.factorize(key)
+    first = np.full(group.max() + 1 if group.size else 0, len(group), dtype=np.int64)
+    np.minimum.at(first, group, np.arange(len(group)))
+    return group.astype(np.int64), first
+
+
+class SketchIndex:
+    """Sketches of every column, per group of the filter dimensions ``dims``."""
+
+    def __init__(self, df: pd.DataFrame, dims: Sequence[str] = (), time_keys: Iterable[str] = TIME_KEYS):
+        self.dims = [d for d in dims if d in df.columns]
+        group, self.keys = _group_ids(df, self.dims)
+        self.n_groups = len(self.keys)
+        self.rows = self.keys["_rows"].to_numpy()
+        self.bytes_per_row = df.memory_usage(deep=False).sum() / max(len(df), 1)
+
+        self.numeric_cols = [c for c in df.select_dtypes(include=[np.number]).columns if c not in time_keys]
+        self.categorical_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
+        self.columns = {c: ColumnSketch(df[c], group, self.n_groups, c in self.numeric_cols)
+                        for c in df.columns}
+
+    @staticmethod
+    def n_groups_for(df: pd.DataFrame, dims: Sequence[str]) -> int:
+        return len(_group_ids(df, [d for d in dims if d in df.columns])[1])
+
+    def covers(self, filters: Sequence[Tuple[str, object]]) -> bool:
+        return all(col in self.dims for col, _ in filters)
+
+    def select(self, filters: Sequence[Tuple[str, object]]) -> np.ndarray:
+        mask = np.ones(self.n_groups, dtype=bool)
+        for col, val in filters:
+            mask &= (self.keys[col] == val).to_numpy()
+        return np.flatnonzero(mask)
+
+    def profile(self, filters: Sequence[Tuple[str, object]] = ()) -> "SketchProfile":
+        return SketchProfile(self, self.select(filters))
+
+
+class SketchProfile:
+    """Approximate drop‑in for ``DatasetProfile`` built from merged sketches."""
+
+    approximate = True
+
+    def __init__(self, index: SketchIndex, rows: np.ndarray):
+        self._index, self._rows = index, rows
+        cols = index.columns
+        self.rows = int(index.rows[rows].sum())
+        self.cols = len(cols)
+        self.dtypes = pd.Series({c: s.dtype for c, s in cols.items()})
+        self.memory_bytes = int(self.rows * index.bytes_per_row)
+        self.missing = pd.Series({c: int(s.missing[rows].sum()) for c, s in cols.items()}, dtype="int64")
+        self.missing_cells = int(self.missing.sum())
+        self.unique = pd.Series({c: s.distinct(rows) for c, s in cols.items()}, dtype="int64")
+        self.numeric_cols = list(index.numeric_cols)
+        self.categorical_cols = list(index.categorical_cols)
+        self._value_counts: Dict[str, pd.Series] = {}
+
+        stats = {c: cols[c].describe(rows) for c in self.numeric_cols}
+        self.describe = pd.DataFrame(
+            {c: {k: v for k, v in d.items() if not k.startswith("_")} for c, d in stats.items()}
+        ).T
+        out = []
+        for c, d in stats.items():
+            iqr = d["75%"] - d["25%"]
+            lb, ub = d["25%"] - 1.5 * iqr, d["75%"] + 1.5 * iqr
+            values, counts = d["_values"], d["_counts"]
+            out.append({"Column": c, "Outliers": int(counts[(values < lb) | (values > ub)].sum()),
+                        "Lower": f"{lb:.2f}", "Upper": f"{ub:.2f}"})
+        self.outliers = pd.DataFrame(out, columns=["Column", "Outliers", "Lower", "Upper"])
+        self.examples = {c: s.examples if s.numeric else
+                         (", ".join(map(str, self.value_counts(c).dropna().index[:3])) or "—")
+                         for c, s in cols.items()}
+
+    @property
+    def pct_missing(self) -> float:
+        cells = self.rows * self.cols
+        return self.missing_cells / cells * 100 if cells else 0.0
+
+    def column_table(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Column": self.dtypes.index,
+            "Type": self.dtypes.values,
+            "Missing": self.missing.values,
+            "Unique (≈)": self.unique.values,
+            "Examples": [self.examples[c] for c in self.dtypes.index],
+        })
+
+    def value_counts(self, col: str) -> pd.Series:
+        if col not in self._value_counts:
+            self._value_counts[col] = self._index.columns[col].value_counts(self._rows)
+        return self._value_counts[col]
+
+    def varying_numeric(self) -> List[str]:
+        return [c for c in self.numeric_cols if self.unique[c] > 1]
+
+
+class SketchCache:
+    """Sketch indexes per (dataset version, filter dimensions); older versions are dropped."""
+
+    def __init__(self):
+        self._items: Dict[tuple, object] = {}
+
+    def profile(self, version, base: pd.DataFrame, dims: Sequence[str],
+                filters: Sequence[Tuple[str, object]], sliced: pd.DataFrame) -> SketchProfile:
+        """Merge per‑group sketches of *base*; fall back to sketching *sliced* when
+        the filter columns have too many groups to index."""
+        dims, filters = tuple(dims), tuple(filters)
+        key = (version, dims)
+        if key not in self._items:
+            self._items = {k: v for k, v in self._items.items() if k[0] == version}
+            fits = SketchIndex.n_groups_for(base, dims) <= MAX_GROUPS
+            self._items[key] = SketchIndex(base, dims) if fits else None
+        index = self._items[key]
+        if index is not None and index.covers(filters):
+            return index.profile(filters)
+        slice_key = (version, "slice", filters)
+        if slice_key not in self._items:
+            self._items[slice_key] = SketchIndex(sliced)
+        return self._items[slice_key].profile()
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def retain(self, keep: Callable[[Hashable], bool]) -> None:
+        """Drop the sketches whose dataset version fails *keep*."""
+        self._items = {k: v for k, v in self._items.items() if keep(k[0])}
+
+    def values(self) -> list:
+        return [v for v in self._items.values() if v is not None]
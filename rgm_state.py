@@ -0,0 +1,140 @@
+"""
+Project state persistence – ``load_state`` / ``save_state`` over SQLite.
+
+* one pooled connection per process, shared by every Streamlit session
+  (each session runs on its own thread, so all access goes through a lock);
+* WAL journal + busy timeout so several app processes can read while one
+  writes;
+* writes are buffered – everything queued during a rerun is committed in a
+  single transaction by ``flush_state()``, which first compares the queue
+  with the rows in the database (not with a process‑local copy, which
+  another process may have made stale) and only writes the keys that
+  differ; when nothing does, no write lock is taken at all.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+DB_PATH = os.environ.get("RGM_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rgm_projects.db"))
+FLUSH_INTERVAL = 2.0          # seconds a queued write may wait before a forced flush
+BUSY_TIMEOUT_MS = 10_000
+
+_lock = threading.RLock()
+_conn = None
+_conn_pid = None
+_pending: Dict[Tuple[str, str], str] = {}    # queued writes, not yet committed
+_pending_since = 0.0
+
+
+def _db() -> sqlite3.Connection:
+    """Return the process‑wide connection, creating the schema on first use."""
+    global _conn, _conn_pid
+    with _lock:
+        # a forked worker must not reuse its parent's handle
+        if _conn is None or _conn_pid != os.getpid():
+            conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS project_state (
+                       project_id TEXT NOT NULL,
+                       key        TEXT NOT NULL,
+                       value      TEXT,
+                       updated_at REAL,
+                       PRIMARY KEY (project_id, key)
+                   )"""
+            )
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(project_state)")}
+            if "updated_at" not in cols:          # table created by an older build
+                conn.execute("ALTER TABLE project_state ADD COLUMN updated_at REAL")
+            _conn, _conn_pid = conn, os.getpid()
+        return _conn
+
+
+# ────────────────────────────
+# ▼ Public API
+# ────────────────────────────
+def load_state(project_id, key: str, default: Any = None) -> Any:
+    """Return the stored value for *key*, or *default* when absent."""
+    k = (str(project_id), key)
+    with _lock:
+        raw = _pending.get(k)
+        if raw is None:
+            row = _db().execute(
+                "SELECT value FROM project_state WHERE project_id=? AND key=?", k
+            ).fetchone()
+            if row is None:
+                return default
+            raw = row[0]
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):      # plain text written by an older build
+        return raw
+
+
+def save_state(project_id, key: str, value: Any) -> None:
+    """Queue a write; ``flush_state`` drops it if the database already holds the value."""
+    global _pending_since
+    k = (str(project_id), key)
+    raw = json.dumps(value, default=str)
+    with _lock:
+        if not _pending:
+            _pending_since = time.monotonic()
+        _pending[k] = raw
+        overdue = time.monotonic() - _pending_since > FLUSH_INTERVAL
+    if overdue:
+        flush_state()
+
+
+def delete_state(project_id, *keys: str) -> None:
+    """Remove one or more keys immediately (queued writes for them are dropped)."""
+    with _lock:
+        for key in keys:
+            k = (str(project_id), key)
+            _pending.pop(k, None)
+            _db().execute("DELETE FROM project_state WHERE project_id=? AND key=?", k)
+
+
+def flush_state() -> int:
+    """Commit every queued write in one transaction; returns the number written."""
+    with _lock:
+        if not _pending:
+            return 0
+        batch = dict(_pending)
+        conn = _db()
+        changed = {}
+        for k, v in batch.items():
+            row = conn.execute(
+                "SELECT value FROM project_state WHERE project_id=? AND key=?", k
+            ).fetchone()
+            if row is None or row[0] != v:
+                changed[k] = v
+        if changed:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    """INSERT INTO project_state (project_id, key, value, updated_at)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(project_id, key) DO UPDATE
+                       SET value=excluded.value, updated_at=excluded.updated_at
+                       WHERE project_state.value IS NOT excluded.value""",
+                    [(p, k, v, now) for (p, k), v in changed.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for k, v in batch.items():
+            if _pending.get(k) == v:
+                del _pending[k]
+        return len(changed)
+
+
+atexit.register(flush_state)
@@ -0,0 +1,272 @@
+"""
+Project artifact store – columnar (Parquet) persistence for uploaded datasets.
+
+Every project gets its own directory under ``STORE_ROOT`` holding one
+compressed Parquet file per artifact plus a small JSON manifest with the
+schema / row count / on-disk size of each entry.  Reading an artifact only
+touches its own file, and ``columns=[...]`` projects a subset without
+decoding the rest.
+
+Uploads are content‑addressed: the parsed frame lives once under
+``<root>/_content/<sha256>.parquet`` and project entries point at it,
+so the same bytes are parsed once across sessions and projects.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_ROOT = os.environ.get("RGM_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rgm_store"))
+COMPRESSION = "zstd"
+BATCH_ROWS = 200_000
+
+_MANIFEST = "manifest.json"
+_PROJECT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+_lock = threading.RLock()
+
+
+def check_project_id(project_id) -> str:
+    """
+    *project_id* as a string, or ``ValueError`` unless it is a plain slug –
+    it becomes a directory name, so no separators, dots or a leading ``_``
+    (reserved for ``_content``).
+    """
+    pid = str(project_id)
+    if not _PROJECT_ID.fullmatch(pid):
+        raise ValueError(f"invalid project id {pid!r}: use letters, digits, '-' and '_'")
+    return pid
+
+
+def _file_id(name: str) -> str:
+    """Stable, filesystem-safe file stem for an artifact name."""
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:20]
+
+
+def content_hash(fh, block: int = 1 << 22) -> str:
+    """SHA‑256 of a file‑like object's bytes; the read position is restored."""
+    pos = fh.tell()
+    fh.seek(0)
+    h = hashlib.sha256()
+    for chunk in iter(lambda: fh.read(block), b""):
+        h.update(chunk)
+    fh.seek(pos)
+    return h.hexdigest()
+
+
+def _write_parquet(df: pd.DataFrame, path: str) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression=COMPRESSION)
+    os.replace(tmp, path)
+
+
+def _frame_meta(df: pd.DataFrame, path: str) -> Dict:
+    return {
+        "rows": int(len(df)),
+        "columns": [str(c) for c in df.columns],
+        "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        "bytes": os.path.getsize(path),
+    }
+
+
+def _atomic_write_json(path: str, payload: Dict) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+class DatasetHandle:
+    """Lightweight reference to a stored dataset – metadata now, data on ``load()``."""
+
+    def __init__(self, store: "ArtifactStore", name: str, entry: Dict):
+        self.store = store
+        self.name = name
+        self.columns: List[str] = entry.get("columns", [])
+        self.dtypes: Dict[str, str] = entry.get("dtypes", {})
+        self.rows: int = entry.get("rows", 0)
+        self.bytes: int = entry.get("bytes", 0)
+        self.version: int = entry.get("version", 1)
+        self.source: str = entry.get("source", name)    # the uploaded file name, shared by its versions
+
+    @property
+    def schema(self) -> Dict[str, str]:
+        return self.dtypes
+
+    def label(self) -> str:
+        return f"{self.name} · {self.rows:,} rows · {self.bytes / 1e6:,.1f} MB"
+
+    def load(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return self.store.get_frame(self.name, columns=columns)
+
+    def iter_chunks(self, columns: Optional[List[str]] = None,
+                    chunk_rows: int = BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        return self.store.iter_frame(self.name, columns=columns, chunk_rows=chunk_rows)
+
+    def __repr__(self) -> str:
+        return f"<DatasetHandle {self.label()}>"
+
+
+class ArtifactStore:
+    """Columnar artifact store for one project."""
+
+    def __init__(self, project_id, root: str = STORE_ROOT):
+        self.project_id = check_project_id(project_id)
+        self.path = os.path.join(root, self.project_id)
+        self.content_dir = os.path.join(root, "_content")
+        os.makedirs(self.path, exist_ok=True)
+
+    # ────────────────────────────
+    # ▼ Manifest
+    # ────────────────────────────
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, _MANIFEST)
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{_file_id(name)}.parquet")
+
+    def _path(self, name: str, entry: Optional[Dict] = None) -> str:
+        entry = entry if entry is not None else self._read_manifest().get(name, {})
+        if entry.get("hash"):
+            return os.path.join(self.content_dir, f"{entry['hash']}.parquet")
+        return self._file(name)
+
+    def _register(self, name: str, entry: Dict) -> None:
+        with _lock:
+            manifest = self._read_manifest()
+            manifest[name] = entry
+            _atomic_write_json(self._manifest_path(), manifest)
+
+    # ────────────────────────────
+    # ▼ Public API
+    # ────────────────────────────
+    def names(self) -> List[str]:
+        """Artifact names in insertion order."""
+        return list(self._read_manifest().keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._read_manifest()
+
+    def handles(self) -> Dict[str, DatasetHandle]:
+        """Every stored dataset as a metadata‑only handle, from one manifest read."""
+        return {n: DatasetHandle(self, n, e) for n, e in self._read_manifest().items()
+                if e.get("kind") != "pickle"}
+
+    def info(self, name: str) -> Optional[Dict]:
+        """Manifest entry (rows, columns, dtypes, bytes) without reading data."""
+        return self._read_manifest().get(name)
+
+    def put_frame(self, name: str, df: pd.DataFrame) -> Dict:
+        """Write *df* as compressed Parquet and register it in the manifest."""
+        path = self._file(name)
+        _write_parquet(df, path)
+        entry = {"file": os.path.basename(path), **_frame_meta(df, path)}
+        self._register(name, entry)
+        return entry
+
+    def find_hash(self, digest: str) -> Optional[str]:
+        """Name of the entry in this project backed by *digest*, if any."""
+        return next((n for n, e in self._read_manifest().items() if e.get("hash") == digest), None)
+
+    def add_upload(self, fh, parse: Callable[[object], pd.DataFrame],
+                   digest: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Register an uploaded file by content hash.
+
+        Returns ``(dataset_name, status)`` where status is ``"duplicate"``
+        (same bytes already in this project), ``"cached"`` (parsed earlier by
+        any project) or ``"parsed"``.  A file whose name is taken by
+        different content is stored as a new version ``"<name> (v2)"`` …
+        """
+        digest = digest or content_hash(fh)
+        existing = self.find_hash(digest)
+        if existing is not None:
+            return existing, "duplicate"
+
+        os.makedirs(self.content_dir, exist_ok=True)
+        path = os.path.join(self.content_dir, f"{digest}.parquet")
+        meta_path = os.path.join(self.content_dir, f"{digest}.json")
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as fh_meta:
+                meta = json.load(fh_meta)
+            status = "cached"
+        else:
+            df = parse(fh)
+            _write_parquet(df, path)
+            meta = _frame_meta(df, path)
+            _atomic_write_json(meta_path, meta)
+            status = "parsed"
+
+        source = getattr(fh, "name", digest[:12])
+        with _lock:
+            manifest = self._read_manifest()
+            versions = [e.get("version", 1) for n, e in manifest.items() if e.get("source", n) == source]
+            version = max(versions, default=0) + 1
+            name = source if version == 1 and source not in manifest else f"{source} (v{version})"
+            manifest[name] = {"hash": digest, "source": source, "version": version, **meta}
+            _atomic_write_json(self._manifest_path(), manifest)
+        return name, status
+
+    def put_object(self, name: str, obj) -> Dict:
+        """Pickle an arbitrary Python object (figures, history, …) into the store."""
+        path = os.path.join(self.path, f"{_file_id(name)}.pkl")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        entry = {"file": os.path.basename(path), "kind": "pickle", "bytes": os.path.getsize(path)}
+        self._register(name, entry)
+        return entry
+
+    def get_object(self, name: str):
+        """Read back an entry written by ``put_object`` (or a frame)."""
+        entry = self.info(name)
+        if entry is None:
+            raise KeyError(name)
+        if entry.get("kind") != "pickle":
+            return self.get_frame(name)
+        with open(os.path.join(self.path, entry["file"]), "rb") as fh:
+            return pickle.load(fh)
+
+    def get_frame(self, name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read an artifact back with its original dtypes; ``columns`` projects."""
+        entry = self.info(name)
+        if entry is None:
+            raise KeyError(name)
+        return pq.read_table(self._path(name, entry), columns=columns).to_pandas()
+
+    def iter_frame(self, name: str, columns: Optional[List[str]] = None,
+                   chunk_rows: int = BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """Stream an artifact in row batches – only one batch is decoded at a time."""
+        entry = self.info(name)
+        if entry is None:
+            raise KeyError(name)
+        pf = pq.ParquetFile(self._path(name, entry))
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+
+    def delete(self, name: str) -> None:
+        """Drop an entry; content‑addressed data stays in the shared cache."""
+        with _lock:
+            manifest = self._read_manifest()
+            entry = manifest.pop(name, None) or {}
+            _atomic_write_json(self._manifest_path(), manifest)
+        if entry.get("hash"):
+            return
+        try:
+            os.remove(os.path.join(self.path, entry["file"]) if "file" in entry else self._file(name))
+        except FileNotFoundError:
+            pass
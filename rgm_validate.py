@@ -0,0 +1,421 @@
+"""
+Rule‑based data‑quality checks that stream over a dataset chunk by chunk.
+
+``ValidationEngine.run`` accepts any iterable of frames – slices of an
+in‑memory frame (``validate_frame``) or Parquet batches of a stored dataset
+(``validate_handle``) – so a file never has to be held twice.  Per chunk it
+keeps only compact per‑row keys:
+
+* the series id (``SERIES_KEYS`` hashed with ``hash_pandas_object`` and
+  mapped to a dense int32 code),
+* the period as an int32 day number (``Date``, or the Monday of the ISO
+  ``Year``/``Week``),
+* whatever a rule needs on top (e.g. the price).
+
+Rules:
+
+* ``DuplicateKeys``      – repeated (series, period) keys;
+* ``NonPositiveVolume``  – ``Volume`` ≤ 0;
+* ``PriceOutliers``      – price far from its series median;
+* ``MissingWeeks``       – gaps in a weekly series' calendar (series sampled
+  at another frequency are skipped);
+* ``MixedFrequency``     – series sampled at different frequencies.
+
+Every result carries the violating global row positions (not row copies)
+and the seconds its rule spent.
+"""
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+SERIES_KEYS = ("Channel", "PPG")
+CHUNK_ROWS = 200_000
+PRICE_TOLERANCE = 0.5        # |price / series median − 1| above this is an outlier
+NO_DAY = np.iinfo(np.int32).min
+INPUT_COLUMNS = ("Date", "Year", "Week", "Volume", "Price", "SalesValue")
+
+ProgressFn = Callable[[float, str], None]
+
+
+def _noop(_frac: float, _msg: str) -> None:
+    pass
+
+
+# ────────────────────────────
+# ▼ Per‑chunk keys
+# ────────────────────────────
+def _iso_monday(year: np.ndarray, week: np.ndarray) -> np.ndarray:
+    """Day number (since 1970‑01‑01) of the Monday of ISO ``year``‑W``week``."""
+    jan4 = (year.astype("int64") - 1970).astype("datetime64[Y]").astype("datetime64[D]").astype("int64") + 3
+    return jan4 - (jan4 + 3) % 7 + (week.astype("int64") - 1) * 7
+
+
+def chunk_days(chunk: pd.DataFrame, source: Optional[str]) -> np.ndarray:
+    """int32 day number of each row's period; ``NO_DAY`` where it is unknown."""
+    out = np.full(len(chunk), NO_DAY, dtype=np.int32)
+    if source == "Date":
+        d = pd.to_datetime(chunk["Date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+        ok = ~np.isnat(d)
+        out[ok] = d[ok].astype("int64")
+    elif source == "Year-Week":
+        y = pd.to_numeric(chunk["Year"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        w = pd.to_numeric(chunk["Week"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        ok = np.isfinite(y) & np.isfinite(w) & (w >= 1) & (w <= 53)
+        out[ok] = _iso_monday(y[ok], w[ok])
+    return out
+
+
+def time_source(columns: Sequence[str]) -> Optional[str]:
+    if "Date" in columns:
+        return "Date"
+    if "Year" in columns and "Week" in columns:
+        return "Year-Week"
+    return None
+
+
+class SeriesCodes:
+    """Dense int32 codes for hashed series keys, stable across chunks."""
+
+    def __init__(self, cols: Sequence[str]):
+        self.cols = list(cols)
+        self.labels: List[str] = []
+        self._hashes = np.empty(0, dtype=np.uint64)     # sorted
+        self._codes = np.empty(0, dtype=np.int32)       # code of each sorted hash
+
+    def encode(self, chunk: pd.DataFrame) -> np.ndarray:
+        if not self.cols:
+            if not self.labels:
+                self.labels.append("all rows")
+            return np.zeros(len(chunk), dtype=np.int32)
+        h = pd.util.hash_pandas_object(chunk[self.cols], index=False).to_numpy()
+        uniq, first, inv = np.unique(h, return_index=True, return_inverse=True)
+        at = np.searchsorted(self._hashes, uniq)
+        known = (at < len(self._hashes)) & (self._hashes[np.minimum(at, len(self._hashes) - 1)] == uniq) \
+            if len(self._hashes) else np.zeros(len(uniq), dtype=bool)
+        codes = np.empty(len(uniq), dtype=np.int32)
+        codes[known] = self._codes[at[known]]
+        new = np.flatnonzero(~known)
+        if len(new):
+            codes[new] = np.arange(len(self.labels), len(self.labels) + len(new), dtype=np.int32)
+            keys = chunk[self.cols].iloc[first[new]].astype(str).to_numpy()
+            self.labels.extend(" / ".join(row) for row in keys)
+            hashes = np.concatenate([self._hashes, uniq[new]])
+            order = np.argsort(hashes, kind="stable")
+            self._hashes = hashes[order]
+            self._codes = np.concatenate([self._codes, codes[new]])[order]
+        return codes[inv]
+
+
+class Chunk:
+    """One chunk plus its shared keys; ``offset`` is its first global row."""
+
+    def __init__(self, frame: pd.DataFrame, offset: int, series: np.ndarray, days: np.ndarray):
+        self.frame = frame
+        self.offset = offset
+        self.series = series
+        self.days = days
+
+
+class Keys:
+    """The shared per‑row keys of the whole dataset, available to ``finish``."""
+
+    def __init__(self, series: np.ndarray, days: np.ndarray, labels: List[str], source: Optional[str]):
+        self.series = series
+        self.days = days
+        self.labels = labels
+        self.source = source
+
+    def calendar(self):
+        """Distinct ``(series, day)`` pairs sorted by series then day, with the first row of each."""
+        ok = np.flatnonzero(self.days != NO_DAY)
+        order = ok[np.lexsort((self.days[ok], self.series[ok]))]
+        s, d = self.series[order], self.days[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (s[1:] != s[:-1]) | (d[1:] != d[:-1])
+        return s[first], d[first], order[first]
+
+
+# ────────────────────────────
+# ▼ Results
+# ────────────────────────────
+class RuleResult:
+    def __init__(self, name: str, status: str, msg: str, rows: np.ndarray,
+                 seconds: float = 0.0, details: Optional[pd.DataFrame] = None):
+        self.name = name
+        self.status = status
+        self.msg = msg
+        self.rows = rows
+        self.seconds = seconds
+        self.details = details
+
+    def as_check(self) -> Dict[str, str]:
+        """The ``{"name", "status", "msg"}`` card used by the Validate page."""
+        return {"name": self.name, "status": self.status, "msg": self.msg}
+
+
+class ValidationReport:
+    def __init__(self, results: List[RuleResult], rows: int, key_seconds: float):
+        self.results = results
+        self.rows = rows
+        self.key_seconds = key_seconds
+
+    def checks(self) -> List[Dict[str, str]]:
+        return [r.as_check() for r in self.results]
+
+    def timings(self) -> pd.DataFrame:
+        out = pd.DataFrame([{"Rule": r.name, "Seconds": round(r.seconds, 3), "Rows flagged": len(r.rows)}
+                            for r in self.results])
+        keys = pd.DataFrame([{"Rule": "(shared keys)", "Seconds": round(self.key_seconds, 3), "Rows flagged": 0}])
+        return pd.concat([out, keys], ignore_index=True)
+
+
+# ────────────────────────────
+# ▼ Rules
+# ────────────────────────────
+class Rule(ABC):
+    """Base rule: ``update`` sees every chunk, ``finish`` returns the violating rows."""
+
+    name = "rule"
+    severity = "warn"
+    columns: Sequence[str] = ()
+
+    def applies(self, columns: Sequence[str], source: Optional[str]) -> bool:
+        return all(c in columns for c in self.columns)
+
+    def update(self, chunk: Chunk) -> None:
+        pass
+
+    @abstractmethod
+    def finish(self, keys: Keys):
+        """``(rows, msg, details)``."""
+
+
+class DuplicateKeys(Rule):
+    name = "Duplicate keys"
+
+    def applies(self, columns, source):
+        return source is not None
+
+    def finish(self, keys):
+        ok = np.flatnonzero(keys.days != NO_DAY)
+        key = (keys.series[ok].astype(np.int64) << 32) | (keys.days[ok].astype(np.int64) - NO_DAY)
+        order = np.argsort(key, kind="stable")
+        k = key[order]
+        same = k[1:] == k[:-1]
+        dup = np.zeros(len(k), dtype=bool)
+        dup[1:] |= same
+        dup[:-1] |= same
+        rows = np.sort(ok[order[dup]])
+        n_keys = int((same & ~np.r_[False, same[:-1]]).sum())
+        if not len(rows):
+            return rows, "Every series/period key is unique.", None
+        return rows, f"{n_keys:,} series/period keys repeated on {len(rows):,} rows.", None
+
+
+class NonPositiveVolume(Rule):
+    name = "Volume > 0"
+    columns = ("Volume",)
+
+    def __init__(self):
+        self._rows: List[np.ndarray] = []
+
+    def update(self, chunk):
+        vol = pd.to_numeric(chunk.frame["Volume"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        self._rows.append(chunk.offset + np.flatnonzero(vol <= 0))
+
+    def finish(self, keys):
+        rows = np.concatenate(self._rows) if self._rows else np.empty(0, dtype=np.int64)
+        return rows, f"{len(rows):,} rows with zero or negative Volume." if len(rows) else "", None
+
+
+class PriceOutliers(Rule):
+    name = "Price outliers"
+
+    def __init__(self, tolerance: float = PRICE_TOLERANCE):
+        self.tolerance = tolerance
+        self._price: List[np.ndarray] = []
+
+    def applies(self, columns, source):
+        return "Price" in columns or {"SalesValue", "Volume"} <= set(columns)
+
+    def update(self, chunk):
+        f = chunk.frame
+        if "Price" in f.columns:
+            p = pd.to_numeric(f["Price"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        else:
+            sv = pd.to_numeric(f["SalesValue"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            vol = pd.to_numeric(f["Volume"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                p = sv / vol
+        self._price.append(p)
+
+    def finish(self, keys):
+        price = np.concatenate(self._price)
+        ok = np.flatnonzero(np.isfinite(price) & (price > 0))
+        order = ok[np.lexsort((price[ok], keys.series[ok]))]
+        s, p = keys.series[order], price[order]
+        starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+        counts = np.diff(np.r_[starts, len(s)])
+        med = (p[starts + (counts - 1) // 2] + p[starts + counts // 2]) / 2
+        dev = np.abs(p / np.repeat(med, counts) - 1)
+        rows = np.sort(order[dev > self.tolerance])
+        if not len(rows):
+            return rows, f"All prices within {self.tolerance:.0%} of their series median.", None
+        return rows, f"{len(rows):,} rows more than {self.tolerance:.0%} away from their series median price.", None
+
+
+class MissingWeeks(Rule):
+    name = "Missing weeks"
+
+    def applies(self, columns, source):
+        return source is not None
+
+    def finish(self, keys):
+        s, d, first = keys.calendar()
+        if keys.source == "Date":                        # Year/Week data is weekly by construction
+            step = _series_steps(s, d)
+            weekly = np.isin(s, step.index[(step >= 6) & (step <= 8)].to_numpy())
+            if not weekly.any():
+                return np.empty(0, dtype=np.int64), "Data is not weekly – no weekly calendar to check.", None
+            s, d, first = s[weekly], d[weekly], first[weekly]
+        w = (d.astype(np.int64) + 3) // 7                # Monday‑based week number
+        keep = np.r_[True, (s[1:] != s[:-1]) | (w[1:] != w[:-1])]
+        s, w, first = s[keep], w[keep], first[keep]
+        gap = np.zeros(len(w), dtype=np.int64)
+        same = s[1:] == s[:-1]
+        gap[1:] = np.where(same, w[1:] - w[:-1] - 1, 0)
+        rows = np.sort(first[gap > 0])                   # first row after each gap
+        if not len(rows):
+            return rows, "No gaps in any series.", None
+        per = pd.DataFrame({"s": s, "w": w, "gap": gap}).groupby("s").agg(
+            first=("w", "min"), last=("w", "max"), missing=("gap", "sum"))
+        per = per[per["missing"] > 0].sort_values("missing", ascending=False)
+        details = pd.DataFrame({
+            "Series": [keys.labels[i] for i in per.index],
+            "First week": pd.to_datetime(per["first"].to_numpy() * 7 - 3, unit="D"),
+            "Last week": pd.to_datetime(per["last"].to_numpy() * 7 - 3, unit="D"),
+            "Missing weeks": per["missing"].to_numpy(),
+        })
+        return rows, f"{int(gap.sum()):,} missing weeks across {len(details):,} series.", details
+
+
+def _series_steps(s: np.ndarray, d: np.ndarray) -> pd.Series:
+    """Median days between consecutive periods of every series with two or more."""
+    same = s[1:] == s[:-1]
+    return pd.Series(np.diff(d.astype(np.int64))[same]).groupby(s[1:][same]).median()
+
+
+def _frequency(step: float) -> str:
+    if step <= 1:
+        return "daily"
+    if 6 <= step <= 8:
+        return "weekly"
+    if 28 <= step <= 31:
+        return "monthly"
+    if 84 <= step <= 92:
+        return "quarterly"
+    return f"every ~{step:.0f} days"
+
+
+class MixedFrequency(Rule):
+    name = "Single frequency"
+
+    def applies(self, columns, source):
+        return source is not None
+
+    def finish(self, keys):
+        s, d, _ = keys.calendar()
+        step = _series_steps(s, d)
+        if step.empty:
+            return np.empty(0, dtype=np.int64), "Not enough periods to tell.", None
+        freq = step.map(_frequency)
+        rows_per = pd.Series(np.bincount(keys.series, minlength=len(keys.labels)))
+        weight = rows_per.reindex(freq.index).groupby(freq.to_numpy()).sum()
+        main = weight.idxmax()
+        odd = freq.index[freq.to_numpy() != main].to_numpy()
+        rows = np.flatnonzero(np.isin(keys.series, odd))
+        details = pd.DataFrame({"Frequency": weight.index, "Series": freq.value_counts().reindex(weight.index).to_numpy(),
+                                "Rows": weight.to_numpy()})
+        if not len(odd):
+            return rows, f"All series are {main}.", details
+        return rows, f"{len(odd):,} series are not {main} ({', '.join(sorted(set(freq) - {main}))}).", details
+
+
+DEFAULT_RULES = (DuplicateKeys, NonPositiveVolume, PriceOutliers, MissingWeeks, MixedFrequency)
+
+
+# ────────────────────────────
+# ▼ Engine
+# ────────────────────────────
+class ValidationEngine:
+    """Runs a set of rules over a stream of chunks with one pass over the data."""
+
+    def __init__(self, rules: Optional[Iterable[Rule]] = None, series_cols: Sequence[str] = SERIES_KEYS):
+        self.rules = list(rules) if rules is not None else [cls() for cls in DEFAULT_RULES]
+        self.series_cols = series_cols
+
+    def input_columns(self, available: Sequence[str]) -> List[str]:
+        """The columns the rules read – everything else can be left on disk."""
+        wanted = set(self.series_cols) | set(INPUT_COLUMNS)
+        for rule in self.rules:
+            wanted.update(rule.columns)
+        return [c for c in available if c in wanted]
+
+    def run(self, chunks: Iterable[pd.DataFrame], progress: ProgressFn = _noop,
+            total_rows: Optional[int] = None) -> ValidationReport:
+        active, codes, source = None, None, None
+        series, days = [], []
+        spent: Dict[int, float] = {}
+        key_seconds, offset = 0.0, 0
+
+        for frame in chunks:
+            if active is None:
+                cols = list(frame.columns)
+                source = time_source(cols)
+                codes = SeriesCodes([c for c in self.series_cols if c in cols])
+                active = [r for r in self.rules if r.applies(cols, source)]
+                spent = {id(r): 0.0 for r in active}
+            t0 = time.perf_counter()
+            chunk = Chunk(frame, offset, codes.encode(frame), chunk_days(frame, source))
+            series.append(chunk.series)
+            days.append(chunk.days)
+            key_seconds += time.perf_counter() - t0
+            for rule in active:
+                t0 = time.perf_counter()
+                rule.update(chunk)
+                spent[id(rule)] += time.perf_counter() - t0
+            offset += len(frame)
+            if total_rows:
+                progress(min(offset / total_rows, 1.0), f"{offset:,} rows checked")
+
+        if active is None:
+            return ValidationReport([], 0, 0.0)
+        keys = Keys(np.concatenate(series), np.concatenate(days), codes.labels, source)
+        results = []
+        for rule in active:
+            t0 = time.perf_counter()
+            rows, msg, details = rule.finish(keys)
+            seconds = spent[id(rule)] + time.perf_counter() - t0
+            status = rule.severity if len(rows) else "pass"
+            results.append(RuleResult(rule.name, status, msg, rows, seconds, details))
+        return ValidationReport(results, offset, key_seconds)
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def validate_frame(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS, **kwargs) -> ValidationReport:
+    return ValidationEngine(**kwargs).run(iter_frame_chunks(df, chunk_rows))
+
+
+def validate_handle(handle, chunk_rows: int = CHUNK_ROWS, progress: ProgressFn = _noop,
+                    **kwargs) -> ValidationReport:
+    """Validate a stored dataset (``rgm_store.DatasetHandle``) batch by batch, reading only the needed columns."""
+    engine = ValidationEngine(**kwargs)
+    chunks = handle.iter_chunks(columns=engine.input_columns(handle.columns), chunk_rows=chunk_rows)
+    return engine.run(chunks, progress=progress, total_rows=handle.rows)
@@ -0,0 +1,180 @@
+"""The vectorized base‑price engine against the original week‑by‑week loop."""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rgm_baseprice import (DEFAULT_PARAMS, ScanStore, _scan_many, base_price_series, extend_series,
+                           series_base_prices, window_levels)
+
+
+# ────────────────────────────
+# ▼ Reference
+# ────────────────────────────
+def validate_up(prices, cand, bp, th5, promo) -> bool:
+    above = (prices >= bp * (1 + th5 / 100)).sum()
+    within = ((prices >= cand * 0.97) & (prices <= cand * 1.03)).sum()
+    return above >= promo // 2 and within >= promo // 2
+
+
+def validate_down(prices, cand, promo=12, required=9, tol=0.02) -> bool:
+    if len(prices) < promo:
+        return False
+    cnt = ((prices >= cand * (1 - tol)) & (prices <= cand * (1 + tol))).sum()
+    return cnt >= required
+
+
+def reference_series(price: np.ndarray, roll: int = 12, up_th: float = 5.0, dn_th: float = 5.0,
+                     val_w: int = 12, perc: float = 75.0) -> Tuple[np.ndarray, np.ndarray]:
+    """The original loop of the Base‑Price page."""
+    price = np.asarray(price, dtype="float64")
+    n = len(price)
+    bp = np.empty(n)
+    trans = []
+    cur_bp = np.percentile(price[:roll], perc)
+    last_t = -roll
+    for i in range(n):
+        cur = price[i]
+        fut = price[i:i + val_w]
+        if len(fut) < val_w:
+            bp[i] = cur_bp
+            continue
+        if cur >= cur_bp * (1 + up_th / 100) and i - last_t >= roll and validate_up(fut, cur, cur_bp, up_th, val_w):
+            cur_bp = max(np.percentile(fut, perc), cur)
+            trans.append(i)
+            last_t = i
+        elif cur <= cur_bp * (1 - dn_th / 100) and i - last_t >= roll and validate_down(fut, cur, val_w):
+            cur_bp = min(np.percentile(fut, perc), cur)
+            trans.append(i)
+            last_t = i
+        bp[i] = cur_bp
+    return bp, np.asarray(trans, dtype=np.int64)
+
+
+def random_series(rng, n: int) -> np.ndarray:
+    """Promo‑like weekly prices: a shelf price with steps, dips, noise and a few gaps."""
+    price = np.full(n, rng.uniform(0.5, 5.0))
+    for s in rng.integers(0, n, rng.integers(0, 12)):
+        price[s:s + rng.integers(1, 40)] *= rng.choice([0.7, 0.8, 0.9, 0.97, 1.04, 1.1, 1.25])
+    price *= 1 + rng.normal(0, rng.choice([0.0, 0.005, 0.02]), n)
+    if rng.random() < 0.1:
+        price[rng.integers(0, n, 3)] = np.nan
+    return price
+
+
+def random_params(rng) -> dict:
+    return {"roll": int(rng.integers(4, 53)), "up_th": float(rng.choice([1.0, 2.5, 5.0, 10.0])),
+            "dn_th": float(rng.choice([1.0, 2.5, 5.0, 10.0])), "val_w": int(rng.integers(2, 19)),
+            "perc": float(rng.choice([50.0, 75.0, 90.0, 100.0]))}
+
+
+# ────────────────────────────
+# ▼ Tests
+# ────────────────────────────
+@pytest.mark.parametrize("seed", range(5))
+def test_base_price_series_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        price, params = random_series(rng, int(rng.integers(1, 260))), random_params(rng)
+        base, trans = base_price_series(price, **params)
+        ref_base, ref_trans = reference_series(price, **params)
+        np.testing.assert_array_equal(base, ref_base)
+        np.testing.assert_array_equal(trans, ref_trans)
+
+
+def test_series_base_prices_matches_per_series():
+    rng = np.random.default_rng(10)
+    arrs = [random_series(rng, int(rng.integers(1, 200))) for _ in range(60)]
+    price = np.concatenate(arrs)
+    starts = np.r_[0, np.cumsum([len(a) for a in arrs])[:-1]].astype(np.int64)
+    out = series_base_prices(price, starts, DEFAULT_PARAMS)
+    for a, s in zip(arrs, starts):
+        expected = reference_series(a)[0] if len(a) >= DEFAULT_PARAMS["roll"] else np.full(len(a), np.nan)
+        np.testing.assert_array_equal(out[s:s + len(a)], expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_scan_many_matches_per_series(seed):
+    rng = np.random.default_rng(20 + seed)
+    p = random_params(rng)
+    arrs = [random_series(rng, int(rng.integers(p["roll"], 200))) for _ in range(40)]
+    price = np.concatenate(arrs)
+    lo = np.r_[0, np.cumsum([len(a) for a in arrs])[:-1]].astype(np.int64)
+    hi = lo + [len(a) for a in arrs]
+    start_bp = np.array([np.percentile(a[:p["roll"]], p["perc"]) for a in arrs])
+    bp, flag = _scan_many(price, *window_levels(price, p["val_w"], p["perc"]), lo, hi, start_bp,
+                          p["roll"], p["up_th"], p["dn_th"], p["val_w"])
+    for a, s, e in zip(arrs, lo, hi):
+        ref_base, ref_trans = reference_series(a, **p)
+        np.testing.assert_array_equal(bp[s:e], ref_base)
+        np.testing.assert_array_equal(np.flatnonzero(flag[s:e]), ref_trans)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_extend_series_matches_full_scan(seed):
+    rng = np.random.default_rng(30 + seed)
+    for _ in range(100):
+        params = random_params(rng)
+        price = random_series(rng, int(rng.integers(params["roll"], 260)))
+        cut = int(rng.integers(1, len(price) + 1))
+        _, _, state, _ = extend_series(price[:cut], params)
+        base, trans, _, first = extend_series(price, params, state)
+        ref_base, ref_trans = reference_series(price, **params)
+        np.testing.assert_array_equal(base, ref_base)
+        np.testing.assert_array_equal(trans, ref_trans)
+        assert first <= len(price)
+
+
+def _weekly_frame(rng, ppgs: int, weeks: int) -> pd.DataFrame:
+    rows = []
+    for k in range(ppgs):
+        price = random_series(rng, weeks)
+        price[np.isnan(price)] = 1.0
+        rows.append(pd.DataFrame({"Channel": "C", "Brand": "B", "Variant": "V", "PPG": f"P{k}",
+                                  "Year": 2020 + np.arange(weeks) // 52, "Week": np.arange(weeks) % 52 + 1,
+                                  "Month": 1, "Volume": 1.0, "SalesValue": price}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def test_scan_store_update_matches_full_recompute():
+    rng = np.random.default_rng(40)
+    df = _weekly_frame(rng, 6, 120)
+    old = df[df["Year"] * 100 + df["Week"] <= 2021 * 100 + 20]
+    store = ScanStore()
+    store.update(old, dims=("Variant",))
+    base, revisited, stats = store.update(df, dims=("Variant",))
+    assert stats["extended"] == 6 and stats["recomputed"] == 0
+    for ppg, rows in df.groupby("PPG").groups.items():
+        np.testing.assert_array_equal(base[rows].to_numpy(), reference_series(df.loc[rows, "SalesValue"])[0])
+
+
+def test_scan_store_keeps_values_it_did_not_write():
+    rng = np.random.default_rng(41)
+    df = _weekly_frame(rng, 3, 100)
+    df["BasePrice"] = np.where(df["PPG"] == "P1", 999.0, np.nan)
+    store = ScanStore()
+    base, written, _ = store.update(df, dims=("Variant",))
+    assert (base[df["PPG"] == "P1"] == 999.0).all() and not written[df["PPG"] == "P1"].any()
+    df["BasePrice"] = base
+    edited = df.index[df["PPG"] == "P0"][10]
+    df.loc[edited, "BasePrice"] = 5.5                  # saved by hand after the scan
+    # new parameters: the store replaces its own values, never the supplied ones
+    params = {**DEFAULT_PARAMS, "up_th": 1.0, "dn_th": 1.0}
+    base, written, stats = store.update(df, dims=("Variant",), params=params)
+    assert stats["recomputed"] == 3
+    assert (base[df["PPG"] == "P1"] == 999.0).all()
+    assert base[edited] == 5.5 and not written[edited]
+    for ppg in ("P2",):
+        rows = df.index[df["PPG"] == ppg]
+        assert written[rows].all()
+        np.testing.assert_array_equal(base[rows].to_numpy(), reference_series(df.loc[rows, "SalesValue"], **params)[0])
+
+
+def test_scan_store_drops_series_no_longer_present():
+    rng = np.random.default_rng(42)
+    df = _weekly_frame(rng, 4, 60)
+    store = ScanStore()
+    store.update(df, dims=("Variant",))
+    store.update(df[df["PPG"] != "P3"], dims=("Variant",))
+    assert sorted(k[-1] for k in store.states) == ["P0", "P1", "P2"]
@@ -0,0 +1,59 @@
+"""PELT with pruning against optimal partitioning without it."""
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from rgm_changepoint import changepoint_series, pelt_block
+
+
+def brute_force(x: np.ndarray, beta: float, min_size: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Optimal partitioning without pruning (O(n²))."""
+    n = len(x)
+    w = np.ones(n) if weights is None else weights.astype("float64")
+    x = np.where(w > 0, x, 0.0)
+    c0 = np.r_[0.0, np.cumsum(w)]
+    c1 = np.r_[0.0, np.cumsum(w * x)]
+    c2 = np.r_[0.0, np.cumsum(w * x * x)]
+    f = np.full(n + 1, np.inf)
+    f[0] = -beta
+    last = np.zeros(n + 1, dtype=np.int64)
+    for t in range(min_size, n + 1):
+        for s in range(0, t - min_size + 1):
+            if not np.isfinite(f[s]):
+                continue
+            s0 = c0[t] - c0[s]
+            v = f[s] + (c2[t] - c2[s]) - ((c1[t] - c1[s]) ** 2 / s0 if s0 > 0 else 0.0) + beta
+            if v < f[t]:
+                f[t], last[t] = v, s
+    cps, pos = [], n
+    while pos > 0:
+        pos = int(last[pos])
+        if pos > 0:
+            cps.append(pos)
+    return np.asarray(cps[::-1], dtype=np.int64)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pelt_block_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    rows, width = 24, 90
+    lengths = rng.integers(2, width + 1, rows)
+    levels = np.repeat(rng.normal(0, 3, (rows, 6)), width // 6, axis=1)
+    x = levels + rng.normal(0, 1, (rows, width))
+    x[np.arange(width) >= lengths[:, None]] = 0.0
+    weights = (rng.random((rows, width)) > 0.1).astype("float64")
+    beta = rng.uniform(1, 12, rows)
+    min_size = int(rng.integers(1, 9))
+    cps = pelt_block(x, lengths, beta, min_size, weights)
+    for k in range(rows):
+        n = int(lengths[k])
+        np.testing.assert_array_equal(cps[k], brute_force(x[k, :n], beta[k], min_size, weights[k, :n]))
+
+
+@pytest.mark.parametrize("after", [12.0, 8.0])
+def test_step_change_found_at_step(after):
+    """A permanent step up is not mistaken for a dip in the weeks before it."""
+    base, cps = changepoint_series(np.r_[np.full(30, 10.0), np.full(30, after)])
+    assert cps.tolist() == [30]
+    assert np.array_equal(base, np.r_[np.full(30, 10.0), np.full(30, after)])
@@ -0,0 +1,42 @@
+"""Exact 1‑D k‑means against the O(k·n²) dynamic program."""
+import numpy as np
+import pytest
+
+from rgm_cluster import _sse, kmeans_1d
+
+
+def brute_force(values, k: int) -> float:
+    """Optimal k‑cluster SSE by the O(k·n²) dynamic program."""
+    xs = np.sort(np.asarray(values, dtype="float64"))
+    n = len(xs)
+    c1 = np.r_[0.0, np.cumsum(xs)]
+    c2 = np.r_[0.0, np.cumsum(xs * xs)]
+    d = np.full((k + 1, n + 1), np.inf)
+    d[0, 0] = 0.0
+    for m in range(1, k + 1):
+        for i in range(m, n + 1):
+            j = np.arange(m - 1, i)
+            d[m, i] = (d[m - 1, j] + _sse(c1, c2, j, np.full(len(j), i))).min()
+    return float(d[k, n])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_inertias_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(40):
+        n = int(rng.integers(1, 80))
+        values = np.round(rng.choice([rng.normal(20, 8, n), rng.exponential(10, n)]), int(rng.integers(0, 3)))
+        fit = kmeans_1d(values, standardize=False)
+        for k in range(1, fit.k_max + 1):
+            assert fit.inertias[k - 1] == pytest.approx(brute_force(values, k), rel=1e-9, abs=1e-9)
+
+
+def test_labels_and_centers_are_consistent():
+    rng = np.random.default_rng(7)
+    values = rng.normal(15, 6, 200)
+    fit = kmeans_1d(values)
+    for k in range(1, fit.k_max + 1):
+        labels, centers = fit.labels(k), fit.centers(k)
+        assert set(labels) == set(range(k))
+        assert np.all(np.diff(centers) > 0)
+        np.testing.assert_allclose([values[labels == c].mean() for c in range(k)], centers)